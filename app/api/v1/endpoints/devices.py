@@ -6,6 +6,9 @@ from sqlalchemy.orm import selectinload
 from datetime import datetime, timezone
 
 from app.core.database import get_session
+from app.core.device_cache import device_auth_cache
+from app.core.calibration import validate_formula, CalibrationError
+from app.core.recalibration import recalibration_runner
 from app.models.device import Device
 from app.models.user import User
 from app.models.device_token import DeviceToken
@@ -15,6 +18,7 @@ from app.models.sensor_type import SensorType
 from app.schemas.device import DeviceCreate, DevicePublic, DeviceUpdate, DeviceSensorCalibration
 from app.schemas.device_token import DeviceTokenCreate, DeviceTokenPublic
 from app.schemas.device_sensor import DeviceSensorLinkCreate
+from app.schemas.recalibration import RecalibrationRequest, RecalibrationJobPublic
 
 from app.api.v1 import deps
 
@@ -138,6 +142,7 @@ async def update_device(
     session.add(db_device)
     await session.commit()
     await session.refresh(db_device)
+    device_auth_cache.invalidate_device(device_id)
     return db_device
 
 @router.delete("/{device_id}")
@@ -157,6 +162,7 @@ async def delete_device(
     
     session.add(db_device)
     await session.commit()
+    device_auth_cache.invalidate_device(device_id)
     return {"ok": True}
 
 @router.post("/{device_id}/restore")
@@ -176,6 +182,7 @@ async def restore_device(
     
     session.add(db_device)
     await session.commit()
+    device_auth_cache.invalidate_device(device_id)
     return {"ok": True}
 
 # -----------------------------------------------------------------------------
@@ -221,6 +228,7 @@ async def create_device_token(
     session.add(db_token)
     await session.commit()
     await session.refresh(db_token)
+    device_auth_cache.invalidate_device(device_id)
 
     return db_token
 
@@ -239,6 +247,29 @@ async def list_device_tokens(
     result = await session.exec(query)
     return result.all()
 
+@router.delete("/{device_id}/tokens/{token_id}")
+async def revoke_device_token(
+    device_id: int,
+    token_id: int,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(deps.get_current_active_user)
+):
+    """Revoga (desativa) um token de dispositivo. Efeito imediato na ingestão."""
+    device = await session.get(Device, device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
+    verify_device_ownership(device, current_user) # <--- SECURITY CHECK
+
+    db_token = await session.get(DeviceToken, token_id)
+    if not db_token or db_token.device_id != device_id:
+        raise HTTPException(status_code=404, detail="Token não encontrado")
+
+    db_token.is_active = False
+    session.add(db_token)
+    await session.commit()
+    device_auth_cache.invalidate_token(db_token.token)
+    return {"ok": True}
+
 @router.put("/{device_id}/sensors/{sensor_id}/calibration", response_model=dict)
 async def update_sensor_calibration(
     device_id: int,
@@ -257,11 +288,25 @@ async def update_sensor_calibration(
     if not link:
         raise HTTPException(status_code=404, detail="Sensor não vinculado.")
 
+    # Fórmula inválida é rejeitada aqui, não a cada leitura na ingestão
+    try:
+        validate_formula(payload.calibration_formula)
+    except CalibrationError as e:
+        raise HTTPException(status_code=422, detail=f"Fórmula de calibração inválida: {e}")
+
+    # Nova versão: jobs de re-calibração da fórmula anterior param sozinhos
+    if link.calibration_formula != payload.calibration_formula:
+        link.calibration_version += 1
     link.calibration_formula = payload.calibration_formula
     session.add(link)
     await session.commit()
+    device_auth_cache.invalidate_device(device_id)
     
-    return {"status": "ok", "formula": link.calibration_formula}
+    return {
+        "status": "ok",
+        "formula": link.calibration_formula,
+        "calibration_version": link.calibration_version,
+    }
 
 @router.get("/{device_id}/sensors/{sensor_id}/calibration", response_model=dict)
 async def get_sensor_calibration(
@@ -278,7 +323,62 @@ async def get_sensor_calibration(
     link = await session.get(DeviceSensorLink, (device_id, sensor_id))
     if not link:
         raise HTTPException(status_code=404, detail="Link não encontrado")
-    return {"formula": link.calibration_formula}
+    return {"formula": link.calibration_formula, "calibration_version": link.calibration_version}
+
+@router.post(
+    "/{device_id}/sensors/{sensor_id}/recalibrate",
+    response_model=RecalibrationJobPublic,
+    status_code=202,
+)
+async def recalibrate_sensor_history(
+    device_id: int,
+    sensor_id: int,
+    payload: RecalibrationRequest,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(deps.get_current_active_user)
+):
+    """
+    Reaplica a fórmula atual ao histórico (a partir de raw_value) em background.
+    Acompanhe o progresso em GET /devices/{device_id}/recalibrations/{job_id}.
+    """
+    device = await session.get(Device, device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
+    verify_device_ownership(device, current_user)
+
+    link = await session.get(DeviceSensorLink, (device_id, sensor_id))
+    if not link:
+        raise HTTPException(status_code=404, detail="Sensor não vinculado.")
+
+    if payload.start and payload.end and payload.start > payload.end:
+        raise HTTPException(status_code=422, detail="Intervalo inválido: start > end")
+
+    job = recalibration_runner.submit(
+        device_id=device_id,
+        sensor_type_id=sensor_id,
+        formula=link.calibration_formula,
+        calibration_version=link.calibration_version,
+        start=payload.start,
+        end=payload.end,
+    )
+    return RecalibrationJobPublic.model_validate(job)
+
+@router.get("/{device_id}/recalibrations/{job_id}", response_model=RecalibrationJobPublic)
+async def read_recalibration_job(
+    device_id: int,
+    job_id: str,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(deps.get_current_active_user)
+):
+    device = await session.get(Device, device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
+    verify_device_ownership(device, current_user)
+
+    job = recalibration_runner.get(job_id)
+    if not job or job.device_id != device_id:
+        raise HTTPException(status_code=404, detail="Job de re-calibração não encontrado")
+    return RecalibrationJobPublic.model_validate(job)
 
 @router.post("/{device_id}/sensors")
 async def update_device_sensors(
@@ -292,17 +392,39 @@ async def update_device_sensors(
         raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
     verify_device_ownership(device, current_user) # <--- SECURITY CHECK
 
+    for link_in in sensor_links:
+        try:
+            validate_formula(link_in.calibration_formula)
+        except CalibrationError as e:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Fórmula de calibração inválida (sensor {link_in.sensor_type_id}): {e}"
+            )
+
+    # Versões atuais, para não "voltar" a versão de calibração na recriação
+    query_current = select(DeviceSensorLink).where(DeviceSensorLink.device_id == device_id)
+    current = {
+        link.sensor_type_id: (link.calibration_formula, link.calibration_version)
+        for link in (await session.exec(query_current)).all()
+    }
+
     # Limpeza e Recriação (Mantida lógica original)
     stmt = delete(DeviceSensorLink).where(DeviceSensorLink.device_id == device_id)
     await session.exec(stmt)
     
     for link_in in sensor_links:
+        version = 1
+        if link_in.sensor_type_id in current:
+            old_formula, old_version = current[link_in.sensor_type_id]
+            version = old_version if old_formula == link_in.calibration_formula else old_version + 1
         db_link = DeviceSensorLink(
             device_id=device_id,
             sensor_type_id=link_in.sensor_type_id,
-            calibration_formula=link_in.calibration_formula
+            calibration_formula=link_in.calibration_formula,
+            calibration_version=version
         )
         session.add(db_link)
     
     await session.commit()
+    device_auth_cache.invalidate_device(device_id)
     return {"ok": True}
\ No newline at end of file
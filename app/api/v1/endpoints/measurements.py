@@ -1,34 +1,61 @@
+import asyncio
 from typing import List, Optional, Literal
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from fastapi import (
     APIRouter, 
     Depends, 
     HTTPException, 
+    Request,
+    Response,
     WebSocket, 
     WebSocketDisconnect, 
     Query, 
     status
 )
-from sqlalchemy import func, asc
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import func
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from jose import jwt, JWTError
 
 # --- Core Imports ---
 from app.core.socket import manager
-from app.core.database import get_session
+from app.core.database import async_session_maker, get_session
 from app.core.calibration import safe_eval
+from app.core.ingestion import insert_measurements, publish_measurements, apply_calibration
+from app.core.ingest_buffer import ingest_buffer, IngestBufferFull
+from app.core.events import event_bus
+from app.core.device_cache import DeviceAuthContext
+from app.core.rollups import (
+    RESOLUTION_WIDTHS, bucket_key, ceil_bucket, floor_bucket, merge_buckets, parse_bucket, pick_resolution, query_buckets,
+)
+from app.core.pagination import CURSOR_HEADER, InvalidCursor, after_cursor, next_cursor
+from app.core.export import EXPORT_COLUMNS, MEDIA_TYPES, export_stream
+from app.core.archive import cold_archive
+from app.core.retention import rollups_retained_since
+from app.core.hot_window import hot_window
+from app.core.analytics_cache import Scope, analytics_cache
+from app.core.arrow_ipc import ANALYTICS_SCHEMA, MEASUREMENT_SCHEMA, accepts_arrow, arrow_response, record_batch
 from app.core.config import settings  # Necessário para decodificar o JWT
 
 # --- Model Imports ---
-from app.models.measurement import Measurement
 from app.models.device import Device
-from app.models.device_sensor import DeviceSensorLink
+from app.models.measurement import Measurement
+from app.models.organization import Organization
 from app.models.user import User
 
 # --- Schema Imports ---
-from app.schemas.measurement import MeasurementPublic, MeasurementAnalytics, MeasurementPayload
+from app.schemas.measurement import (
+    MeasurementPublic,
+    MeasurementAnalytics,
+    MeasurementPayload,
+    MeasurementBatchPayload,
+    MeasurementBatchItemStatus,
+    MeasurementBatchResult,
+    RealtimeSubscription,
+)
 
 # --- Dependencies ---
 from app.api.v1 import deps
@@ -58,158 +85,470 @@ async def get_current_user_ws(token: str = Query(...)) -> int:
         print(f"❌ WS Auth Error: {e}")
         raise WebSocketDisconnect(code=status.WS_1008_POLICY_VIOLATION)
 
+def archived_timestamp_detail(moment: datetime) -> Optional[str]:
+    """Motivo da rejeição se a leitura cai antes da fronteira do arquivo frio (sumiria das consultas)."""
+    if cold_archive.accepts(moment):
+        return None
+    return f"Timestamp {moment.isoformat()} anterior ao período já arquivado ({cold_archive.archived_until().isoformat()})."
+
+async def resolve_subscription_devices(organization_id: int, request: RealtimeSubscription) -> Optional[List[int]]:
+    """
+    device_ids + devices das `locations` (só da própria organização).
+    None quando a mensagem não fala de devices.
+    """
+    if request.device_ids is None and request.locations is None:
+        return None
+    device_ids = set(request.device_ids or [])
+    if request.locations:
+        async with async_session_maker() as session:
+            result = await session.exec(
+                select(Device.id).where(
+                    Device.organization_id == organization_id,
+                    Device.location.in_(request.locations),
+                )
+            )
+            device_ids.update(result.all())
+    return sorted(device_ids)
+
+async def handle_subscription(websocket: WebSocket, organization_id: int, raw: str) -> dict:
+    """Aplica uma mensagem subscribe/unsubscribe e devolve a resposta para o cliente."""
+    try:
+        request = RealtimeSubscription.model_validate_json(raw)
+    except ValidationError as e:
+        return {"type": "error", "detail": e.errors(include_url=False, include_context=False, include_input=False)}
+
+    device_ids = await resolve_subscription_devices(organization_id, request)
+    change = manager.subscribe if request.action == "subscribe" else manager.unsubscribe
+    try:
+        connection = change(websocket, organization_id, device_ids=device_ids, sensor_type_ids=request.sensor_type_ids)
+    except ValueError as e:
+        return {"type": "error", "detail": str(e)}
+    if connection is None:
+        return {"type": "error", "detail": "Conexão encerrada."}
+    return {
+        "type": "subscription",
+        "device_ids": sorted(connection.device_ids) if connection.device_ids is not None else None,
+        "sensor_type_ids": sorted(connection.sensor_type_ids) if connection.sensor_type_ids is not None else None,
+    }
+
 # -----------------------------------------------------------------------------
 # INGESTÃO DE DADOS (Máquina -> Servidor)
 # -----------------------------------------------------------------------------
 @router.post("/", response_model=MeasurementPublic)
 async def create_measurement(
     payload: MeasurementPayload,
+    response: Response,
     session: AsyncSession = Depends(get_session),
-    device: Device = Depends(deps.get_current_device)  # Valida Token do Device
+    device: DeviceAuthContext = Depends(deps.get_current_device)  # Valida Token do Device
 ):
     """
     Registra uma nova medição e dispara evento Realtime isolado.
     Autenticação: Via X-Device-Token.
     """
     
-    # 1. Validação de Vínculo Sensor-Dispositivo
-    valid_sensor_ids = [sensor.id for sensor in device.sensors]
-
-    if payload.sensor_type_id not in valid_sensor_ids:
+    # 1. Validação de Vínculo Sensor-Dispositivo (contexto em cache, sem SELECT)
+    if payload.sensor_type_id not in device.sensor_ids:
          raise HTTPException(
              status_code=400, 
              detail=f"Sensor {payload.sensor_type_id} não está vinculado a este dispositivo."
          )
-    
-    # 2. Busca Link para Calibração
-    query_link = select(DeviceSensorLink).where(
-        DeviceSensorLink.device_id == device.id,
-        DeviceSensorLink.sensor_type_id == payload.sensor_type_id
-    )
-    link_result = await session.exec(query_link)
-    link = link_result.first()
 
-    # 3. Aplica Fórmula (Edge Computing no Server)
+    if payload.timestamp and (detail := archived_timestamp_detail(payload.timestamp)):
+        raise HTTPException(status_code=400, detail=detail)
+
+    # 2. Aplica Fórmula (Edge Computing no Server)
     final_value = payload.value
-    if link and link.calibration_formula:
-        final_value = safe_eval(link.calibration_formula, payload.value)
+    formula = device.calibration_formulas.get(payload.sensor_type_id)
+    if formula:
+        final_value = safe_eval(formula, payload.value)
     
-    # 4. Persistência
-    db_measurement = Measurement(
-        device_id=device.id, 
-        sensor_type_id=payload.sensor_type_id,
-        value=final_value,
-        created_at=payload.timestamp if payload.timestamp else datetime.utcnow()
-    )
-    
-    session.add(db_measurement)
+    # 3. Persistência
+    row = {
+        "device_id": device.id,
+        "sensor_type_id": payload.sensor_type_id,
+        "organization_id": device.organization_id, # Tenant carimbado (sem JOIN nas leituras)
+        "value": final_value,
+        "raw_value": payload.value,
+        "created_at": payload.timestamp if payload.timestamp else datetime.utcnow()
+    }
+
+    # 3a. Modo Write-Behind: a leitura vai para a fila e o flusher faz o group commit
+    #     (o broadcast realtime é disparado pelo próprio flusher após o COMMIT)
+    if ingest_buffer.running:
+        try:
+            flushed = await ingest_buffer.put(row, device.organization_id)
+        except IngestBufferFull:
+            raise HTTPException(status_code=503, detail="Buffer de ingestão cheio. Tente novamente.")
+        except Exception:
+            raise HTTPException(status_code=503, detail="Falha ao gravar medição.")
+
+        if flushed is None:
+            # ack-on-enqueue: ainda não há ID, apenas a confirmação de recebimento
+            response.status_code = status.HTTP_202_ACCEPTED
+            return MeasurementPublic(id=None, **row)
+        return MeasurementPublic.model_validate(flushed, from_attributes=True)
+
+    # INSERT ... RETURNING: obtém o ID sem o SELECT extra do session.refresh
+    [db_measurement] = await insert_measurements(session, [row])
     await session.commit()
-    await session.refresh(db_measurement)
-
-    # 5. Realtime Broadcast com ISOLAMENTO VERTICAL
-    # Envia apenas para sockets conectados na mesma organização do dispositivo
-    await manager.broadcast(
-        message={
-            "id": db_measurement.id,
-            "device_id": db_measurement.device_id,
-            "sensor_type_id": db_measurement.sensor_type_id,
-            "value": db_measurement.value,
-            "created_at": db_measurement.created_at.isoformat(),
-            "organization_id": device.organization_id 
-        },
-        organization_id=device.organization_id  # <--- CHAVE DA SEGURANÇA
-    )
+
+    # 4. Realtime Broadcast com ISOLAMENTO VERTICAL
+    # Envia apenas para sockets conectados na mesma organização do dispositivo.
+    # Só publica no barramento: o fan-out roda fora da requisição
+    await publish_measurements([(db_measurement, device.organization_id)])  # <--- CHAVE DA SEGURANÇA
     
-    return db_measurement
+    return MeasurementPublic.model_validate(db_measurement, from_attributes=True)
+
+@router.post("/batch", response_model=MeasurementBatchResult)
+async def create_measurements_batch(
+    payload: MeasurementBatchPayload,
+    session: AsyncSession = Depends(get_session),
+    device: DeviceAuthContext = Depends(deps.get_current_device)
+):
+    """
+    Ingestão em lote: várias leituras (sensores misturados) de UM dispositivo.
+    Valida tudo em uma passada, grava com um único INSERT multi-linha e
+    retorna o status (aceito/rejeitado) de cada item na ordem enviada.
+    Autenticação: Via X-Device-Token.
+    """
+    if len(payload.readings) > settings.MEASUREMENT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lote excede o limite de {settings.MEASUREMENT_BATCH_MAX_SIZE} leituras."
+        )
+
+    # 1. Validação em uma passada (vínculos e fórmulas vêm do cache)
+    now = datetime.utcnow()
+    items: List[MeasurementBatchItemStatus] = []
+    rows = []
+    for index, reading in enumerate(payload.readings):
+        if reading.sensor_type_id not in device.sensor_ids:
+            items.append(MeasurementBatchItemStatus(
+                index=index,
+                accepted=False,
+                detail=f"Sensor {reading.sensor_type_id} não está vinculado a este dispositivo."
+            ))
+            continue
+        if reading.timestamp and (detail := archived_timestamp_detail(reading.timestamp)):
+            items.append(MeasurementBatchItemStatus(index=index, accepted=False, detail=detail))
+            continue
+
+        items.append(MeasurementBatchItemStatus(index=index, accepted=True))
+        rows.append({
+            "device_id": device.id,
+            "sensor_type_id": reading.sensor_type_id,
+            "organization_id": device.organization_id,
+            "value": reading.value,
+            "created_at": reading.timestamp if reading.timestamp else now,
+        })
+
+    # Calibração vetorizada (NumPy): uma avaliação por sensor, não por leitura
+    apply_calibration(rows, device.calibration_formulas)
+
+    accepted_items = [item for item in items if item.accepted]
+
+    # 2. Persistência: INSERT multi-linha com RETURNING na ordem dos parâmetros
+    if rows:
+        inserted = await insert_measurements(session, rows)
+        await session.commit()
+
+        for item, row in zip(accepted_items, inserted):
+            item.id = row.id
+
+        # 3. Realtime Broadcast (apenas linhas aceitas, mesma org do dispositivo)
+        await publish_measurements([(row, device.organization_id) for row in inserted])
+
+    return MeasurementBatchResult(
+        accepted=len(accepted_items),
+        rejected=len(items) - len(accepted_items),
+        items=items
+    )
+
+@router.get("/ingest/stats", response_model=dict)
+async def read_ingest_buffer_stats(
+    current_user: User = Depends(deps.get_current_active_superuser)
+):
+    """Profundidade da fila e latência de flush do buffer Write-Behind."""
+    return ingest_buffer.stats()
+
+@router.get("/hot-window/stats", response_model=dict)
+async def read_hot_window_stats(
+    current_user: User = Depends(deps.get_current_active_superuser)
+):
+    """Memória, cobertura e hit/miss da janela quente do analytics."""
+    return hot_window.stats()
+
+@router.get("/events/stats", response_model=dict)
+async def read_event_bus_stats(
+    current_user: User = Depends(deps.get_current_active_superuser)
+):
+    """Filas dos assinantes pós-COMMIT (realtime, analytics) e eventos descartados por overflow."""
+    return event_bus.stats()
+
+@router.get("/ws/stats", response_model=dict)
+async def read_websocket_stats(
+    current_user: User = Depends(deps.get_current_active_superuser)
+):
+    """Conexões WebSocket deste worker: profundidade da fila, descartes e lag de envio."""
+    return manager.stats()
+
+@router.get("/analytics/cache/stats", response_model=dict)
+async def read_analytics_cache_stats(
+    current_user: User = Depends(deps.get_current_active_superuser)
+):
+    """Memória, hit/miss (por bucket) e invalidações do cache de buckets fechados."""
+    return analytics_cache.stats()
 
 # -----------------------------------------------------------------------------
 # LEITURA DE DADOS (Humano -> Servidor)
 # -----------------------------------------------------------------------------
+def filter_measurements(
+    query,
+    current_user: User,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    device_id: Optional[int] = None,
+):
+    """Isolamento por organização + filtros opcionais (listagem e exportação)."""
+    # TENANT ISOLATION: organization_id carimbado na ingestão (sem JOIN com Device)
+    query = query.where(Measurement.organization_id == current_user.organization_id)
+    
+    # Filtros opcionais
+    if device_id:
+        query = query.where(Measurement.device_id == device_id)
+        
+    if start_date: 
+        query = query.where(Measurement.created_at >= start_date)
+    if end_date: 
+        query = query.where(Measurement.created_at <= end_date)
+    return query
 
 @router.get("/", response_model=List[MeasurementPublic])
 async def read_measurements(
+    request: Request,
+    response: Response,
     session: AsyncSession = Depends(get_session),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     start_date: Optional[datetime] = None, 
     end_date: Optional[datetime] = None,
     device_id: Optional[int] = None,
     current_user: User = Depends(deps.get_current_active_user)
 ):
     """
-    Lista medições históricas.
+    Lista medições históricas (mais recentes primeiro).
+    Paginação: envie o header X-Next-Cursor da resposta como `cursor` para
+    obter a página seguinte (custo constante, estável durante a ingestão).
+    `skip` continua aceito por compatibilidade.
+    Com Accept: application/vnd.apache.arrow.stream, responde em Arrow IPC.
+    Intervalos anteriores ao arquivo frio continuam no arquivo Parquet (mesma ordem).
     SECURITY: Filtra rigorosamente pela Organização do usuário.
     """
-    # TENANT ISOLATION: Join com Device para filtrar por Organization
-    query = select(Measurement).join(Device)
-    query = query.where(Device.organization_id == current_user.organization_id)
-    
-    # Filtros opcionais
-    if device_id:
-        query = query.where(Measurement.device_id == device_id)
-        
-    if start_date: 
-        query = query.where(Measurement.created_at >= start_date)
-    if end_date: 
-        query = query.where(Measurement.created_at <= end_date)
-        
-    query = query.order_by(Measurement.created_at.desc()).offset(skip).limit(limit)
+    # Arrow: colunas direto do banco, sem instanciar entidades do ORM
+    arrow = accepts_arrow(request)
+    columns = select(*EXPORT_COLUMNS) if arrow else select(Measurement)
+    query = filter_measurements(columns, current_user, start_date, end_date, device_id)
+
+    # Arquivo frio: o Postgres responde só a partir da fronteira arquivada
+    archived_until = cold_archive.reaches(start_date)
+    if archived_until:
+        query = query.where(Measurement.created_at >= archived_until)
+
+    # Keyset: continua logo após a última linha da página anterior
+    if cursor:
+        try:
+            query = query.where(after_cursor(Measurement.created_at, Measurement.id, cursor))
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # id desempata timestamps iguais: ordem total, sem linhas puladas ou repetidas
+    query = query.order_by(Measurement.created_at.desc(), Measurement.id.desc())
+    if skip:
+        query = query.offset(skip)
+    query = query.limit(limit)
     
     result = await session.exec(query)
-    return result.all()
+    measurements = result.all()
+
+    # Página incompleta: o restante vem do arquivo (mais antigo que tudo no Postgres)
+    if archived_until and len(measurements) < limit:
+        archive_skip = 0
+        if skip and not measurements:
+            hot_total = (await session.exec(
+                select(func.count()).select_from(query.limit(None).offset(None).order_by(None).subquery())
+            )).one()
+            archive_skip = max(0, skip - hot_total)
+        archived = await asyncio.to_thread(
+            cold_archive.read_page, current_user.organization_id, start_date, end_date, device_id,
+            cursor, limit - len(measurements), archive_skip,
+        )
+        if not arrow:
+            archived = [MeasurementPublic(**row._asdict()) for row in archived]
+        measurements = list(measurements) + archived
+
+    cursor_value = next_cursor(measurements, limit)
+    if arrow:
+        headers = {CURSOR_HEADER: cursor_value} if cursor_value else None
+        return arrow_response([record_batch(measurements, MEASUREMENT_SCHEMA)], MEASUREMENT_SCHEMA, headers)
+    if cursor_value:
+        response.headers[CURSOR_HEADER] = cursor_value
+    return measurements
+
+@router.get("/export")
+async def export_measurements(
+    request: Request,
+    session: AsyncSession = Depends(get_session), # Escopo da request: fechada só após o fim do stream
+    format: Literal['ndjson', 'csv', 'parquet'] = 'ndjson',
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    device_id: Optional[int] = None,
+    current_user: User = Depends(deps.get_current_active_user)
+):
+    """
+    Exporta medições em streaming (memória constante, qualquer volume).
+    Mesmos filtros e isolamento de `read_measurements`, inclusive o arquivo frio.
+    NDJSON/CSV são comprimidos com gzip se o cliente enviar Accept-Encoding: gzip
+    (Parquet já sai comprimido internamente).
+    SECURITY: Filtra rigorosamente pela Organização do usuário.
+    """
+    query = filter_measurements(select(*EXPORT_COLUMNS), current_user, start_date, end_date, device_id)
+    query = query.order_by(Measurement.created_at.asc(), Measurement.id.asc())
+
+    # Arquivo frio primeiro (linhas mais antigas), depois o Postgres a partir da fronteira
+    archived = None
+    archived_until = cold_archive.reaches(start_date)
+    if archived_until:
+        query = query.where(Measurement.created_at >= archived_until)
+        archived = cold_archive.batches(current_user.organization_id, start_date, end_date, device_id)
+
+    gzip = format != 'parquet' and 'gzip' in request.headers.get('accept-encoding', '').lower()
+    headers = {
+        "Content-Disposition": f'attachment; filename="measurements.{format}"',
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        export_stream(session, query, format, gzip=gzip, archived=archived),
+        media_type=MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+async def compute_buckets(
+    session: AsyncSession,
+    organization_id: int,
+    bucket_size: str,
+    start: datetime,
+    end: datetime,
+    filters: dict,
+) -> List[dict]:
+    """Agregados de [start, end): janela quente, ou rollups/Postgres + arquivo frio."""
+    # Janela quente em memória: períodos recentes sem tocar no banco
+    buckets = hot_window.query_buckets(organization_id, bucket_size, start, end, **filters)
+    if buckets is not None:
+        return buckets
+
+    # Só linhas já agregadas são arquivadas: antes da fronteira os rollups
+    # cobrem tudo. O Parquet responde apenas onde os rollups da resolução
+    # do bucket já expiraram (ex: bucket de 5m além da retenção dos minutos)
+    db_start = start
+    archived_until = cold_archive.reaches(start)
+    if archived_until:
+        resolution = pick_resolution(parse_bucket(bucket_size))
+        org = await session.get(Organization, organization_id)
+        rollups_since = rollups_retained_since(org, resolution, datetime.utcnow())
+        if rollups_since and rollups_since > start:
+            db_start = min(ceil_bucket(rollups_since, RESOLUTION_WIDTHS[resolution]), archived_until)
+
+    # Rollup mais grosso que divide o bucket + dados brutos só do que ainda não foi agregado
+    buckets = await query_buckets(session, organization_id, bucket_size, db_start, end, **filters) if db_start < end else []
+
+    # Um bucket que atravessa o corte tem parte em cada lado: soma, não concatena
+    if db_start > start:
+        archived = await asyncio.to_thread(
+            cold_archive.aggregate, organization_id, bucket_size, start, min(end, db_start), **filters
+        )
+        buckets = merge_buckets(archived, buckets)
+    return buckets
 
 @router.get("/analytics/", response_model=List[MeasurementAnalytics])
 async def get_analytics(
+    request: Request,
     session: AsyncSession = Depends(get_session),
     period: Literal['1h', '1d', '1w', '1m'] = '1d',
-    bucket_size: Literal['minute', 'hour', 'day'] = 'hour',
+    start: Optional[datetime] = Query(None, description="Início (UTC). Tem precedência sobre `period`."),
+    end: Optional[datetime] = Query(None, description="Fim exclusivo (UTC). Padrão: agora."),
+    bucket_size: str = Query('hour', description="minute, hour, day ou <n>m/<n>h/<n>d (ex: 5m, 15m, 6h)."),
+    group_by: Literal['sensor', 'device'] = 'sensor',
+    device_id: Optional[int] = None,
+    sensor_type_id: Optional[int] = None,
     current_user: User = Depends(deps.get_current_active_user)
 ):
     """
-    Retorna dados agregados (Média, Min, Max).
+    Retorna dados agregados (Média, Min, Max) por bucket e sensor, ou por
+    bucket, dispositivo e sensor com group_by=device.
+    Com Accept: application/vnd.apache.arrow.stream, responde em Arrow IPC.
     SECURITY: Agrega apenas dados da Organização do usuário.
     """
     try:
-        now = datetime.utcnow()
-        if period == '1h': start_date = now - timedelta(hours=1)
-        elif period == '1d': start_date = now - timedelta(days=1)
-        elif period == '1w': start_date = now - timedelta(weeks=1)
-        elif period == '1m': start_date = now - timedelta(days=30)
-        else: start_date = now - timedelta(days=1)
-
-        bucket_expression = func.date_trunc(bucket_size, Measurement.created_at).label("bucket")
-
-        # Query Complexa com Join de Segurança
-        query = (
-            select(
-                bucket_expression,
-                Measurement.sensor_type_id,
-                func.avg(Measurement.value).label("avg_value"),
-                func.min(Measurement.value).label("min_value"),
-                func.max(Measurement.value).label("max_value"),
-                func.count(Measurement.id).label("count")
-            )
-            .join(Device, Measurement.device_id == Device.id)
-            .where(Device.organization_id == current_user.organization_id)
-            .where(Measurement.created_at >= start_date)
-            .group_by(bucket_expression, Measurement.sensor_type_id)
-            .order_by(asc(bucket_expression))
+        width = parse_bucket(bucket_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    now = datetime.utcnow()
+    if start is None:
+        if period == '1h': start = now - timedelta(hours=1)
+        elif period == '1d': start = now - timedelta(days=1)
+        elif period == '1w': start = now - timedelta(weeks=1)
+        elif period == '1m': start = now - timedelta(days=30)
+        else: start = now - timedelta(days=1)
+    # Datas com fuso viram UTC ingênuo (o banco guarda UTC sem fuso)
+    start, end = (
+        moment.astimezone(timezone.utc).replace(tzinfo=None) if moment and moment.tzinfo else moment
+        for moment in (start, end or now)
+    )
+    if end <= start:
+        raise HTTPException(status_code=400, detail="`end` deve ser posterior a `start`.")
+
+    # Intervalo alinhado aos buckets: nenhum bucket parcial nas pontas
+    start, end = floor_bucket(start, width), ceil_bucket(end, width)
+    if (end - start) // width > settings.ANALYTICS_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Intervalo com mais de {settings.ANALYTICS_MAX_BUCKETS} buckets de {bucket_size}; use um bucket maior.",
         )
+    filters = {"group_by": group_by, "device_id": device_id or None, "sensor_type_id": sensor_type_id or None}
 
-        result = await session.exec(query)
-        results = result.all()
-        
-        analytics_data = []
-        for row in results:
-            analytics_data.append(MeasurementAnalytics(
-                bucket=row[0], 
-                sensor_type_id=row[1],
-                avg_value=round(float(row[2]), 2) if row[2] is not None else 0.0,
-                min_value=float(row[3]) if row[3] is not None else 0.0,
-                max_value=float(row[4]) if row[4] is not None else 0.0,
-                count=int(row[5])
-            ))
-        return analytics_data
+    try:
+        # Buckets fechados vêm do cache; só o aberto (e o que faltar) é calculado
+        scope = Scope(current_user.organization_id, **filters)
+        generation = analytics_cache.generation()
+        buckets, missing = analytics_cache.get_range(scope, width, start, end)
+        for gap_start, gap_end in missing:
+            computed = await compute_buckets(session, current_user.organization_id, bucket_size, gap_start, gap_end, filters)
+            analytics_cache.put_range(scope, width, gap_start, gap_end, computed, closed_before=now, generation=generation)
+            buckets.extend(computed)
+        buckets.sort(key=bucket_key)
+
+        # Linhas na ordem de ANALYTICS_SCHEMA (mesma ordem dos campos de MeasurementAnalytics)
+        rows = [
+            (
+                row["bucket"],
+                row["sensor_type_id"],
+                round(row["sum_value"] / row["count"], 2) if row["count"] else 0.0,
+                float(row["min_value"]) if row["min_value"] is not None else 0.0,
+                float(row["max_value"]) if row["max_value"] is not None else 0.0,
+                int(row["count"]),
+                row["device_id"],
+            )
+            for row in buckets
+        ]
+        if accepts_arrow(request):
+            return arrow_response([record_batch(rows, ANALYTICS_SCHEMA)], ANALYTICS_SCHEMA)
+
+        return [MeasurementAnalytics(**dict(zip(ANALYTICS_SCHEMA.names, row))) for row in rows]
 
     except Exception as e:
         print(f"❌ ERRO CRÍTICO NO ANALYTICS: {e}")
@@ -221,18 +560,31 @@ async def get_analytics(
 @router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket,
-    organization_id: int = Depends(get_current_user_ws)
+    organization_id: int = Depends(get_current_user_ws),
+    encoding: Literal["json", "msgpack"] = Query("json", description="json (texto) ou msgpack (frames binários)"),
 ):
     """
     Endpoint WebSocket Autenticado e Isolado.
     Requer token JWT na query string: ws://host/api/v1/measurements/ws?token=<access_token>
+    Com `&encoding=msgpack` as mensagens chegam como frames binários MessagePack.
+
+    Sem assinatura o cliente recebe todas as leituras da organização. Para filtrar:
+        {"action": "subscribe", "device_ids": [1, 2], "sensor_type_ids": [3], "locations": ["Galpão A"]}
+        {"action": "unsubscribe", "device_ids": [2]}
+        {"action": "unsubscribe"}  -> volta a receber tudo
+    Cada mensagem recebe uma resposta {"type": "subscription", ...} (ou {"type": "error", ...})
+    pela mesma fila das leituras.
     """
-    await manager.connect(websocket, organization_id)
+    await manager.connect(websocket, organization_id, encoding=encoding)
     try:
         while True:
-            # Mantém a conexão ativa.
-            # Como é push-notification (Server -> Client), não processamos input aqui.
-            await websocket.receive_text()
-            
+            raw = await websocket.receive_text()
+            reply = await handle_subscription(websocket, organization_id, raw)
+            manager.send(websocket, organization_id, reply)
+
     except WebSocketDisconnect:
+        pass
+    except RuntimeError:
+        pass # Socket já fechado pelo servidor (cliente lento evictado)
+    finally:
         manager.disconnect(websocket, organization_id)
\ No newline at end of file
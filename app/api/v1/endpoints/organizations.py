@@ -1,3 +1,4 @@
+from dataclasses import asdict
 from typing import List, Any
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import select
@@ -5,6 +6,7 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.api.v1 import deps
 from app.core.database import get_session
+from app.core.retention import retention_worker
 from app.models.organization import Organization
 from app.models.user import User
 from app.schemas.organization import OrganizationCreate, OrganizationRead, OrganizationUpdate
@@ -54,6 +56,18 @@ async def read_organizations(
     result = await session.exec(query)
     return result.all()
 
+@router.get("/retention/report", response_model=dict)
+async def read_retention_report(
+    current_user: User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Resultado da última rodada de retenção (linhas e bytes liberados por organização).
+    """
+    return {
+        "last_run_at": retention_worker.last_run_at,
+        "reports": [asdict(report) for report in retention_worker.last_reports],
+    }
+
 @router.get("/{organization_id}", response_model=OrganizationRead)
 async def read_organization(
     organization_id: int,
@@ -0,0 +1,281 @@
+"""
+Cache de resultados do analytics por bucket fechado.
+
+Um bucket que já terminou não muda mais, exceto por leitura atrasada,
+backfill, re-calibração ou retenção. Por isso ele fica em cache sem TTL. A
+cada refresh do gráfico, só o bucket aberto (e o que faltar no cache) é
+recalculado.
+
+- Chave: (organização, group_by, device_id, sensor_type_id, largura, início
+  do bucket). Buckets fechados e vazios também entram: "não há dados" é uma
+  resposta válida.
+- Invalidação precisa: cada leitura gravada (`publish_measurements`) remove
+  só as entradas do bucket em que caiu, em cada largura em cache da org,
+  respeitando os filtros (device/sensor) da entrada. Re-calibração remove o
+  intervalo do par dispositivo/sensor. Retenção remove o que ficou antes do
+  corte.
+- Corrida com a ingestão: cada invalidação entra num log curto (sequência,
+  org, leitura mais antiga). Ao gravar, um resultado calculado durante uma
+  invalidação concorrente só guarda os buckets que terminam antes da
+  leitura mais antiga dela (os outros podem não contê-la). Leituras em
+  tempo real caem no bucket aberto e não impedem nada de ser gravado.
+- LRU por memória (estimativa do tamanho de cada entrada), limitada a
+  ANALYTICS_CACHE_MAX_BYTES.
+
+Processo único: cada worker tem o seu cache, invalidado só pela sua
+ingestão. Com mais de um worker, a escrita feita em outro worker não chega
+aqui e o cache serviria buckets velhos sem prazo. Por isso ele vem
+desligado (ANALYTICS_CACHE_ENABLED) e, mesmo ligado, não sobe com
+WEB_CONCURRENCY > 1 nem com o broadcast entre instâncias (`cache_enabled`).
+"""
+import logging
+import sys
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from cachetools import LRUCache
+
+from app.core.config import settings
+from app.core.rollups import floor_bucket
+
+logger = logging.getLogger(__name__)
+
+# Invalidações lembradas por org (e globais) para detectar corridas na gravação
+WRITE_LOG_SIZE = 256
+
+class Scope(NamedTuple):
+    """Consulta do analytics sem o intervalo de tempo."""
+    organization_id: int
+    group_by: str
+    device_id: Optional[int]
+    sensor_type_id: Optional[int]
+
+    def matches(self, device_id: int, sensor_type_id: int) -> bool:
+        return (self.device_id is None or self.device_id == device_id) and (
+            self.sensor_type_id is None or self.sensor_type_id == sensor_type_id
+        )
+
+CacheKey = Tuple[Scope, timedelta, datetime] # (consulta, largura, início do bucket)
+
+def _entry_size(value: tuple) -> int:
+    return sys.getsizeof(value) + sum(
+        sys.getsizeof(bucket) + sum(sys.getsizeof(item) for item in bucket.values()) for bucket in value
+    )
+
+class _IndexedLRU(LRUCache):
+    """LRUCache que avisa quando uma entrada sai (evicção ou invalidação)."""
+
+    def __init__(self, maxsize: int, on_delete):
+        super().__init__(maxsize=maxsize, getsizeof=_entry_size)
+        self._on_delete = on_delete
+        self.evictions = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super().popitem()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._on_delete(key)
+
+class AnalyticsCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, enabled: bool = True):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._entries = _IndexedLRU(max_bytes, self._unindex)
+        # (org, largura, início do bucket) -> chaves: invalidação sem varrer o cache
+        self._index: Dict[Tuple[int, timedelta, datetime], Set[CacheKey]] = defaultdict(set)
+        self._widths: Dict[int, Counter] = defaultdict(Counter) # Larguras em cache por org
+        self._seq = 0
+        # org (None = todas) -> [(sequência, leitura mais antiga invalidada)]
+        self._writes: Dict[Optional[int], Deque[Tuple[int, datetime]]] = defaultdict(lambda: deque(maxlen=WRITE_LOG_SIZE))
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    # -------------------------------------------------------------------------
+    # ÍNDICE
+    # -------------------------------------------------------------------------
+    def _unindex(self, key: CacheKey):
+        scope, width, start = key
+        org = scope.organization_id
+        index_key = (org, width, start)
+        self._index[index_key].discard(key)
+        if not self._index[index_key]:
+            del self._index[index_key]
+        self._widths[org][width] -= 1
+        if self._widths[org][width] <= 0:
+            del self._widths[org][width]
+
+    def _record(self, organization_id: Optional[int], earliest: datetime):
+        self._seq += 1
+        self._writes[organization_id].append((self._seq, earliest))
+
+    def _stable_until(self, organization_id: int, generation: int) -> datetime:
+        """Até onde um resultado calculado desde `generation` não foi afetado por invalidações."""
+        limit = datetime.max
+        for org in (organization_id, None):
+            log = self._writes.get(org)
+            if not log:
+                continue
+            if len(log) == log.maxlen and log[0][0] > generation:
+                return datetime.min # Log já descartou invalidações do período: não grava
+            limit = min([limit] + [earliest for seq, earliest in log if seq > generation])
+        return limit
+
+    # -------------------------------------------------------------------------
+    # LEITURA / ESCRITA
+    # -------------------------------------------------------------------------
+    def generation(self) -> int:
+        """Marca a ser passada ao put_range do resultado calculado a partir de agora."""
+        return self._seq
+
+    def get_range(
+        self, scope: Scope, width: timedelta, start: datetime, end: datetime, max_gaps: int = 4
+    ) -> Tuple[List[dict], List[Tuple[datetime, datetime]]]:
+        """
+        Buckets em cache de [start, end) (alinhados a `width`) e os trechos
+        contíguos que faltam, para serem calculados de uma vez cada. Com
+        mais de `max_gaps` trechos (cache esburacado pelo LRU), recalcula
+        do primeiro ao último numa consulta só.
+        """
+        found: List[dict] = []
+        missing: List[Tuple[datetime, datetime]] = []
+        moment = start
+        while moment < end:
+            value = self._entries.get((scope, width, moment)) if self.enabled else None
+            if value is None:
+                self.misses += 1
+                if missing and missing[-1][1] == moment:
+                    missing[-1] = (missing[-1][0], moment + width)
+                else:
+                    missing.append((moment, moment + width))
+            else:
+                self.hits += 1
+                found.extend(value)
+            moment += width
+        if len(missing) > max_gaps:
+            gap_start, gap_end = missing[0][0], missing[-1][1]
+            found = [bucket for bucket in found if not gap_start <= bucket["bucket"] < gap_end]
+            missing = [(gap_start, gap_end)]
+        return found, missing
+
+    def put_range(
+        self,
+        scope: Scope,
+        width: timedelta,
+        start: datetime,
+        end: datetime,
+        buckets: Iterable[dict],
+        closed_before: datetime,
+        generation: int,
+    ):
+        """Grava os buckets FECHADOS (fim <= closed_before) de [start, end), inclusive os vazios."""
+        if not self.enabled:
+            return
+        closed_before = min(closed_before, self._stable_until(scope.organization_id, generation))
+        by_start: Dict[datetime, List[dict]] = defaultdict(list)
+        for bucket in buckets:
+            by_start[bucket["bucket"]].append(bucket)
+        moment = start
+        while moment < end and moment + width <= closed_before:
+            key = (scope, width, moment)
+            if key not in self._entries:
+                try:
+                    self._entries[key] = tuple(by_start.get(moment, ()))
+                except ValueError: # Entrada maior que o cache inteiro
+                    pass
+                else:
+                    self._index[(scope.organization_id, width, moment)].add(key)
+                    self._widths[scope.organization_id][width] += 1
+            moment += width
+
+    # -------------------------------------------------------------------------
+    # INVALIDAÇÃO
+    # -------------------------------------------------------------------------
+    def _drop(self, keys: Iterable[CacheKey]) -> int:
+        dropped = 0
+        for key in list(keys):
+            if self._entries.pop(key, None) is not None:
+                dropped += 1
+        self.invalidations += dropped
+        return dropped
+
+    def invalidate_rows(self, rows: Sequence) -> int:
+        """Leituras gravadas (organization_id, device_id, sensor_type_id, created_at)."""
+        stale: Set[CacheKey] = set()
+        earliest: Dict[int, datetime] = {}
+        seen: Set[tuple] = set()
+        for row in rows:
+            org = row.organization_id
+            if org is None:
+                continue
+            earliest[org] = min(earliest.get(org, row.created_at), row.created_at)
+            for width in self._widths.get(org, ()):
+                start = floor_bucket(row.created_at, width)
+                marker = (org, row.device_id, row.sensor_type_id, width, start)
+                if marker in seen:
+                    continue
+                seen.add(marker)
+                for key in self._index.get((org, width, start), ()):
+                    if key[0].matches(row.device_id, row.sensor_type_id):
+                        stale.add(key)
+        for org, moment in earliest.items():
+            self._record(org, moment)
+        return self._drop(stale)
+
+    def invalidate_range(self, device_id: int, sensor_type_id: int, start: Optional[datetime], end: Optional[datetime]) -> int:
+        """Buckets que intersectam [start, end] do par dispositivo/sensor (re-calibração)."""
+        stale = [
+            key for key in self._entries
+            if key[0].matches(device_id, sensor_type_id)
+            and (end is None or key[2] <= end)
+            and (start is None or key[2] + key[1] > start)
+        ]
+        self._record(None, start or datetime.min) # Org do dispositivo desconhecida aqui
+        return self._drop(stale)
+
+    def invalidate_organization(self, organization_id: int, before: Optional[datetime] = None) -> int:
+        """Tudo da org (ou só os buckets que começam antes de `before`, na retenção)."""
+        self._record(organization_id, datetime.min)
+        return self._drop(
+            key for key in self._entries
+            if key[0].organization_id == organization_id and (before is None or key[2] < before)
+        )
+
+    def clear(self):
+        self._record(None, datetime.min)
+        self._drop(list(self._entries))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._entries.currsize,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+            "invalidations": self.invalidations,
+            "evictions": self._entries.evictions,
+        }
+
+def cache_enabled(enabled: bool, workers: int, backend: str = "memory") -> bool:
+    """
+    O cache só vale com um worker: a invalidação é local e não há TTL.
+    Com vários workers (ou instâncias ligadas pelo broadcast), fica desligado.
+    """
+    if enabled and (workers > 1 or backend != "memory"):
+        logger.warning(
+            f"⚠️ Cache do analytics desligado: invalidação é por worker "
+            f"(WEB_CONCURRENCY={workers}, BROADCAST_BACKEND={backend!r})."
+        )
+        return False
+    return enabled
+
+analytics_cache = AnalyticsCache(
+    max_bytes=settings.ANALYTICS_CACHE_MAX_BYTES,
+    enabled=cache_enabled(settings.ANALYTICS_CACHE_ENABLED, settings.WEB_CONCURRENCY, settings.BROADCAST_BACKEND),
+)
@@ -0,0 +1,530 @@
+"""
+Arquivo frio: partições fechadas de `measurements` em Parquet no disco local.
+
+Layout (particionamento hive, um arquivo por execução sobre a faixa de origem):
+    {ARCHIVE_PATH}/organization_id=7/date=2026-01-31/measurements_p20260131-1001-2000.parquet
+    {ARCHIVE_PATH}/_manifest.json  -> {"archived_until": "...", "ranges": [...]}
+
+O sufixo é a faixa de ids exportada (min-max). Uma linha atrasada que cai
+num dia já arquivado vai para um arquivo novo na próxima execução, sem
+sobrescrever o anterior; repetir a mesma exportação (queda antes do
+DELETE) gera o mesmo nome e substitui o arquivo incompleto.
+
+Cada arquivo é escrito em ordem de (created_at, id), com row groups de
+ARCHIVE_ROW_GROUP_SIZE linhas. Assim, as estatísticas min/max de cada row
+group permitem ao `pyarrow.dataset` pular o que não bate com o filtro
+(predicate pushdown).
+
+Ordem de cada faixa arquivada (idempotente: rodar de novo reescreve os
+mesmos arquivos):
+  1. Downsampling: só linhas já agregadas nos rollups saem do Postgres.
+  2. Parquet gravado em arquivo temporário, fsync, rename.
+  3. Manifesto avança `archived_until` (fim da faixa).
+  4. DROP da partição (ou DELETE pelos ids exportados numa única transação,
+     sem particionamento).
+
+As leituras tratam `archived_until` como fronteira: o Postgres responde por
+created_at >= archived_until e o arquivo pelo que vem antes, então uma faixa
+nunca é contada duas vezes, nem entre os passos 3 e 4. Por isso a ingestão
+rejeita leituras anteriores à fronteira (`accepts`); as que entrarem por
+outro caminho (carga em massa) ficam invisíveis até a próxima execução,
+que as arquiva num arquivo novo do dia.
+
+O analytics não depende do Parquet antes da fronteira: tudo o que foi
+arquivado já está nos rollups, que respondem enquanto a resolução do
+bucket estiver retida. O `aggregate` só cobre o trecho em que os rollups
+dessa resolução já expiraram.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import delete, func, or_, text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.arrow_ipc import MEASUREMENT_SCHEMA, record_batch
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.export import EXPORT_COLUMNS, FIELDS, fetch_batches
+from app.core.pagination import decode_cursor
+from app.core.partitions import LOCK_TIMEOUT, Partition, drop_partition, is_partitioned, list_partitions, partition_name, period_start
+from app.core.rollups import WATERMARK_NAME, floor_bucket, merge_buckets, parse_bucket, rollup_new_rows
+from app.models.measurement import Measurement
+from app.models.measurement_rollup import RollupWatermark
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "_manifest.json"
+
+# Linha vinda do arquivo: mesmos campos/ordem de EXPORT_COLUMNS (created_at sem fuso, como no banco)
+ArchivedMeasurement = namedtuple("ArchivedMeasurement", FIELDS)
+
+_TIMESTAMP = MEASUREMENT_SCHEMA.field("created_at").type
+
+def _ts(moment: datetime) -> pa.Scalar:
+    return pa.scalar(moment, type=_TIMESTAMP)
+
+def _rows(table: pa.Table) -> List[ArchivedMeasurement]:
+    table = table.set_column(
+        table.schema.get_field_index("created_at"), "created_at", pc.cast(table["created_at"], pa.timestamp("us"))
+    )
+    columns = [table.column(name).to_pylist() for name in FIELDS]
+    return [ArchivedMeasurement(*row) for row in zip(*columns)]
+
+def _fsync_dir(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class ArchiveWriter:
+    """
+    Recebe linhas ordenadas por (organization_id, created_at, id) e mantém um
+    único ParquetWriter aberto por vez (uma chave organização/dia).
+    """
+
+    def __init__(self, root: Path, name: str, row_group_size: int):
+        self.root = root
+        self.name = name
+        self.row_group_size = row_group_size
+        self.files: List[Path] = []
+        self.rows = 0
+        self._key: Optional[Tuple[int, date]] = None
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._pending: List[tuple] = []
+
+    def _path(self, organization_id: int, day: date) -> Path:
+        return self.root / f"organization_id={organization_id}" / f"date={day.isoformat()}" / f"{self.name}.parquet"
+
+    def _flush(self, final: bool = False):
+        # Row groups completos: as estatísticas ficam com a granularidade configurada
+        while len(self._pending) >= self.row_group_size or (final and self._pending):
+            chunk, self._pending = self._pending[:self.row_group_size], self._pending[self.row_group_size:]
+            self._writer.write_batch(record_batch(chunk, MEASUREMENT_SCHEMA), row_group_size=self.row_group_size)
+
+    def _close_current(self):
+        if self._writer is None:
+            return
+        self._flush(final=True)
+        self._writer.close()
+        path = self._path(*self._key)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _fsync_dir(path.parent)
+        self.files.append(path)
+        self._writer = None
+
+    def write(self, rows: Sequence[tuple]):
+        """Linhas: (organization_id, *EXPORT_COLUMNS)."""
+        for key, group in itertools.groupby(rows, key=lambda row: (row[0], row[-1].date())):
+            if key != self._key:
+                self._close_current()
+                self._key = key
+                path = self._path(*key)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self._writer = pq.ParquetWriter(path.with_name(f".{path.name}.tmp"), MEASUREMENT_SCHEMA, compression="zstd")
+            group = [row[1:] for row in group]
+            self.rows += len(group)
+            self._pending.extend(group)
+            self._flush()
+
+    def close(self) -> List[Path]:
+        self._close_current()
+        return self.files
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            path = self._path(*self._key)
+            path.with_name(f".{path.name}.tmp").unlink(missing_ok=True)
+            self._writer = None
+
+class ColdArchive:
+    """Leitura (federação) e manutenção do arquivo Parquet."""
+
+    def __init__(self, root: Optional[str]):
+        self.root = Path(root) if root else None
+        self._manifest: Tuple[Optional[int], dict] = (None, {})
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None
+
+    # -------------------------------------------------------------------------
+    # MANIFESTO
+    # -------------------------------------------------------------------------
+    def manifest(self) -> dict:
+        if not self.enabled:
+            return {}
+        try:
+            mtime = (self.root / MANIFEST).stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if self._manifest[0] != mtime:
+            self._manifest = (mtime, json.loads((self.root / MANIFEST).read_text()))
+        return self._manifest[1]
+
+    def archived_until(self) -> Optional[datetime]:
+        value = self.manifest().get("archived_until")
+        return datetime.fromisoformat(value) if value else None
+
+    def accepts(self, moment: datetime) -> bool:
+        """False se `moment` cai antes da fronteira (a leitura sumiria das consultas)."""
+        until = self.archived_until()
+        if until is None:
+            return True
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        return moment >= until
+
+    def reaches(self, start: Optional[datetime]) -> Optional[datetime]:
+        """Fronteira do arquivo, se o intervalo pedido começa antes dela (None = só Postgres)."""
+        until = self.archived_until()
+        if until and (start is None or start < until):
+            return until
+        return None
+
+    def advance(self, until: datetime, name: str):
+        manifest = dict(self.manifest())
+        current = manifest.get("archived_until")
+        if current is None or datetime.fromisoformat(current) < until:
+            manifest["archived_until"] = until.isoformat()
+        manifest["ranges"] = sorted(set(manifest.get("ranges", [])) | {name})
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f".{MANIFEST}.tmp"
+        tmp.write_text(json.dumps(manifest))
+        os.replace(tmp, self.root / MANIFEST)
+
+    # -------------------------------------------------------------------------
+    # LEITURA
+    # -------------------------------------------------------------------------
+    def _days(self, organization_id: int, start: Optional[datetime], end: Optional[datetime]) -> List[Tuple[date, Path]]:
+        """Diretórios date=... da organização dentro do intervalo, em ordem crescente."""
+        org_dir = self.root / f"organization_id={organization_id}"
+        if not org_dir.is_dir():
+            return []
+        days = []
+        for entry in org_dir.iterdir():
+            if not entry.name.startswith("date="):
+                continue
+            day = date.fromisoformat(entry.name[len("date="):])
+            if (start is None or day >= start.date()) and (end is None or day <= end.date()):
+                days.append((day, entry))
+        return sorted(days)
+
+    def _filter(self, until, start=None, end=None, device_id=None, cursor=None) -> ds.Expression:
+        created_at = ds.field("created_at")
+        expression = created_at < _ts(until)
+        if start:
+            expression &= created_at >= _ts(start)
+        if end:
+            expression &= created_at <= _ts(end)
+        if device_id:
+            expression &= ds.field("device_id") == device_id
+        if cursor:
+            moment, id = decode_cursor(cursor)
+            expression &= (created_at <= _ts(moment)) & ((created_at < _ts(moment)) | (ds.field("id") < id))
+        return expression
+
+    @staticmethod
+    def _dataset(directory: Path) -> ds.Dataset:
+        files = sorted(str(path) for path in directory.glob("*.parquet"))
+        return ds.dataset(files, schema=MEASUREMENT_SCHEMA, format="parquet")
+
+    def read_page(
+        self,
+        organization_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        device_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[ArchivedMeasurement]:
+        """Página em ordem (created_at DESC, id DESC), dia a dia até completar."""
+        until = self.archived_until()
+        if until is None:
+            return []
+        last_day = min(end, until) if end else until
+        if cursor:
+            last_day = min(last_day, decode_cursor(cursor)[0])
+        expression = self._filter(until, start, end, device_id, cursor)
+
+        rows: List[ArchivedMeasurement] = []
+        for _, directory in reversed(self._days(organization_id, start, last_day)):
+            table = self._dataset(directory).to_table(filter=expression)
+            if table.num_rows == 0:
+                continue
+            table = table.sort_by([("created_at", "descending"), ("id", "descending")])
+            rows.extend(_rows(table.slice(0, offset + limit - len(rows))))
+            if len(rows) >= offset + limit:
+                break
+        return rows[offset:offset + limit]
+
+    async def batches(
+        self,
+        organization_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        device_id: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> AsyncIterator[List[ArchivedMeasurement]]:
+        """Linhas em ordem (created_at, id), em blocos (exportação em streaming)."""
+        until = self.archived_until()
+        if until is None:
+            return
+        batch_size = batch_size or settings.MEASUREMENT_EXPORT_BATCH_SIZE
+        expression = self._filter(until, start, end, device_id)
+        for _, directory in self._days(organization_id, start, min(end, until) if end else until):
+            # Arquivos já ordenados: leitura sequencial preserva a ordem, um row group por vez
+            scanner = self._dataset(directory).scanner(filter=expression, batch_size=batch_size, use_threads=False)
+            batches = iter(scanner.to_batches())
+            while True:
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    break
+                if batch.num_rows:
+                    yield _rows(pa.Table.from_batches([batch]))
+
+    def aggregate(
+        self,
+        organization_id: int,
+        bucket_size: str,
+        start: datetime,
+        end: datetime,
+        group_by: str = "sensor",
+        device_id: Optional[int] = None,
+        sensor_type_id: Optional[int] = None,
+    ) -> List[dict]:
+        """Agregados em [start, end), no mesmo formato de rollups.query_buckets."""
+        width = parse_bucket(bucket_size)
+        start = floor_bucket(start, width)
+        until = self.archived_until()
+        if until is None:
+            return []
+        end = min(end, until)
+        expression = self._filter(until, start, device_id=device_id) & (ds.field("created_at") < _ts(end))
+        if sensor_type_id:
+            expression &= ds.field("sensor_type_id") == sensor_type_id
+        keys = ["bucket", "device_id", "sensor_type_id"] if group_by == "device" else ["bucket", "sensor_type_id"]
+        width_us = width // timedelta(microseconds=1)
+
+        # Agrega um dia por vez; buckets que atravessam dias (ex: 5h, 2d) são somados no fim
+        days = []
+        for _, directory in self._days(organization_id, start, end):
+            table = self._dataset(directory).to_table(columns=["created_at", "device_id", "sensor_type_id", "value"], filter=expression)
+            if table.num_rows == 0:
+                continue
+            micros = pc.cast(pc.cast(table["created_at"], pa.timestamp("us")), pa.int64())
+            grouped = pa.table({
+                "bucket": pc.cast(pc.multiply(pc.divide(micros, width_us), width_us), pa.timestamp("us")),
+                "device_id": table["device_id"],
+                "sensor_type_id": table["sensor_type_id"],
+                "value": table["value"],
+            }).group_by(keys).aggregate([
+                ("value", "sum"), ("value", "count"), ("value", "min"), ("value", "max"),
+            ])
+            days.append([
+                {
+                    "bucket": row["bucket"],
+                    "device_id": row.get("device_id"),
+                    "sensor_type_id": row["sensor_type_id"],
+                    "sum_value": row["value_sum"],
+                    "count": row["value_count"],
+                    "min_value": row["value_min"],
+                    "max_value": row["value_max"],
+                }
+                for row in grouped.to_pylist()
+            ])
+        return merge_buckets(*days)
+
+    # -------------------------------------------------------------------------
+    # RETENÇÃO
+    # -------------------------------------------------------------------------
+    def delete_before(self, organization_id: int, cutoff: datetime) -> int:
+        """Remove os dias da organização inteiramente anteriores ao cutoff. Retorna bytes liberados."""
+        if not self.enabled:
+            return 0
+        freed = 0
+        for day, directory in self._days(organization_id, None, cutoff):
+            if datetime.combine(day + timedelta(days=1), datetime.min.time()) > cutoff:
+                continue
+            freed += sum(path.stat().st_size for path in directory.glob("*.parquet"))
+            shutil.rmtree(directory)
+        return freed
+
+cold_archive = ColdArchive(settings.ARCHIVE_PATH)
+
+# -----------------------------------------------------------------------------
+# ARQUIVADOR (lifespan)
+# -----------------------------------------------------------------------------
+class Archiver:
+    def __init__(
+        self,
+        archive: ColdArchive = cold_archive,
+        session_factory=async_session_maker,
+        after_days: Optional[int] = None,
+        interval_seconds: int = 3600,
+        row_group_size: int = 100000,
+        chunk_size: int = 10000,
+    ):
+        self.archive = archive
+        self.session_factory = session_factory
+        self.after_days = after_days
+        self.interval = interval_seconds
+        self.row_group_size = row_group_size
+        self.chunk_size = chunk_size
+        self._task: Optional[asyncio.Task] = None
+
+    async def _closed_ranges(self, session: AsyncSession, cutoff: datetime) -> List[Tuple[str, Optional[datetime], datetime, Optional[Partition]]]:
+        """(nome, início, fim, partição) de cada faixa fechada antes do cutoff, em ordem."""
+        if await is_partitioned(session):
+            return [
+                (p.name, p.start, p.end, p)
+                for p in await list_partitions(session)
+                if p.end is not None and p.end <= cutoff
+            ]
+        # Sem particionamento (SQLite/testes ou antes da migração): faixas diárias
+        oldest = (await session.exec(select(func.min(Measurement.created_at)).where(Measurement.created_at < cutoff))).one()
+        ranges = []
+        day = period_start(oldest, "day") if oldest else cutoff
+        while day < cutoff:
+            ranges.append((partition_name(day), day, day + timedelta(days=1), None))
+            day += timedelta(days=1)
+        return ranges
+
+    async def run_once(self, now: Optional[datetime] = None) -> List[str]:
+        if not (self.archive.enabled and self.after_days):
+            return []
+        now = now or datetime.utcnow()
+        cutoff = period_start(now - timedelta(days=self.after_days), "day")
+
+        # 1. Downsampling antes de qualquer linha sair do Postgres
+        async with self.session_factory() as session:
+            await rollup_new_rows(session)
+            rolled_up_id = (await session.exec(
+                select(RollupWatermark.last_id).where(RollupWatermark.name == WATERMARK_NAME)
+            )).first() or 0
+            ranges = await self._closed_ranges(session, cutoff)
+
+        archived = []
+        for name, start, end, partition in ranges:
+            # Faixas contíguas: uma faixa bloqueada segura as seguintes (archived_until não pula buracos)
+            if not await self._archive_range(name, start, end, partition, rolled_up_id):
+                break
+            archived.append(name)
+        return archived
+
+    async def _archive_range(self, name: str, start: Optional[datetime], end: datetime, partition: Optional[Partition], rolled_up_id: int) -> bool:
+        bounds = [Measurement.created_at < end]
+        if start is not None:
+            bounds.append(Measurement.created_at >= start)
+
+        async with self.session_factory() as session:
+            if partition is not None:
+                # Bloqueia escritas atrasadas na partição (e outro arquivador) até o DROP
+                await session.exec(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+                await session.exec(text(f"LOCK TABLE {partition.name} IN SHARE ROW EXCLUSIVE MODE"))
+
+            blocked = (await session.exec(
+                select(Measurement.id)
+                .where(*bounds, or_(Measurement.id > rolled_up_id, Measurement.organization_id.is_(None)))
+                .limit(1)
+            )).first()
+            if blocked:
+                logger.warning(f"⏸️ Arquivo frio: {name} tem linhas ainda não agregadas ou sem organização; tentando depois.")
+                return False
+
+            # Nome do arquivo = faixa de ids desta execução (nunca sobrescreve outra execução)
+            first_id, last_id = (await session.exec(select(func.min(Measurement.id), func.max(Measurement.id)).where(*bounds))).one()
+            if first_id is not None:
+                bounds.append(Measurement.id <= last_id)
+            writer = ArchiveWriter(self.archive.root, f"{name}-{first_id}-{last_id}", self.row_group_size)
+            exported_ids: List[np.ndarray] = []
+            query = (
+                select(Measurement.organization_id, *EXPORT_COLUMNS)
+                .where(*bounds)
+                .order_by(Measurement.organization_id, Measurement.created_at, Measurement.id)
+            )
+            try:
+                async for batch in fetch_batches(session, query, self.chunk_size):
+                    await asyncio.to_thread(writer.write, batch)
+                    if partition is None:
+                        exported_ids.append(np.fromiter((row[1] for row in batch), dtype=np.int64, count=len(batch)))
+                await asyncio.to_thread(writer.close)
+            except BaseException:
+                writer.abort()
+                raise
+
+            # Dados duráveis no disco: a fronteira avança antes de sair do Postgres
+            self.archive.advance(end, name)
+
+            if partition is not None:
+                freed = await drop_partition(session, partition)
+                await session.commit()
+                logger.info(f"🧊 {name} arquivada ({writer.rows} linhas, {len(writer.files)} arquivos, {freed / 1024 / 1024:.1f} MB liberados).")
+                return True
+            await session.commit()
+
+        # Sem partição: DELETE em blocos, só dos ids exportados. Uma transação só:
+        # uma queda no meio não deixa metade dos ids (a nova execução reescreve o mesmo arquivo)
+        ids = np.concatenate(exported_ids) if exported_ids else np.empty(0, dtype=np.int64)
+        async with self.session_factory() as session:
+            for offset in range(0, len(ids), self.chunk_size):
+                await session.exec(
+                    delete(Measurement)
+                    .where(Measurement.id.in_(ids[offset:offset + self.chunk_size].tolist()))
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+        if writer.rows:
+            logger.info(f"🧊 {name} arquivada ({writer.rows} linhas, {len(writer.files)} arquivos).")
+        return True
+
+    # -------------------------------------------------------------------------
+    # CICLO DE VIDA
+    # -------------------------------------------------------------------------
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Arquivamento falhou: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="archiver")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+archiver = Archiver(
+    after_days=settings.ARCHIVE_AFTER_DAYS,
+    interval_seconds=settings.ARCHIVE_INTERVAL_SECONDS,
+    row_group_size=settings.ARCHIVE_ROW_GROUP_SIZE,
+    chunk_size=settings.MEASUREMENT_EXPORT_BATCH_SIZE,
+)
@@ -0,0 +1,54 @@
+"""
+Respostas em Arrow IPC (stream) para clientes analíticos.
+
+Com `Accept: application/vnd.apache.arrow.stream`, os endpoints de leitura
+devolvem record batches colunares montados direto das linhas do banco, em
+vez de listas de objetos JSON. O cliente lê as colunas sem parsing e chega
+ao pandas/NumPy praticamente sem cópia (ver app/dashboard/utils.py).
+
+Timestamps vão como timestamp[us, UTC]: o banco guarda UTC sem fuso, e o
+cliente converte para o fuso local de forma vetorizada.
+"""
+from typing import Iterable, Optional, Sequence
+
+import pyarrow as pa
+from fastapi import Request, Response
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+MEASUREMENT_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("device_id", pa.int64()),
+    ("sensor_type_id", pa.int64()),
+    ("value", pa.float64()),
+    ("raw_value", pa.float64()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+])
+
+ANALYTICS_SCHEMA = pa.schema([
+    ("bucket", pa.timestamp("us", tz="UTC")),
+    ("sensor_type_id", pa.int64()),
+    ("avg_value", pa.float64()),
+    ("min_value", pa.float64()),
+    ("max_value", pa.float64()),
+    ("count", pa.int64()),
+    ("device_id", pa.int64()), # Nulo exceto com group_by=device
+])
+
+def accepts_arrow(request: Request) -> bool:
+    return ARROW_STREAM in request.headers.get("accept", "")
+
+def record_batch(rows: Sequence[tuple], schema: pa.Schema) -> pa.RecordBatch:
+    """Linhas do banco (tuplas na ordem do schema) -> um record batch colunar."""
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.record_batch(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+def arrow_response(batches: Iterable[pa.RecordBatch], schema: pa.Schema, headers: Optional[dict] = None) -> Response:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_STREAM, headers=headers)
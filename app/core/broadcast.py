@@ -0,0 +1,211 @@
+"""
+Backends de broadcast do realtime (fan-out entre processos).
+
+O ConnectionManager guarda os sockets de cada worker num dict local. Sem
+um backend compartilhado, uma leitura ingerida no worker A nunca chega aos
+dashboards conectados no worker B.
+
+- "memory": processo único. Publicar = entregar direto às conexões locais.
+- "postgres": publicar = NOTIFY no canal da organização
+  (`realtime_org_<id>`). Cada worker mantém UMA conexão LISTEN, inscrita
+  só nos canais das orgs com sockets locais, e entrega localmente o que
+  chega, inclusive o que ele mesmo publicou.
+
+Limite do NOTIFY: payload < 8000 bytes. As mensagens de uma ingestão vão
+empacotadas em arrays JSON de até BROADCAST_NOTIFY_MAX_BYTES, num único
+round-trip (`pg_notify` sobre `unnest`). Uma mensagem de medição tem
+tamanho fixo (~200 bytes), então nunca precisa ser quebrada.
+
+NOTIFY não é durável: o que for publicado enquanto a conexão LISTEN de um
+worker está caída não chega aos sockets dele (o dashboard segue com a
+próxima leitura).
+"""
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, List, Optional, Set, Union
+
+import asyncpg
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import DATABASE_URL, engine
+from app.core.frames import encode_json
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[int, List[dict]], Awaitable[None]]
+
+CHANNEL_PREFIX = "realtime_org_"
+
+def channel_name(organization_id: int) -> str:
+    return f"{CHANNEL_PREFIX}{int(organization_id)}"
+
+def pack_payloads(messages: List[dict], max_bytes: int) -> List[str]:
+    """Arrays JSON com o maior número de mensagens que cabe em `max_bytes` (UTF-8)."""
+    payloads: List[str] = []
+    current: List[str] = []
+    size = 2 # "[" + "]"
+    for message in messages:
+        encoded = encode_json(message)
+        length = len(encoded.encode())
+        if length + 2 > max_bytes:
+            logger.warning(f"⚠️ Mensagem de {length} bytes acima do limite do NOTIFY; descartada.")
+            continue
+        if current and size + 1 + length > max_bytes:
+            payloads.append(f"[{','.join(current)}]")
+            current, size = [], 2
+        size += length + (1 if current else 0)
+        current.append(encoded)
+    if current:
+        payloads.append(f"[{','.join(current)}]")
+    return payloads
+
+class MemoryBroadcast:
+    """Processo único: entrega direto às conexões locais."""
+
+    def __init__(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def subscribe(self, organization_id: int):
+        pass
+
+    async def unsubscribe(self, organization_id: int):
+        pass
+
+    async def publish(self, organization_id: int, messages: List[dict]):
+        await self.deliver(organization_id, messages)
+
+class PostgresBroadcast:
+    """NOTIFY por organização + uma conexão LISTEN por worker."""
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        dsn: str = DATABASE_URL,
+        max_bytes: int = 7900,
+        reconnect_seconds: float = 5,
+        engine=engine,
+    ):
+        self.deliver = deliver
+        self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self.max_bytes = max_bytes
+        self.reconnect_seconds = reconnect_seconds
+        self.engine = engine
+
+        self._wanted: Set[int] = set()    # Orgs com sockets locais
+        self._listening: Set[int] = set() # Canais com LISTEN ativo na conexão atual
+        self._connection = None
+        self._lock = asyncio.Lock()       # asyncpg: uma operação por vez na conexão
+        self._inbox: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.published = 0
+        self.received = 0
+
+    # -------------------------------------------------------------------------
+    # PUBLICAÇÃO
+    # -------------------------------------------------------------------------
+    async def publish(self, organization_id: int, messages: List[dict]):
+        payloads = pack_payloads(messages, self.max_bytes)
+        if not payloads:
+            return
+        # Autocommit: cada NOTIFY sai na hora (fora de transação)
+        async with self.engine.connect() as connection:
+            await connection.execute(
+                text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+                {"channel": channel_name(organization_id), "payloads": payloads},
+            )
+            await connection.commit()
+        self.published += len(payloads)
+
+    # -------------------------------------------------------------------------
+    # LISTEN
+    # -------------------------------------------------------------------------
+    def _on_notify(self, connection, pid, channel, payload):
+        self._inbox.put_nowait((int(channel[len(CHANNEL_PREFIX):]), payload))
+
+    async def _sync_channels(self):
+        """Alinha os LISTEN da conexão às orgs com sockets locais."""
+        async with self._lock:
+            if self._connection is None or self._connection.is_closed():
+                return
+            for org in self._wanted - self._listening:
+                await self._connection.add_listener(channel_name(org), self._on_notify)
+                self._listening.add(org)
+            for org in self._listening - self._wanted:
+                await self._connection.remove_listener(channel_name(org), self._on_notify)
+                self._listening.discard(org)
+
+    async def subscribe(self, organization_id: int):
+        self._wanted.add(organization_id)
+        await self._sync_channels()
+
+    async def unsubscribe(self, organization_id: int):
+        self._wanted.discard(organization_id)
+        await self._sync_channels()
+
+    async def _listen(self):
+        while True:
+            lost = asyncio.Event()
+            try:
+                self._connection = await asyncpg.connect(self.dsn)
+                self._connection.add_termination_listener(lambda connection: lost.set())
+                self._listening.clear()
+                await self._sync_channels()
+                logger.info(f"📡 LISTEN ativo para {len(self._listening)} organização(ões).")
+                await lost.wait()
+                logger.warning("⚠️ Conexão LISTEN perdida; reconectando.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Falha na conexão LISTEN: {e}")
+            finally:
+                connection, self._connection = self._connection, None
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self.reconnect_seconds)
+
+    async def _fan_out(self):
+        """Entrega local, na ordem em que as notificações chegaram."""
+        while True:
+            organization_id, payload = await self._inbox.get()
+            self.received += 1
+            try:
+                await self.deliver(organization_id, json.loads(payload))
+            except Exception as e:
+                logger.error(f"❌ Falha ao entregar notificação da Org {organization_id}: {e}")
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._inbox = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._listen(), name="broadcast-listen"),
+            asyncio.create_task(self._fan_out(), name="broadcast-fan-out"),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+def create_broadcast(deliver: Deliver, backend: Optional[str] = None) -> Union[MemoryBroadcast, PostgresBroadcast]:
+    if (backend or settings.BROADCAST_BACKEND) == "postgres":
+        return PostgresBroadcast(
+            deliver,
+            max_bytes=settings.BROADCAST_NOTIFY_MAX_BYTES,
+            reconnect_seconds=settings.BROADCAST_RECONNECT_SECONDS,
+        )
+    return MemoryBroadcast(deliver)
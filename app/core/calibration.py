@@ -1,6 +1,10 @@
 import ast
 import operator
 import math
+from functools import lru_cache
+from typing import Callable, NamedTuple, Type, Union
+
+import numpy as np
 
 # Operadores permitidos (Whitelist)
 OPERATORS = {
@@ -21,52 +25,206 @@ FUNCTIONS = {
     "round": round
 }
 
+def _finite_or_nan(value):
+    # No escalar, inf/nan intermediário vira exceção (fallback para o bruto).
+    # Aqui vira NaN, que se propaga até o fim e é trocado pelo valor bruto.
+    value = np.asarray(value, dtype=np.float64)
+    return np.where(np.isfinite(value), value, np.nan)
+
+def _vectorized(func):
+    return lambda *args: _finite_or_nan(func(*args))
+
+def _np_pow(base, exponent):
+    base = np.asarray(base, dtype=np.float64)
+    exponent = np.asarray(exponent, dtype=np.float64)
+    # nan ** 0 == 1 no IEEE: mantém o NaN (erro) explícito
+    invalid = np.isnan(base) | np.isnan(exponent)
+    return _finite_or_nan(np.where(invalid, np.nan, np.power(base, exponent)))
+
+def _np_log(value, base=None):
+    """math.log(x[, base]) vetorizado."""
+    if base is None:
+        return np.log(value)
+    return np.log(value) / np.log(base)
+
+def _np_round(value, ndigits=None):
+    """round(x[, n]) vetorizado (np.round também arredonda metade para o par)."""
+    if ndigits is None:
+        return np.round(value)
+
+    ndigits = operator.index(ndigits)
+    value = np.asarray(value, dtype=np.float64)
+    result = np.array(np.round(value, ndigits))
+
+    # np.round escala por 10**n e pode divergir do round() do Python (que usa o
+    # decimal exato) perto de .5: só esses casos vão para o round() escalar
+    scaled = value * 10.0 ** ndigits
+    near_half = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    if near_half.any():
+        result[near_half] = [round(float(v), ndigits) for v in value[near_half]]
+    return result
+
+# Mesma whitelist, mapeada para ufuncs do NumPy
+NUMPY_OPERATORS = {
+    ast.Add: _vectorized(np.add),
+    ast.Sub: _vectorized(np.subtract),
+    ast.Mult: _vectorized(np.multiply),
+    ast.Div: _vectorized(np.true_divide),
+    ast.Pow: _np_pow,
+    ast.USub: np.negative,
+    ast.UAdd: np.positive,
+}
+
+NUMPY_FUNCTIONS = {
+    "sqrt": _vectorized(np.sqrt),
+    "log": _vectorized(_np_log),
+    "abs": np.abs,
+    "round": _vectorized(_np_round)
+}
+
+# Limita o tamanho para evitar Denial of Service por memória
+MAX_FORMULA_LENGTH = 50
+
+# Quantidade de fórmulas compiladas mantidas em memória
+FORMULA_CACHE_SIZE = 1024
+
+class CalibrationError(ValueError):
+    """Fórmula de calibração inválida ou fora da whitelist."""
+
+class _NotVectorizable(CalibrationError):
+    """Fórmula válida, mas sem equivalente vetorizado exato (ex: constantes complexas)."""
+
+CompiledFormula = Callable[[float], float]
+
+class _CompileFailure(NamedTuple):
+    """Erro de compilação guardado no cache: só a classe e a mensagem (nunca a exceção)."""
+    error: Type[CalibrationError]
+    message: str
+
+    def exception(self) -> CalibrationError:
+        # Exceção nova a cada chamada: relançar a mesma instância acumularia traceback (e frames)
+        return self.error(self.message)
+
+def _compile_node(node: ast.AST, operators: dict = OPERATORS, functions: dict = FUNCTIONS) -> Callable:
+    """
+    Converte a AST (já restrita à whitelist) numa closure f(x).
+    Com as tabelas NUMPY_* a mesma closure opera sobre ndarrays.
+    """
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body, operators, functions)
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, complex) and functions is NUMPY_FUNCTIONS:
+            raise _NotVectorizable("Constante complexa")
+        if isinstance(value, (int, float, complex)):
+            return lambda x: value
+        raise CalibrationError(f"Constante não permitida: {value!r}")
+
+    if isinstance(node, ast.Name):
+        if node.id == 'x':
+            return lambda x: x
+        raise CalibrationError(f"Variável não permitida: {node.id}")
+
+    if isinstance(node, ast.BinOp) and type(node.op) in operators:
+        op = operators[type(node.op)]
+        left = _compile_node(node.left, operators, functions)
+        right = _compile_node(node.right, operators, functions)
+        return lambda x: op(left(x), right(x))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in operators:
+        op = operators[type(node.op)]
+        operand = _compile_node(node.operand, operators, functions)
+        return lambda x: op(operand(x))
+
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in functions
+        and not node.keywords
+    ):
+        func = functions[node.func.id]
+        args = [_compile_node(arg, operators, functions) for arg in node.args]
+        return lambda x: func(*[arg(x) for arg in args])
+
+    raise CalibrationError(f"Expressão inválida ou insegura: {type(node).__name__}")
+
+@lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def _compile_cached(formula: str, vectorized: bool = False) -> Union[CompiledFormula, _CompileFailure]:
+    # Erros também ficam no cache: uma fórmula inválida não é re-parseada a cada leitura
+    if len(formula) > MAX_FORMULA_LENGTH:
+        return _CompileFailure(CalibrationError, "Fórmula muito longa")
+    try:
+        tree = ast.parse(formula, mode='eval')
+    except SyntaxError as e:
+        return _CompileFailure(CalibrationError, f"Sintaxe inválida: {e.msg}")
+    try:
+        if vectorized:
+            return _compile_node(tree, NUMPY_OPERATORS, NUMPY_FUNCTIONS)
+        return _compile_node(tree)
+    except CalibrationError as e:
+        return _CompileFailure(type(e), str(e))
+
+def compile_formula(formula: str) -> CompiledFormula:
+    """
+    Valida e compila a fórmula UMA vez (memoizada por texto).
+    Levanta CalibrationError se a fórmula sair da whitelist.
+    """
+    compiled = _compile_cached(formula)
+    if isinstance(compiled, _CompileFailure):
+        raise compiled.exception()
+    return compiled
+
+def validate_formula(formula: str) -> None:
+    """Valida a fórmula no momento do cadastro (levanta CalibrationError)."""
+    if formula and formula.strip():
+        compile_formula(formula)
+
 def safe_eval(formula: str, x_value: float) -> float:
     """
     Avalia uma expressão matemática contendo 'x' de forma segura.
-    Não usa eval() nativo. Usa AST Parsing com whitelist.
-    
+    Não usa eval() nativo. Usa a closure compilada (AST com whitelist).
+    Fórmula inválida, erro numérico (domínio, divisão por zero, overflow) ou
+    resultado que não é um real finito (ex: x * 1e308 -> inf) devolvem o
+    valor bruto, a mesma regra de `calibrate_array`.
+
     Ex: safe_eval("x * 0.5 + 10", 100) -> 60.0
     """
     if not formula or not formula.strip():
         return x_value
 
     try:
-        # Limita o tamanho para evitar Denial of Service por memória
-        if len(formula) > 50:
-            raise ValueError("Fórmula muito longa")
-
-        # Parseia a string para uma árvore sintática abstrata (AST)
-        node = ast.parse(formula, mode='eval')
-        
-        def _eval(node):
-            if isinstance(node, ast.Expression):
-                return _eval(node.body)
-            elif isinstance(node, ast.Num):
-                return node.n
-            elif isinstance(node, ast.Constant):
-                return node.value
-            elif isinstance(node, ast.Name):
-                if node.id == 'x':
-                    return x_value
-                raise ValueError(f"Variável não permitida: {node.id}")
-            elif isinstance(node, ast.BinOp):
-                op = type(node.op)
-                if op in OPERATORS:
-                    return OPERATORS[op](_eval(node.left), _eval(node.right))
-            elif isinstance(node, ast.UnaryOp):
-                op = type(node.op)
-                if op in OPERATORS:
-                    return OPERATORS[op](_eval(node.operand))
-            elif isinstance(node, ast.Call):
-                if isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
-                    args = [_eval(arg) for arg in node.args]
-                    return FUNCTIONS[node.func.id](*args)
-            
-            raise ValueError(f"Expressão inválida ou insegura: {type(node)}")
-
-        return float(_eval(node))
-
-    except Exception as e:
-        print(f"Erro de Calibração (Fórmula: '{formula}'): {e}")
-        return x_value
\ No newline at end of file
+        compiled = compile_formula(formula)
+        result = float(compiled(x_value))
+    except Exception:
+        return x_value
+    return result if math.isfinite(result) else x_value
+
+def calibrate_array(formula: str, values) -> np.ndarray:
+    """
+    Versão vetorizada de safe_eval: aplica a fórmula a um ndarray inteiro de
+    uma vez (lotes, importações, re-calibração de histórico).
+
+    Mesmo comportamento de erro/fallback: fórmula inválida devolve os valores
+    brutos e cada elemento cujo resultado não é um real finito (domínio,
+    divisão por zero, overflow) mantém o seu valor bruto.
+    """
+    raw = np.asarray(values, dtype=np.float64)
+    if not formula or not formula.strip():
+        return raw.copy()
+
+    def scalar_fallback():
+        # Uso sem equivalente vetorizado (ex: round(x, x)): avalia elemento a elemento
+        return np.fromiter((safe_eval(formula, float(v)) for v in raw), dtype=np.float64, count=raw.size)
+
+    compiled = _compile_cached(formula, vectorized=True)
+    if isinstance(compiled, _CompileFailure):
+        return scalar_fallback() if compiled.error is _NotVectorizable else raw.copy()
+
+    with np.errstate(all="ignore"):
+        try:
+            result = np.broadcast_to(np.asarray(compiled(raw), dtype=np.float64), raw.shape)
+        except Exception:
+            return scalar_fallback()
+
+        return np.where(np.isfinite(result), result, raw)
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import field_validator, ValidationError, EmailStr, AnyHttpUrl
-from typing import List, Union
+from pydantic import field_validator, model_validator, ValidationError, EmailStr, AnyHttpUrl
+from typing import List, Literal, Optional, Union
 
 class Settings(BaseSettings):
     # Configuração do Pydantic V2
@@ -41,6 +41,13 @@ class Settings(BaseSettings):
             raise ValueError("A SECRET_KEY deve ter no mínimo 32 caracteres para segurança criptográfica.")
         return v
     
+    @model_validator(mode="after")
+    def check_hot_window_single_worker(self) -> "Settings":
+        # Com vários workers, cada janela veria só parte das leituras (totais errados)
+        if self.HOT_WINDOW_ENABLED and (self.WEB_CONCURRENCY > 1 or self.BROADCAST_BACKEND != "memory"):
+            raise ValueError("HOT_WINDOW_ENABLED exige um único worker (WEB_CONCURRENCY=1, BROADCAST_BACKEND=\"memory\").")
+        return self
+
     # --- CORS (Permite conexão do Frontend) ---
     # Aceita string separada por vírgula ou lista JSON
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
@@ -57,6 +64,87 @@ class Settings(BaseSettings):
     FIRST_SUPERUSER: EmailStr = "admin@iotlab.com"
     FIRST_SUPERUSER_PASSWORD: str = "admin123"
 
+    # --- Ingestão ---
+    # Máximo de leituras aceitas em um único POST /measurements/batch
+    MEASUREMENT_BATCH_MAX_SIZE: int = 1000
+
+    # Write-Behind (Group Commit): desligado por padrão
+    INGEST_BUFFER_ENABLED: bool = False
+    INGEST_BUFFER_MAX_SIZE: int = 10000           # Capacidade da fila em memória
+    INGEST_BUFFER_FLUSH_INTERVAL_MS: int = 200    # Grava a cada N ms...
+    INGEST_BUFFER_FLUSH_MAX_ROWS: int = 500       # ...ou a cada M linhas
+    # "flush": responde após o COMMIT | "enqueue": responde ao entrar na fila
+    INGEST_BUFFER_ACK_MODE: Literal["enqueue", "flush"] = "flush"
+
+    # Cache de autenticação de dispositivos (token -> device, sensores, fórmulas)
+    DEVICE_AUTH_CACHE_MAXSIZE: int = 10000
+    DEVICE_AUTH_CACHE_TTL_SECONDS: int = 60
+
+    # Re-calibração de histórico (jobs em background)
+    RECALIBRATION_CHUNK_SIZE: int = 5000     # Linhas por transação
+    RECALIBRATION_CHUNK_PAUSE_MS: int = 0    # Pausa entre blocos (alivia o banco)
+
+    # --- Particionamento de measurements (PostgreSQL) ---
+    MEASUREMENT_PARTITION_INTERVAL: Literal["day", "week"] = "day"
+    MEASUREMENT_PARTITION_PREMAKE: int = 7               # Partições futuras mantidas prontas
+    MEASUREMENT_PARTITION_CHECK_INTERVAL_SECONDS: int = 3600
+    # Retenção global: partições inteiramente mais antigas que N dias são DROPadas (None = mantém tudo),
+    # pelo RetentionWorker e só depois de agregadas nos rollups (e arquivadas, com ARCHIVE_AFTER_DAYS)
+    MEASUREMENT_RETENTION_DAYS: Optional[int] = None
+
+    # --- Rollups (minuto/hora/dia) para o analytics ---
+    ROLLUP_INTERVAL_SECONDS: int = 30       # Frequência do job incremental
+    ROLLUP_LAG_SECONDS: int = 60            # Espera antes de agregar ids novos (transações em voo)
+    ROLLUP_MAX_ROWS_PER_RUN: int = 200000   # Ids por transação (backfill em blocos)
+    ANALYTICS_MAX_BUCKETS: int = 10000      # Limite de buckets por consulta (ex: 5m em um ano = 105k -> 400)
+
+    # --- Retenção por organização (políticas em Organization) ---
+    RETENTION_INTERVAL_SECONDS: int = 3600
+    RETENTION_CHUNK_SIZE: int = 10000       # Linhas por DELETE/transação
+    RETENTION_CHUNK_PAUSE_MS: int = 50      # Pausa entre blocos (alivia WAL/replicação)
+
+    # --- Exportação de medições (streaming) ---
+    MEASUREMENT_EXPORT_BATCH_SIZE: int = 10000  # Linhas por fetch do cursor (e por row group no Parquet)
+    MEASUREMENT_EXPORT_GZIP_LEVEL: int = 6
+
+    # --- Processos ---
+    # Workers do uvicorn (é a variável que o `uvicorn --workers` lê por padrão).
+    # Caches em memória invalidados só pela ingestão local exigem 1 worker.
+    WEB_CONCURRENCY: int = 1
+
+    # --- Janela quente em memória (analytics de períodos recentes) ---
+    # Alimentada só pela ingestão do próprio worker: exige WEB_CONCURRENCY=1
+    HOT_WINDOW_ENABLED: bool = False
+    HOT_WINDOW_HOURS: int = 48                  # Cobre period=1d mesmo com bucket diário
+    HOT_WINDOW_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # --- Barramento de eventos pós-COMMIT (realtime, janela quente, cache) ---
+    EVENT_BUS_QUEUE_SIZE: int = 10000        # Eventos (requisições/flushes) por assinante
+    EVENT_BUS_DRAIN_SECONDS: float = 5       # Espera para entregar o pendente no shutdown
+
+    # --- Realtime: fan-out entre workers ---
+    # "memory" = processo único; "postgres" = NOTIFY por org + um LISTEN por worker
+    BROADCAST_BACKEND: Literal["memory", "postgres"] = "memory"
+    BROADCAST_NOTIFY_MAX_BYTES: int = 7900   # Payload do NOTIFY (limite do Postgres: 8000)
+    BROADCAST_RECONNECT_SECONDS: float = 5
+    # Fila de saída por socket (cliente lento não atrasa os outros)
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SLOW_CONSUMER_POLICY: Literal["drop_oldest", "coalesce", "disconnect"] = "drop_oldest"
+    WS_SEND_TIMEOUT_SECONDS: float = 10      # Envio travado além disso: socket fechado
+    WS_MAX_SUBSCRIPTIONS: int = 1000         # Combinações device x sensor por socket
+
+    # --- Cache de buckets fechados do analytics ---
+    # Só para um worker (invalidação local, sem TTL): desligado sozinho se
+    # WEB_CONCURRENCY > 1 ou BROADCAST_BACKEND != "memory"
+    ANALYTICS_CACHE_ENABLED: bool = False
+    ANALYTICS_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # --- Arquivo frio (Parquet em disco local) ---
+    ARCHIVE_PATH: Optional[str] = None          # None = sem arquivo frio
+    ARCHIVE_AFTER_DAYS: Optional[int] = None    # Partições fechadas há mais tempo saem do Postgres
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
+    ARCHIVE_ROW_GROUP_SIZE: int = 100000        # Linhas por row group (granularidade das estatísticas)
+
 
 # Bloco de inicialização segura (MANTIDO DO SEU CÓDIGO)
 try:
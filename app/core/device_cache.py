@@ -0,0 +1,89 @@
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional
+
+from cachetools import TTLCache
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models.device import Device
+from app.models.device_sensor import DeviceSensorLink
+from app.models.device_token import DeviceToken
+
+@dataclass(frozen=True)
+class DeviceAuthContext:
+    """
+    Snapshot do dispositivo autenticado por um X-Device-Token.
+    Tudo o que a ingestão precisa, sem tocar no banco.
+    """
+    id: int
+    organization_id: Optional[int]
+    is_active: bool
+    sensor_ids: FrozenSet[int] = frozenset()
+    calibration_formulas: Dict[int, Optional[str]] = field(default_factory=dict)
+
+async def load_device_context(session: AsyncSession, token: str) -> Optional[DeviceAuthContext]:
+    """Resolve token -> contexto do dispositivo (None se token inexistente/revogado)."""
+    query = (
+        select(Device.id, Device.organization_id, Device.is_active)
+        .join(DeviceToken, DeviceToken.device_id == Device.id)
+        .where(DeviceToken.token == token, DeviceToken.is_active == True)
+    )
+    device_row = (await session.exec(query)).first()
+    if not device_row:
+        return None
+
+    query_links = select(DeviceSensorLink).where(DeviceSensorLink.device_id == device_row.id)
+    links = (await session.exec(query_links)).all()
+
+    return DeviceAuthContext(
+        id=device_row.id,
+        organization_id=device_row.organization_id,
+        is_active=device_row.is_active,
+        sensor_ids=frozenset(link.sensor_type_id for link in links),
+        calibration_formulas={link.sensor_type_id: link.calibration_formula for link in links},
+    )
+
+class DeviceAuthCache:
+    """
+    Cache em processo token -> DeviceAuthContext (LRU limitado + TTL).
+    Com o cache quente, autenticar uma ingestão não faz nenhum SELECT.
+
+    Deve ser invalidado sempre que token, dispositivo, vínculos ou fórmulas mudam.
+    Com vários workers, o TTL limita a janela em que outro processo vê dados antigos.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, session: AsyncSession, token: str) -> Optional[DeviceAuthContext]:
+        context = self._cache.get(token)
+        if context is not None:
+            self.hits += 1
+            return context
+
+        self.misses += 1
+        context = await load_device_context(session, token)
+        if context is not None:
+            self._cache[token] = context
+        return context
+
+    def invalidate_token(self, token: str):
+        self._cache.pop(token, None)
+
+    def invalidate_device(self, device_id: int):
+        stale = [token for token, context in self._cache.items() if context.id == device_id]
+        for token in stale:
+            self._cache.pop(token, None)
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+device_auth_cache = DeviceAuthCache(
+    maxsize=settings.DEVICE_AUTH_CACHE_MAXSIZE,
+    ttl=settings.DEVICE_AUTH_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,153 @@
+"""
+Barramento de eventos em processo (pós-COMMIT da ingestão).
+
+A ingestão publica e retorna: quem consome (realtime, janela quente, cache
+do analytics) roda na sua própria task, com fila própria e limitada. A
+latência do dispositivo não depende de quantos dashboards estão abertos,
+e uma exceção de um assinante não chega à requisição.
+
+- Eventos de um tópico são listas (ex: linhas gravadas). O assinante
+  recebe, numa chamada só, tudo o que acumulou na sua fila desde a última
+  (um NOTIFY/broadcast por rajada em vez de um por requisição).
+- Fila cheia: o evento é descartado PARA AQUELE assinante e conta em
+  `overflow`. Os outros assinantes não são afetados.
+- Assinantes sem perda (`lossless=True`, ex: janela quente e cache do
+  analytics, que não têm TTL e ficariam errados para sempre): com a fila
+  cheia, o evento vai para uma lista de excedentes entregue junto com a
+  próxima leva, na mesma ordem. Conta em `coalesced`.
+- Sem o barramento rodando (scripts, testes sem lifespan), `publish`
+  chama os assinantes na hora, em sequência.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[List[Any]], Awaitable[None]]
+
+MEASUREMENTS_COMMITTED = "measurements.committed"
+MEASUREMENTS_COPIED = "measurements.copied" # Carga em massa: faixas (sem linhas/ids)
+
+@dataclass
+class Subscriber:
+    topic: str
+    name: str
+    handler: Handler
+    lossless: bool = False
+    queue: Optional[asyncio.Queue] = None
+    backlog: List[Any] = field(default_factory=list) # Excedentes (só lossless)
+    task: Optional[asyncio.Task] = None
+    delivered: int = 0
+    overflow: int = 0
+    coalesced: int = 0
+    errors: int = 0
+    max_depth: int = 0
+
+class EventBus:
+    def __init__(self, max_queue: int = 10000, drain_timeout: float = 5):
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+        self.published = 0
+
+    @property
+    def running(self) -> bool:
+        return any(sub.task is not None for subs in self._subscribers.values() for sub in subs)
+
+    def subscribe(self, topic: str, name: str, handler: Handler, lossless: bool = False):
+        self._subscribers.setdefault(topic, []).append(Subscriber(topic, name, handler, lossless))
+
+    async def publish(self, topic: str, items: List[Any]):
+        """Não espera os assinantes (com o barramento rodando)."""
+        if not items:
+            return
+        self.published += 1
+        for sub in self._subscribers.get(topic, []):
+            if sub.task is None:
+                await self._deliver(sub, list(items))
+                continue
+            # Com excedentes pendentes, o novo evento vai atrás deles (ordem preservada)
+            if sub.lossless and (sub.backlog or sub.queue.full()):
+                sub.backlog.extend(items)
+                sub.coalesced += 1
+                continue
+            try:
+                sub.queue.put_nowait(items)
+            except asyncio.QueueFull:
+                sub.overflow += 1
+                continue
+            sub.max_depth = max(sub.max_depth, sub.queue.qsize())
+
+    async def _deliver(self, sub: Subscriber, items: List[Any]):
+        try:
+            await sub.handler(items)
+            sub.delivered += len(items)
+        except Exception as e:
+            sub.errors += 1
+            logger.error(f"❌ Assinante {sub.name} de {sub.topic} falhou: {e}")
+
+    async def _consume(self, sub: Subscriber):
+        while True:
+            events = [await sub.queue.get()]
+            while not sub.queue.empty():
+                events.append(sub.queue.get_nowait())
+            # Excedentes são mais novos que tudo o que estava na fila
+            backlog, sub.backlog = sub.backlog, []
+            try:
+                await self._deliver(sub, [item for event in events for item in event] + backlog)
+            finally:
+                for _ in events:
+                    sub.queue.task_done()
+
+    async def start(self):
+        if self.running:
+            return
+        for subs in self._subscribers.values():
+            for sub in subs:
+                sub.queue = asyncio.Queue(maxsize=self.max_queue)
+                sub.task = asyncio.create_task(self._consume(sub), name=f"event-bus-{sub.name}")
+        logger.info(f"📨 Barramento de eventos ativo ({sum(map(len, self._subscribers.values()))} assinantes).")
+
+    async def stop(self):
+        """Entrega o que já foi publicado (até `drain_timeout`) e encerra os consumidores."""
+        subs = [sub for subs in self._subscribers.values() for sub in subs if sub.task is not None]
+        try:
+            await asyncio.wait_for(asyncio.gather(*(sub.queue.join() for sub in subs)), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Barramento encerrado com eventos pendentes.")
+        for sub in subs:
+            sub.task.cancel()
+            try:
+                await sub.task
+            except asyncio.CancelledError:
+                pass
+            sub.task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "published": self.published,
+            "overflow": sum(sub.overflow for subs in self._subscribers.values() for sub in subs),
+            "subscribers": [
+                {
+                    "topic": sub.topic,
+                    "name": sub.name,
+                    "queue_depth": sub.queue.qsize() if sub.queue else 0,
+                    "max_depth": sub.max_depth,
+                    "delivered": sub.delivered,
+                    "overflow": sub.overflow,
+                    "coalesced": sub.coalesced,
+                    "errors": sub.errors,
+                }
+                for subs in self._subscribers.values() for sub in subs
+            ],
+        }
+
+event_bus = EventBus(
+    max_queue=settings.EVENT_BUS_QUEUE_SIZE,
+    drain_timeout=settings.EVENT_BUS_DRAIN_SECONDS,
+)
@@ -0,0 +1,143 @@
+"""
+Exportação de medições em streaming (NDJSON, CSV e Parquet).
+
+As linhas saem de um cursor do lado do servidor (`session.stream` +
+`yield_per`) em blocos de MEASUREMENT_EXPORT_BATCH_SIZE. Cada bloco é
+serializado e entregue à StreamingResponse antes do próximo fetch, então a
+memória do worker depende só do tamanho do bloco, não do total exportado.
+
+Seleciona colunas (não entidades do ORM): nada entra no identity map da sessão.
+"""
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, List, Optional, Sequence
+
+import pyarrow.parquet as pq
+from sqlalchemy import Select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.arrow_ipc import MEASUREMENT_SCHEMA, record_batch
+from app.core.config import settings
+from app.models.measurement import Measurement
+
+EXPORT_COLUMNS = (
+    Measurement.id,
+    Measurement.device_id,
+    Measurement.sensor_type_id,
+    Measurement.value,
+    Measurement.raw_value,
+    Measurement.created_at,
+)
+FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+async def fetch_batches(session: AsyncSession, query: Select, batch_size: int = None) -> AsyncIterator[Sequence[tuple]]:
+    """Blocos de linhas (tuplas na ordem de EXPORT_COLUMNS) de um cursor do servidor."""
+    batch_size = batch_size or settings.MEASUREMENT_EXPORT_BATCH_SIZE
+    result = await session.stream(query.execution_options(yield_per=batch_size))
+    try:
+        async for partition in result.partitions(batch_size):
+            yield partition
+    finally:
+        await result.close()
+
+# -----------------------------------------------------------------------------
+# FORMATOS
+# -----------------------------------------------------------------------------
+async def ndjson_chunks(batches: AsyncIterator[Sequence[tuple]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        lines = []
+        for row in batch:
+            record = dict(zip(FIELDS, row))
+            record["created_at"] = record["created_at"].isoformat()
+            lines.append(json.dumps(record, separators=(",", ":")))
+        lines.append("")
+        yield "\n".join(lines).encode()
+
+async def csv_chunks(batches: AsyncIterator[Sequence[tuple]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(FIELDS)
+    async for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+class _DrainableSink(io.RawIOBase):
+    """Destino do ParquetWriter que acumula bytes até serem drenados pelo stream."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def parquet_chunks(batches: AsyncIterator[Sequence[tuple]]) -> AsyncIterator[bytes]:
+    # Um row group por bloco. Compressão interna (zstd) no lugar do gzip HTTP.
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, MEASUREMENT_SCHEMA, compression="zstd")
+    try:
+        async for batch in batches:
+            writer.write_batch(record_batch(batch, MEASUREMENT_SCHEMA))
+            yield sink.drain()
+    finally:
+        writer.close() # Footer com os metadados dos row groups
+    yield sink.drain()
+
+FORMATTERS = {
+    "ndjson": ndjson_chunks,
+    "csv": csv_chunks,
+    "parquet": parquet_chunks,
+}
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = None) -> AsyncIterator[bytes]:
+    """Compressão gzip incremental (um único membro gzip ao longo do stream)."""
+    compressor = zlib.compressobj(level or settings.MEASUREMENT_EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+async def _chain(*sources: AsyncIterator[Sequence[tuple]]) -> AsyncIterator[Sequence[tuple]]:
+    for source in sources:
+        async for batch in source:
+            yield batch
+
+def export_stream(
+    session: AsyncSession,
+    query: Select,
+    format: str,
+    gzip: bool = False,
+    archived: Optional[AsyncIterator[Sequence[tuple]]] = None,
+) -> AsyncIterator[bytes]:
+    """`archived`: blocos do arquivo frio, emitidos antes das linhas do Postgres."""
+    batches = fetch_batches(session, query)
+    if archived is not None:
+        batches = _chain(archived, batches)
+    chunks = FORMATTERS[format](batches)
+    return gzip_chunks(chunks) if gzip else chunks
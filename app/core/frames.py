@@ -0,0 +1,113 @@
+"""
+Frames do realtime: cada mensagem é serializada UMA vez por broadcast.
+
+Com N dashboards numa org, `send_json` por socket serializava o mesmo dict
+N vezes. O Frame guarda a mensagem e as codificações já feitas: o
+primeiro socket que pede "json" (ou "msgpack") paga a serialização, os
+outros recebem os mesmos bytes.
+
+- "json": texto. Usa orjson quando instalado (opcional), senão o json da stdlib.
+- "msgpack": binário (negociado com ?encoding=msgpack no /measurements/ws).
+  Usa o pacote msgpack quando instalado, senão um codificador próprio
+  para os tipos das mensagens (None, bool, int, float, str, list, dict).
+"""
+import json
+import struct
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+except ImportError: # Opcional: só acelera a serialização
+    orjson = None
+
+try:
+    import msgpack
+except ImportError: # Opcional: há um codificador próprio para o subconjunto usado
+    msgpack = None
+
+ENCODINGS = ("json", "msgpack")
+
+def encode_json(message: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"))
+
+def _pack(obj: Any, out: bytearray):
+    if obj is None:
+        out.append(0xC0)
+    elif obj is True or obj is False:
+        out.append(0xC3 if obj else 0xC2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 128:
+            out.append(obj) # positive fixint
+        elif -32 <= obj < 0:
+            out.append(obj & 0xFF) # negative fixint
+        else:
+            out += b"\xd3" + struct.pack(">q", obj)
+    elif isinstance(obj, float):
+        out += b"\xcb" + struct.pack(">d", obj)
+    elif isinstance(obj, str):
+        data = obj.encode()
+        size = len(data)
+        if size < 32:
+            out.append(0xA0 | size)
+        elif size < 256:
+            out += bytes((0xD9, size))
+        elif size < 65536:
+            out += b"\xda" + struct.pack(">H", size)
+        else:
+            out += b"\xdb" + struct.pack(">I", size)
+        out += data
+    elif isinstance(obj, (list, tuple)):
+        size = len(obj)
+        if size < 16:
+            out.append(0x90 | size)
+        elif size < 65536:
+            out += b"\xdc" + struct.pack(">H", size)
+        else:
+            out += b"\xdd" + struct.pack(">I", size)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        size = len(obj)
+        if size < 16:
+            out.append(0x80 | size)
+        elif size < 65536:
+            out += b"\xde" + struct.pack(">H", size)
+        else:
+            out += b"\xdf" + struct.pack(">I", size)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"Tipo não suportado no MessagePack: {type(obj).__name__}")
+
+def encode_msgpack(message: Any) -> bytes:
+    if msgpack is not None:
+        return msgpack.packb(message)
+    out = bytearray()
+    _pack(message, out)
+    return bytes(out)
+
+class Frame:
+    """Mensagem + codificações já calculadas (compartilhado por todas as filas)."""
+
+    __slots__ = ("message", "_text", "_binary")
+
+    def __init__(self, message: dict):
+        self.message = message
+        self._text: Optional[str] = None
+        self._binary: Optional[bytes] = None
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = encode_json(self.message)
+        return self._text
+
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = encode_msgpack(self.message)
+        return self._binary
+
+    def encoded(self, encoding: str) -> Union[str, bytes]:
+        return self.binary() if encoding == "msgpack" else self.text()
@@ -0,0 +1,415 @@
+"""
+Janela quente em memória: as últimas HOT_WINDOW_HOURS horas de leituras por
+(organização, dispositivo, sensor), em buffers NumPy (int64 µs + float64).
+
+- Aquecida do banco no startup (em background; até ficar pronta, o
+  analytics segue pelo Postgres) e alimentada pela ingestão após o COMMIT
+  (`publish_measurements`). Leituras que chegam durante o aquecimento ficam
+  pendentes e são aplicadas sem duplicar as que o aquecimento já trouxe.
+- O analytics de intervalos dentro da janela é respondido aqui, sem tocar
+  no banco: bucketing vetorizado (divisão inteira + `np.add.reduceat`).
+- Memória contabilizada pela capacidade real dos arrays. Acima de
+  HOT_WINDOW_MAX_BYTES, as leituras mais antigas saem de TODAS as séries
+  (até caber em 80% do limite) e a cobertura da janela encolhe junto.
+
+Processo único: cada worker tem a sua janela, alimentada pela sua própria
+ingestão. Com vários workers, cada janela veria só parte das leituras; por
+isso ela vem desligada (HOT_WINDOW_ENABLED) e a configuração recusa ligá-la
+com WEB_CONCURRENCY > 1 (ou com o broadcast entre instâncias).
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.rollups import bucket_key, parse_bucket
+from app.models.measurement import Measurement
+
+logger = logging.getLogger(__name__)
+
+SeriesKey = Tuple[int, int, int] # (organization_id, device_id, sensor_type_id)
+
+# Ocupação alvo depois de uma evicção por memória (evita evictar a cada append)
+EVICTION_TARGET = 0.8
+
+def to_us(moment: datetime) -> int:
+    return int(np.datetime64(moment, "us").astype(np.int64))
+
+def from_us(values: np.ndarray) -> List[datetime]:
+    return values.astype("datetime64[us]").astype(object).tolist()
+
+class SeriesBuffer:
+    """
+    Buffer circular de uma série, ordenado por tempo. A região viva é
+    [start, end) de arrays contíguos: a evicção só avança `start`. Ao encher,
+    compacta (ou dobra a capacidade), custo amortizado O(1) por leitura.
+    """
+
+    INITIAL_CAPACITY = 64
+
+    def __init__(self):
+        self.timestamps = np.empty(self.INITIAL_CAPACITY, dtype=np.int64)
+        self.values = np.empty(self.INITIAL_CAPACITY, dtype=np.float64)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def live(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.timestamps[self.start:self.end], self.values[self.start:self.end]
+
+    def _resize(self, capacity: int):
+        timestamps, values = self.live()
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.timestamps[:len(timestamps)] = timestamps
+        self.values[:len(values)] = values
+        self.start, self.end = 0, len(timestamps)
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray):
+        """Acrescenta leituras já ordenadas por tempo."""
+        size = len(self)
+        if size and timestamps[0] < self.timestamps[self.end - 1]:
+            # Fora de ordem (timestamp retroativo): merge estável com a região viva
+            live_ts, live_values = self.live()
+            merged_ts = np.concatenate([live_ts, timestamps])
+            order = np.argsort(merged_ts, kind="stable")
+            timestamps, values = merged_ts[order], np.concatenate([live_values, values])[order]
+            self.start = self.end = 0
+            size = 0
+
+        needed = size + len(timestamps)
+        if self.end + len(timestamps) > len(self.timestamps):
+            capacity = len(self.timestamps)
+            while capacity < needed:
+                capacity *= 2
+            self._resize(capacity)
+        self.timestamps[self.end:self.end + len(timestamps)] = timestamps
+        self.values[self.end:self.end + len(values)] = values
+        self.end += len(timestamps)
+
+    def evict_before(self, cutoff_us: int):
+        timestamps, _ = self.live()
+        self.start += int(np.searchsorted(timestamps, cutoff_us, side="left"))
+        # Libera memória quando a região viva ocupa pouco da capacidade
+        if len(self.timestamps) > self.INITIAL_CAPACITY and len(self) < len(self.timestamps) // 4:
+            self._resize(max(self.INITIAL_CAPACITY, len(self.timestamps) // 2))
+
+    def shrink_to_fit(self):
+        capacity = self.INITIAL_CAPACITY
+        while capacity < len(self):
+            capacity *= 2
+        if capacity < len(self.timestamps):
+            self._resize(capacity)
+
+    def between(self, start_us: int, end_us: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Fatia [start_us, end_us) por busca binária (sem cópia)."""
+        timestamps, values = self.live()
+        first = int(np.searchsorted(timestamps, start_us, side="left"))
+        last = len(timestamps) if end_us is None else int(np.searchsorted(timestamps, end_us, side="left"))
+        return timestamps[first:last], values[first:last]
+
+class HotWindow:
+    def __init__(
+        self,
+        session_factory=async_session_maker,
+        window_hours: int = 48,
+        max_bytes: int = 256 * 1024 * 1024,
+        warm_batch_size: int = 50000,
+        trim_interval_seconds: float = 60,
+    ):
+        self.session_factory = session_factory
+        self.window = timedelta(hours=window_hours)
+        self.max_bytes = max_bytes
+        self.warm_batch_size = warm_batch_size
+        self.trim_interval = trim_interval_seconds
+
+        self._series: Dict[SeriesKey, SeriesBuffer] = {}
+        self._by_org: Dict[int, Set[SeriesKey]] = {}
+        self._bytes = 0
+        self._rows = 0
+        self._last_trim = 0.0
+        # Leituras anteriores a este instante podem ter sido evictadas por memória
+        self._evicted_until_us: Optional[int] = None
+
+        self.ready = False
+        self._warm_task: Optional[asyncio.Task] = None
+        self._pending: Optional[List[tuple]] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # -------------------------------------------------------------------------
+    # ESCRITA
+    # -------------------------------------------------------------------------
+    def _apply(self, rows: Sequence[tuple]):
+        """Linhas (organization_id, device_id, sensor_type_id, created_at, value)."""
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        org = np.asarray(columns[0], dtype=np.int64)
+        device = np.asarray(columns[1], dtype=np.int64)
+        sensor = np.asarray(columns[2], dtype=np.int64)
+        timestamps = np.asarray(columns[3], dtype="datetime64[us]").astype(np.int64)
+        values = np.asarray(columns[4], dtype=np.float64)
+
+        floor_us = to_us(datetime.utcnow() - self.window)
+        if self._evicted_until_us is not None:
+            floor_us = max(floor_us, self._evicted_until_us)
+
+        # Agrupa por série com um lexsort (tempo por último: cada grupo sai ordenado)
+        order = np.lexsort((timestamps, sensor, device, org))
+        org, device, sensor, timestamps, values = org[order], device[order], sensor[order], timestamps[order], values[order]
+        changes = np.flatnonzero((np.diff(org) != 0) | (np.diff(device) != 0) | (np.diff(sensor) != 0)) + 1
+        bounds = np.concatenate([[0], changes, [len(org)]])
+
+        for begin, finish in zip(bounds[:-1], bounds[1:]):
+            ts, vals = timestamps[begin:finish], values[begin:finish]
+            keep = ts >= floor_us
+            if not keep.any():
+                continue
+            key = (int(org[begin]), int(device[begin]), int(sensor[begin]))
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = SeriesBuffer()
+                self._by_org.setdefault(key[0], set()).add(key)
+            self._bytes -= series.nbytes
+            self._rows -= len(series)
+            series.extend(ts[keep], vals[keep])
+            self._bytes += series.nbytes
+            self._rows += len(series)
+
+        self._maybe_trim()
+
+    def append(self, rows: Sequence) -> None:
+        """Linhas gravadas (com organization_id, device_id, sensor_type_id, created_at, value, id)."""
+        if not self.ready and self._pending is None:
+            return
+        tuples = [(r.organization_id, r.device_id, r.sensor_type_id, r.created_at, r.value, r.id) for r in rows if r.organization_id is not None]
+        if self._pending is not None:
+            self._pending.extend(tuples)
+            return
+        self._apply([t[:5] for t in tuples])
+
+    # -------------------------------------------------------------------------
+    # MEMÓRIA
+    # -------------------------------------------------------------------------
+    def _maybe_trim(self):
+        if self._bytes <= self.max_bytes and time.monotonic() - self._last_trim < self.trim_interval:
+            return
+        self._last_trim = time.monotonic()
+        self._trim(to_us(datetime.utcnow() - self.window))
+        if self._bytes > self.max_bytes:
+            self._evict_for_memory()
+
+    def _trim(self, cutoff_us: int):
+        for key in list(self._series):
+            series = self._series[key]
+            self._bytes -= series.nbytes
+            self._rows -= len(series)
+            series.evict_before(cutoff_us)
+            if not len(series):
+                del self._series[key]
+                self._by_org[key[0]].discard(key)
+                continue
+            self._bytes += series.nbytes
+            self._rows += len(series)
+
+    def _evict_for_memory(self):
+        """Corta o início da janela (igual para todas as séries) até caber no alvo."""
+        timestamps = np.concatenate([series.live()[0] for series in self._series.values()] or [np.empty(0, dtype=np.int64)])
+        if not len(timestamps):
+            return
+        # Fração de leituras a manter, estimada pelos bytes por leitura atuais
+        keep = EVICTION_TARGET * self.max_bytes / self._bytes
+        cutoff_us = int(np.quantile(timestamps, 1 - keep)) + 1
+        self._trim(cutoff_us)
+        for series in self._series.values():
+            self._bytes -= series.nbytes
+            series.shrink_to_fit()
+            self._bytes += series.nbytes
+        self._evicted_until_us = max(cutoff_us, self._evicted_until_us or cutoff_us)
+        self.evictions += 1
+        logger.warning(f"♨️ Janela quente acima de {self.max_bytes / 1024 / 1024:.0f} MB: leituras antes de {from_us(np.array([cutoff_us]))[0]} evictadas.")
+
+    # -------------------------------------------------------------------------
+    # LEITURA
+    # -------------------------------------------------------------------------
+    def covers(self, start: datetime) -> bool:
+        """A janela tem TODAS as leituras a partir de `start`?"""
+        if not self.ready:
+            return False
+        floor = datetime.utcnow() - self.window
+        if self._evicted_until_us is not None:
+            floor = max(floor, from_us(np.array([self._evicted_until_us]))[0])
+        return start >= floor
+
+    def query_buckets(
+        self,
+        organization_id: int,
+        bucket_size: str,
+        start: datetime,
+        end: Optional[datetime] = None,
+        group_by: str = "sensor",
+        device_id: Optional[int] = None,
+        sensor_type_id: Optional[int] = None,
+    ) -> Optional[List[dict]]:
+        """
+        Agregados por (bucket, sensor) — ou (bucket, dispositivo, sensor) —
+        em [start, end), no formato de rollups.query_buckets. None se a janela
+        não cobre o intervalo.
+        """
+        width = parse_bucket(bucket_size) // timedelta(microseconds=1)
+        start_us = to_us(start) // width * width
+        end_us = None if end is None else -(-to_us(end) // width) * width
+        if not self.covers(from_us(np.array([start_us]))[0]):
+            self.misses += 1
+            return None
+
+        groups: Dict[Tuple[Optional[int], int], List[Tuple[np.ndarray, np.ndarray]]] = {}
+        for key in self._by_org.get(organization_id, ()):
+            _, device, sensor = key
+            if (device_id and device != device_id) or (sensor_type_id and sensor != sensor_type_id):
+                continue
+            timestamps, values = self._series[key].between(start_us, end_us)
+            if len(timestamps):
+                group = (device if group_by == "device" else None, sensor)
+                groups.setdefault(group, []).append((timestamps, values))
+
+        buckets = []
+        for (device, sensor_type_id), parts in groups.items():
+            bucket_ids = np.concatenate([timestamps // width for timestamps, _ in parts])
+            values = np.concatenate([values for _, values in parts])
+            order = np.argsort(bucket_ids, kind="stable")
+            bucket_ids, values = bucket_ids[order], values[order]
+
+            starts = np.flatnonzero(np.concatenate([[True], bucket_ids[1:] != bucket_ids[:-1]]))
+            counts = np.diff(np.append(starts, len(values)))
+            sums = np.add.reduceat(values, starts)
+            minimums = np.minimum.reduceat(values, starts)
+            maximums = np.maximum.reduceat(values, starts)
+            moments = from_us(bucket_ids[starts] * width)
+
+            for i, moment in enumerate(moments):
+                buckets.append({
+                    "bucket": moment,
+                    "device_id": device,
+                    "sensor_type_id": sensor_type_id,
+                    "sum_value": float(sums[i]),
+                    "count": int(counts[i]),
+                    "min_value": float(minimums[i]),
+                    "max_value": float(maximums[i]),
+                })
+        self.hits += 1
+        return sorted(buckets, key=bucket_key)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "series": len(self._series),
+            "rows": self._rows,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "window_hours": self.window.total_seconds() / 3600,
+            "evicted_until": from_us(np.array([self._evicted_until_us]))[0].isoformat() if self._evicted_until_us else None,
+            "evictions": self.evictions,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    # -------------------------------------------------------------------------
+    # AQUECIMENTO / CICLO DE VIDA
+    # -------------------------------------------------------------------------
+    def _reset(self):
+        self._series.clear()
+        self._by_org.clear()
+        self._bytes = self._rows = 0
+        self._evicted_until_us = None
+
+    async def warm(self, now: Optional[datetime] = None):
+        """Recarrega a janela do banco (a ingestão concorrente fica pendente até o fim)."""
+        self.ready = False
+        self._pending = []
+        self._reset()
+        now = now or datetime.utcnow()
+        warmed_ids: List[np.ndarray] = []
+        try:
+            async with self.session_factory() as session:
+                query = (
+                    select(
+                        Measurement.organization_id,
+                        Measurement.device_id,
+                        Measurement.sensor_type_id,
+                        Measurement.created_at,
+                        Measurement.value,
+                        Measurement.id,
+                    )
+                    .where(Measurement.created_at >= now - self.window, Measurement.organization_id.is_not(None))
+                    .execution_options(yield_per=self.warm_batch_size)
+                )
+                result = await session.stream(query)
+                async for batch in result.partitions(self.warm_batch_size):
+                    self._apply([row[:5] for row in batch])
+                    warmed_ids.append(np.fromiter((row[5] for row in batch), dtype=np.int64, count=len(batch)))
+
+            # Pendentes já vistos pelo aquecimento (commit antes do snapshot) são descartados
+            pending, self._pending = self._pending, None
+            seen = np.concatenate(warmed_ids) if warmed_ids else np.empty(0, dtype=np.int64)
+            fresh = ~np.isin(np.fromiter((row[5] for row in pending), dtype=np.int64, count=len(pending)), seen)
+            self._apply([row[:5] for row, is_fresh in zip(pending, fresh) if is_fresh])
+            self.ready = True
+            logger.info(f"🔥 Janela quente pronta: {self._rows} leituras, {len(self._series)} séries, {self._bytes / 1024 / 1024:.1f} MB.")
+        finally:
+            self._pending = None
+
+    async def _warm_safely(self):
+        try:
+            await self.warm()
+        except Exception as e:
+            logger.error(f"❌ Aquecimento da janela quente falhou (analytics segue pelo banco): {e}")
+
+    async def _rewarm(self, previous: Optional[asyncio.Task]):
+        # O aquecimento anterior termina (e limpa o estado) antes do novo começar
+        if previous is not None and not previous.done():
+            previous.cancel()
+            await asyncio.gather(previous, return_exceptions=True)
+        await self._warm_safely()
+
+    def invalidate(self):
+        """Valores mudaram no banco (re-calibração, troca de organização): recarrega em background."""
+        if self._warm_task is None:
+            return # Nunca iniciada (desligada)
+        self.ready = False
+        self._warm_task = asyncio.get_running_loop().create_task(self._rewarm(self._warm_task), name="hot-window-warm")
+
+    async def start(self):
+        if self._warm_task is None or self._warm_task.done():
+            self._warm_task = asyncio.create_task(self._warm_safely(), name="hot-window-warm")
+
+    async def stop(self):
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+            try:
+                await self._warm_task
+            except asyncio.CancelledError:
+                pass
+            self._warm_task = None
+        self.ready = False
+        self._reset()
+
+hot_window = HotWindow(
+    window_hours=settings.HOT_WINDOW_HOURS,
+    max_bytes=settings.HOT_WINDOW_MAX_BYTES,
+)
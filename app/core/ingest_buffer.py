@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.ingestion import insert_measurements, publish_measurements
+
+logger = logging.getLogger(__name__)
+
+# Callback disparado após cada flush: recebe [(linha_gravada, organization_id), ...]
+FlushCallback = Callable[[List[Any]], Awaitable[None]]
+
+class IngestBufferFull(Exception):
+    """Fila de write-behind cheia (backpressure para o dispositivo)."""
+
+@dataclass
+class PendingMeasurement:
+    row: Dict[str, Any]
+    organization_id: int
+    future: Optional[asyncio.Future] = None
+
+class IngestBuffer:
+    """
+    Buffer Write-Behind com Group Commit.
+    As leituras aceitas entram numa fila asyncio limitada e um único flusher
+    grava tudo em UMA transação a cada `flush_interval_ms` ou `flush_max_rows`.
+
+    Durabilidade (ack_mode):
+      - "enqueue": responde ao dispositivo assim que a leitura entra na fila.
+      - "flush":   responde só depois do COMMIT do lote que contém a leitura.
+    """
+
+    def __init__(
+        self,
+        session_factory=async_session_maker,
+        max_size: int = 10000,
+        flush_interval_ms: int = 200,
+        flush_max_rows: int = 500,
+        ack_mode: str = "flush",
+        on_flush: Optional[FlushCallback] = None,
+    ):
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_rows = flush_max_rows
+        self.ack_mode = ack_mode
+        self.on_flush = on_flush
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Contadores
+        self.enqueued = 0
+        self.rejected_full = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run(), name="ingest-buffer-flusher")
+        logger.info(f"🚚 Buffer de ingestão ativo (ack={self.ack_mode}, max={self.max_size}).")
+
+    async def stop(self):
+        """Drena a fila (tudo que já foi aceito é gravado) e encerra o flusher."""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info(f"🛑 Buffer de ingestão drenado ({self.flushed_rows} linhas gravadas).")
+
+    async def put(self, row: Dict[str, Any], organization_id: int) -> Optional[Any]:
+        """
+        Enfileira uma leitura já validada/calibrada.
+        Em ack_mode="flush" aguarda o commit e retorna a linha gravada (com id).
+        Levanta IngestBufferFull se a fila estiver no limite.
+        """
+        future = None
+        if self.ack_mode == "flush":
+            future = asyncio.get_running_loop().create_future()
+
+        try:
+            self._queue.put_nowait(PendingMeasurement(row, organization_id, future))
+        except asyncio.QueueFull:
+            self.rejected_full += 1
+            raise IngestBufferFull()
+
+        self.enqueued += 1
+        if future is None:
+            return None
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "ack_mode": self.ack_mode,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.max_size,
+            "enqueued": self.enqueued,
+            "rejected_full": self.rejected_full,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_rows": self.failed_rows,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 3),
+        }
+
+    # -------------------------------------------------------------------------
+    # FLUSHER
+    # -------------------------------------------------------------------------
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.flush_max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[PendingMeasurement]):
+        started = time.perf_counter()
+        try:
+            async with self.session_factory() as session:
+                inserted = await insert_measurements(session, [item.row for item in batch])
+                await session.commit()
+        except Exception as e:
+            self.failed_rows += len(batch)
+            logger.error(f"❌ Falha no flush do buffer de ingestão ({len(batch)} linhas): {e}")
+            for item in batch:
+                if item.future and not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.flushed_rows += len(inserted)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+        for item, row in zip(batch, inserted):
+            if item.future and not item.future.done():
+                item.future.set_result(row)
+
+        if self.on_flush:
+            try:
+                await self.on_flush([(row, item.organization_id) for item, row in zip(batch, inserted)])
+            except Exception as e:
+                logger.error(f"⚠️ Erro no pós-flush do buffer de ingestão: {e}")
+
+ingest_buffer = IngestBuffer(
+    max_size=settings.INGEST_BUFFER_MAX_SIZE,
+    flush_interval_ms=settings.INGEST_BUFFER_FLUSH_INTERVAL_MS,
+    flush_max_rows=settings.INGEST_BUFFER_FLUSH_MAX_ROWS,
+    ack_mode=settings.INGEST_BUFFER_ACK_MODE,
+    on_flush=publish_measurements,
+)
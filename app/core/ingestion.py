@@ -0,0 +1,176 @@
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from sqlalchemy import insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.analytics_cache import analytics_cache
+from app.core.calibration import calibrate_array
+from app.core.events import MEASUREMENTS_COMMITTED, MEASUREMENTS_COPIED, event_bus
+from app.core.hot_window import hot_window
+from app.core.socket import manager
+from app.models.measurement import Measurement
+
+# Colunas devolvidas pelo INSERT ... RETURNING (ordem dos parâmetros preservada)
+RETURNING_COLUMNS = (
+    Measurement.id,
+    Measurement.device_id,
+    Measurement.sensor_type_id,
+    Measurement.organization_id,
+    Measurement.value,
+    Measurement.raw_value,
+    Measurement.created_at,
+)
+
+def apply_calibration(rows: List[Dict[str, Any]], formulas: Dict[int, Optional[str]]) -> None:
+    """
+    Calibra o campo `value` das linhas (in-place) de UM dispositivo,
+    vetorizado: uma chamada NumPy por sensor em vez de uma por leitura.
+    O valor original é preservado em `raw_value`.
+    """
+    for row in rows:
+        row.setdefault("raw_value", row["value"])
+
+    positions = defaultdict(list)
+    for index, row in enumerate(rows):
+        if formulas.get(row["sensor_type_id"]):
+            positions[row["sensor_type_id"]].append(index)
+
+    for sensor_type_id, indexes in positions.items():
+        raw = np.fromiter((rows[i]["value"] for i in indexes), dtype=np.float64, count=len(indexes))
+        calibrated = calibrate_array(formulas[sensor_type_id], raw)
+        for i, value in zip(indexes, calibrated.tolist()):
+            rows[i]["value"] = value
+
+async def insert_measurements(session: AsyncSession, rows: Sequence[Dict[str, Any]]) -> List[Any]:
+    """
+    Grava várias medições com um único INSERT multi-linha (sem commit).
+    Retorna as linhas inseridas na MESMA ordem de `rows`.
+    """
+    if not rows:
+        return []
+
+    stmt = insert(Measurement).returning(*RETURNING_COLUMNS, sort_by_parameter_order=True)
+    result = await session.exec(stmt, params=list(rows))
+    return result.all()
+
+# Colunas gravadas pelo COPY (o id vem da sequence do banco)
+COPY_COLUMNS = ("device_id", "sensor_type_id", "organization_id", "value", "raw_value", "created_at")
+
+# Faixas gravadas por copy_measurements na sessão, até o publish_copied
+COPIED_RANGES = "copied_measurement_ranges"
+
+class CopiedRange(NamedTuple):
+    organization_id: Optional[int]
+    device_id: int
+    sensor_type_id: int
+    start: datetime
+    end: datetime
+
+async def copy_measurements(
+    session: AsyncSession,
+    rows: Iterable[Dict[str, Any]],
+    chunk_size: int = 50000,
+) -> int:
+    """
+    Carga em massa (backfills, importações, seed de benchmark), sem commit.
+
+    - PostgreSQL: protocolo COPY binário do asyncpg (`copy_records_to_table`)
+      usando a conexão crua do pool, dentro da transação da sessão.
+    - Outros dialetos (SQLite dos testes): executemany em blocos.
+
+    `rows` pode ser um gerador: é consumido em blocos de `chunk_size`, sem
+    materializar tudo em memória. Retorna o número de linhas gravadas.
+    Não retorna IDs — use `insert_measurements` quando precisar deles.
+
+    As faixas de tempo gravadas por (org, device, sensor) ficam na sessão:
+    depois do COMMIT, chame `publish_copied(session)` para invalidar o
+    cache do analytics e a janela quente (backfill em bucket fechado).
+    """
+    ranges: Dict[tuple, list] = session.info.setdefault(COPIED_RANGES, {})
+    conn = await session.connection()
+    is_postgres = conn.dialect.name == "postgresql"
+    if is_postgres:
+        raw_conn = await conn.get_raw_connection()
+        driver_conn = raw_conn.driver_connection # asyncpg.Connection
+
+    total = 0
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+
+        if is_postgres:
+            records = [tuple(row.get(col) for col in COPY_COLUMNS) for row in chunk]
+            await driver_conn.copy_records_to_table(
+                Measurement.__tablename__, records=records, columns=list(COPY_COLUMNS)
+            )
+        else:
+            await session.exec(insert(Measurement.__table__), params=chunk)
+        total += len(chunk)
+
+        for row in chunk:
+            key = (row.get("organization_id"), row["device_id"], row["sensor_type_id"])
+            moment = row["created_at"]
+            bounds = ranges.get(key)
+            if bounds is None:
+                ranges[key] = [moment, moment]
+            elif moment < bounds[0]:
+                bounds[0] = moment
+            elif moment > bounds[1]:
+                bounds[1] = moment
+
+    return total
+
+async def publish_copied(session: AsyncSession) -> None:
+    """Pós-COMMIT de copy_measurements: publica as faixas gravadas (sem realtime: é carga em massa)."""
+    ranges = session.info.pop(COPIED_RANGES, None)
+    if ranges:
+        await event_bus.publish(MEASUREMENTS_COPIED, [CopiedRange(*key, *bounds) for key, bounds in ranges.items()])
+
+def build_realtime_message(row: Any, organization_id: int) -> dict:
+    """Payload enviado aos dashboards via WebSocket para uma medição gravada."""
+    return {
+        "id": row.id,
+        "device_id": row.device_id,
+        "sensor_type_id": row.sensor_type_id,
+        "value": row.value,
+        "created_at": row.created_at.isoformat(),
+        "organization_id": organization_id
+    }
+
+async def broadcast_measurements(rows_with_org: Sequence[Any]) -> None:
+    """Realtime para uma lista de (linha_gravada, organization_id): uma publicação por org."""
+    by_org: Dict[int, List[dict]] = defaultdict(list)
+    for row, organization_id in rows_with_org:
+        by_org[organization_id].append(build_realtime_message(row, organization_id))
+    for organization_id, messages in by_org.items():
+        await manager.publish(messages, organization_id)
+
+async def update_analytics(rows_with_org: Sequence[Any]) -> None:
+    """Janela quente + invalidação do cache, nessa ordem e no mesmo assinante (sem await no meio)."""
+    rows = [row for row, _ in rows_with_org]
+    hot_window.append(rows)
+    analytics_cache.invalidate_rows(rows)
+
+async def invalidate_copied(ranges: Sequence[CopiedRange]) -> None:
+    """Carga em massa: buckets afetados saem do cache; a janela quente recarrega se foi tocada."""
+    for copied in ranges:
+        analytics_cache.invalidate_range(copied.device_id, copied.sensor_type_id, copied.start, copied.end)
+    if any(copied.end >= datetime.utcnow() - hot_window.window for copied in ranges):
+        hot_window.invalidate()
+
+async def publish_measurements(rows_with_org: Sequence[Any]) -> None:
+    """Pós-COMMIT de toda ingestão: publica no barramento e retorna (não espera os assinantes)."""
+    await event_bus.publish(MEASUREMENTS_COMMITTED, list(rows_with_org))
+
+# Analytics sem perda: um evento descartado deixaria buckets velhos no cache
+# (sem TTL) e um buraco na janela quente. Realtime pode perder (só o dashboard)
+event_bus.subscribe(MEASUREMENTS_COMMITTED, "analytics", update_analytics, lossless=True)
+event_bus.subscribe(MEASUREMENTS_COMMITTED, "realtime", broadcast_measurements)
+event_bus.subscribe(MEASUREMENTS_COPIED, "analytics", invalidate_copied, lossless=True)
@@ -1,43 +1,59 @@
-from fastapi import Request, status
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import status
+from starlette.datastructures import Headers
 from starlette.responses import JSONResponse
-from sqlmodel import select
-from app.core.database import get_session
-from app.models.device_token import DeviceToken
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-class DeviceAuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if "/api/v1/measurements" not in request.url.path or request.method != "POST":
-            return await call_next(request)
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.device_cache import device_auth_cache
+
+INGEST_PATH_PREFIX = f"{settings.API_V1_STR}/measurements"
+
+class DeviceAuthMiddleware:
+    """
+    Porteiro da ingestão (ASGI puro, sem BaseHTTPMiddleware).
+    Só atua em POST /api/v1/measurements*; todo o resto (GETs, WebSocket)
+    passa direto, sem tasks extras nem re-streaming do corpo.
+
+    O dispositivo resolvido fica em scope["state"]["device"] e é reaproveitado
+    por deps.get_current_device: uma única consulta de autenticação por ingestão.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(INGEST_PATH_PREFIX)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        token_header = Headers(scope=scope).get("x-device-token")
 
-        token_header = request.headers.get("x-device-token")
-        
         if not token_header:
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 content={"detail": "Token de dispositivo ausente (Header: x-device-token)"}
             )
+            await response(scope, receive, send)
+            return
 
-        device_id = None
-        async for session in get_session():
-            query = select(DeviceToken).where(
-                DeviceToken.token == token_header,
-                DeviceToken.is_active == True
-            )
-            result = await session.exec(query)
-            token_obj = result.first()
-            
-            if token_obj:
-                device_id = token_obj.device_id
-            
-            break
-        
-        if not device_id:
-             return JSONResponse(
+        # A sessão só abre conexão se o token não estiver no cache
+        async with async_session_maker() as session:
+            device = await device_auth_cache.get(session, token_header)
+
+        if not device:
+            response = JSONResponse(
                 status_code=status.HTTP_403_FORBIDDEN,
                 content={"detail": "Token de dispositivo inválido ou revogado"}
             )
+            await response(scope, receive, send)
+            return
 
-        request.state.device_id = device_id
-        response = await call_next(request)
-        return response
\ No newline at end of file
+        state = scope.setdefault("state", {})
+        state["device"] = device
+        state["device_id"] = device.id
+        await self.app(scope, receive, send)
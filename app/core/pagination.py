@@ -0,0 +1,57 @@
+"""
+Paginação por cursor (keyset) sobre (created_at, id).
+
+Com OFFSET o banco lê e descarta todas as linhas anteriores à página, então
+cada página fica mais lenta que a anterior. Além disso, linhas inseridas
+durante a navegação deslocam a janela, e o cliente pula ou repete registros.
+O cursor guarda a posição da última linha entregue. A próxima página começa
+logo depois dela, direto pelo índice, com custo constante.
+
+O cursor é opaco para o cliente: base64 (url-safe) de um JSON.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+CURSOR_HEADER = "X-Next-Cursor"
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = json.dumps({"t": created_at.isoformat(), "i": id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["t"]), int(data["i"])
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        raise InvalidCursor(f"Cursor inválido: {cursor!r}") from e
+
+def after_cursor(created_at_column, id_column, cursor: str):
+    """
+    Condição "depois do cursor" para a ordem (created_at DESC, id DESC).
+
+    Escrita como `created_at <= t AND (created_at < t OR id < i)` em vez de
+    `(created_at, id) < (t, i)`: assim o termo sobre created_at vira condição
+    de índice mesmo quando o índice não termina em id, e o desempate por id
+    só é avaliado nas linhas que têm o mesmo timestamp.
+    """
+    created_at, id = decode_cursor(cursor)
+    return and_(
+        created_at_column <= created_at,
+        or_(created_at_column < created_at, id_column < id),
+    )
+
+def next_cursor(rows, limit: int) -> Optional[str]:
+    """Cursor da próxima página, ou None se esta página foi a última."""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(last.created_at, last.id)
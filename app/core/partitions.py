@@ -0,0 +1,249 @@
+"""
+Gerenciamento das partições de `measurements` (PostgreSQL, RANGE por created_at).
+
+A tabela pai é particionada pela migração 9a1f3c6d2e47. Este módulo mantém
+partições futuras prontas (os índices da tabela pai são criados
+automaticamente em cada partição nova). A retenção com DROP de partições
+inteiras fica em app/core/retention.py (mesma proteção dos rollups e do
+arquivo frio).
+
+A partição DEFAULT (migração d5a0c3e81f64) recebe leituras fora das faixas
+existentes (timestamp do dispositivo além do horizonte ou numa faixa já
+removida). Ao criar uma partição cuja faixa tem linhas na DEFAULT, elas são
+movidas para a nova partição na mesma transação.
+
+Em SQLite (testes) ou antes da migração, tudo aqui é no-op.
+
+CLI:
+    python -m app.core.partitions list
+    python -m app.core.partitions ensure --premake 14
+    python -m app.core.partitions drop-before --days 90   (mesmas proteções da retenção)
+"""
+import argparse
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "measurements"
+
+# Evita que um DDL de partição fique na fila de locks travando a ingestão
+LOCK_TIMEOUT = "5s"
+
+_BOUND_PATTERN = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+@dataclass
+class Partition:
+    name: str
+    start: Optional[datetime] # None = MINVALUE (ex: partição legada da migração)
+    end: Optional[datetime]   # None = MAXVALUE
+
+def period_start(moment: datetime, interval: str) -> datetime:
+    """Início do período (dia ou semana ISO, segunda-feira) que contém `moment`."""
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+def next_boundary(moment: datetime, interval: str) -> datetime:
+    """Primeira fronteira de período estritamente depois de `moment`."""
+    step = timedelta(weeks=1) if interval == "week" else timedelta(days=1)
+    return period_start(moment, interval) + step
+
+def partition_name(start: datetime) -> str:
+    return f"{PARENT_TABLE}_p{start:%Y%m%d}"
+
+def _parse_bound(raw: str) -> Optional[datetime]:
+    raw = raw.strip("'")
+    if raw in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(raw)
+
+async def is_partitioned(session: AsyncSession) -> bool:
+    if session.bind.dialect.name != "postgresql":
+        return False
+    result = await session.exec(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+    ).bindparams(table=PARENT_TABLE))
+    return result.first() is not None
+
+async def default_partition(session: AsyncSession) -> Optional[str]:
+    """Nome da partição DEFAULT da tabela pai, se existir."""
+    result = await session.exec(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table) AND pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT'"
+    ).bindparams(table=PARENT_TABLE))
+    row = result.first()
+    return row[0] if row else None
+
+async def _create_partition(session: AsyncSession, name: str, start: datetime, end: datetime, default: Optional[str]):
+    bounds = f"FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+    params = {"start": start, "end": end}
+    stranded = default and (await session.exec(text(
+        f"SELECT 1 FROM {default} WHERE created_at >= :start AND created_at < :end LIMIT 1"
+    ).bindparams(**params))).first()
+    if not stranded:
+        await session.exec(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES {bounds}"))
+        return
+
+    # Linhas da faixa na DEFAULT: CREATE ... PARTITION OF falharia. Tabela
+    # avulsa, move as linhas e anexa (o ATTACH confere a DEFAULT já sem elas)
+    await session.exec(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = await session.exec(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE created_at >= :start AND created_at < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ).bindparams(**params))
+    await session.exec(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    logger.info(f"🧱 {moved.rowcount} linha(s) movidas de {default} para {name}.")
+
+async def list_partitions(session: AsyncSession) -> List[Partition]:
+    """Partições anexadas à tabela pai, em ordem cronológica."""
+    result = await session.exec(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ).bindparams(table=PARENT_TABLE))
+
+    partitions = []
+    for name, bound in result.all():
+        match = _BOUND_PATTERN.search(bound or "")
+        if not match: # DEFAULT
+            continue
+        partitions.append(Partition(name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    return sorted(partitions, key=lambda p: p.start or datetime.min)
+
+async def ensure_partitions(
+    session: AsyncSession,
+    premake: int = settings.MEASUREMENT_PARTITION_PREMAKE,
+    interval: str = settings.MEASUREMENT_PARTITION_INTERVAL,
+    now: Optional[datetime] = None,
+) -> List[str]:
+    """
+    Garante partições contíguas cobrindo até `premake` períodos à frente.
+    Continua a partir do fim da última partição existente (sem buracos nem
+    sobreposição, mesmo se o intervalo configurado mudar).
+    Retorna os nomes das partições criadas.
+    """
+    if not await is_partitioned(session):
+        return []
+
+    now = now or datetime.utcnow()
+    horizon = period_start(now, interval)
+    for _ in range(premake + 1):
+        horizon = next_boundary(horizon, interval)
+
+    existing = await list_partitions(session)
+    ends = [p.end for p in existing if p.end is not None]
+    cursor = max(ends) if ends else period_start(now, interval)
+
+    default = await default_partition(session)
+    created = []
+    await session.exec(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+    while cursor < horizon:
+        # Primeira fronteira alinhada depois do cursor (a 1ª pode ser um período curto)
+        upper = next_boundary(cursor, interval)
+        name = partition_name(cursor)
+        await _create_partition(session, name, cursor, upper, default)
+        created.append(name)
+        cursor = upper
+
+    await session.commit()
+    if created:
+        logger.info(f"🧱 Partições criadas: {', '.join(created)}")
+    return created
+
+async def drop_partition(session: AsyncSession, partition: Partition) -> int:
+    """DROP de uma partição (sem commit). Retorna os bytes liberados (tabela + índices)."""
+    size = (await session.exec(text(
+        "SELECT pg_total_relation_size(to_regclass(:name))"
+    ).bindparams(name=partition.name))).one()[0] or 0
+    await session.exec(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+    await session.exec(text(f"DROP TABLE IF EXISTS {partition.name}"))
+    return int(size)
+
+class PartitionManager:
+    """
+    Tarefa periódica do lifespan: cria partições futuras. Falhas são
+    logadas e tentadas de novo no próximo ciclo — com `premake` períodos
+    de folga. A retenção global (MEASUREMENT_RETENTION_DAYS) roda no
+    RetentionWorker, que só remove partições já agregadas e arquivadas.
+    """
+
+    def __init__(
+        self,
+        session_factory=async_session_maker,
+        check_interval_seconds: int = 3600,
+    ):
+        self.session_factory = session_factory
+        self.check_interval = check_interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        async with self.session_factory() as session:
+            await ensure_partitions(session)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Manutenção de partições falhou: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="partition-manager")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+partition_manager = PartitionManager(
+    check_interval_seconds=settings.MEASUREMENT_PARTITION_CHECK_INTERVAL_SECONDS,
+)
+
+# -----------------------------------------------------------------------------
+# CLI (cron/ops): python -m app.core.partitions <comando>
+# -----------------------------------------------------------------------------
+async def _cli(args):
+    async with async_session_maker() as session:
+        if not await is_partitioned(session):
+            print(f"⚠️ {PARENT_TABLE} não é particionada (rode as migrações).")
+            return
+        if args.command == "ensure":
+            created = await ensure_partitions(session, premake=args.premake)
+            print(f"✅ {len(created)} partição(ões) criada(s).")
+        elif args.command == "drop-before":
+            # Import local: retention importa este módulo
+            from app.core.retention import retention_worker
+            report = await retention_worker.drop_expired_partitions(datetime.utcnow() - timedelta(days=args.days))
+            print(f"✅ {len(report.partitions_dropped)} partição(ões) removida(s).")
+        for partition in await list_partitions(session):
+            print(f"{partition.name:<32}{partition.start or 'MINVALUE'!s:<22}{partition.end or 'MAXVALUE'!s}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partições de measurements")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    ensure = sub.add_parser("ensure")
+    ensure.add_argument("--premake", type=int, default=settings.MEASUREMENT_PARTITION_PREMAKE)
+    drop = sub.add_parser("drop-before")
+    drop.add_argument("--days", type=int, required=True)
+
+    asyncio.run(_cli(parser.parse_args()))
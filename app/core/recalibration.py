@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+from sqlalchemy import bindparam, func, tuple_, update
+from sqlmodel import select
+
+from app.core.analytics_cache import analytics_cache
+from app.core.calibration import calibrate_array
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.hot_window import hot_window
+from app.core.retention import raw_retained_since
+from app.core.rollups import refresh_rollups
+from app.models.device import Device
+from app.models.device_sensor import DeviceSensorLink
+from app.models.measurement import Measurement
+from app.models.organization import Organization
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RecalibrationJob:
+    """Estado (em memória) de uma re-calibração de histórico."""
+    id: str
+    device_id: int
+    sensor_type_id: int
+    formula: Optional[str]
+    calibration_version: int
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    status: str = "pending" # pending | running | done | failed | cancelled | superseded
+    total_rows: Optional[int] = None
+    processed_rows: int = 0
+    chunks: int = 0
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    @property
+    def progress(self) -> float:
+        if not self.total_rows:
+            return 1.0 if self.status == "done" else 0.0
+        return min(self.processed_rows / self.total_rows, 1.0)
+
+class RecalibrationRunner:
+    """
+    Executa re-calibrações em background.
+
+    Percorre as medições do par dispositivo/sensor em páginas por keyset
+    (created_at, id) — sem OFFSET — e grava cada página numa transação
+    própria e curta: nenhum lock longo na tabela e memória constante,
+    mesmo em backfills de dezenas de milhões de linhas.
+
+    Só linhas com raw_value são recalculadas (dados legados não têm o bruto).
+    Os jobs vivem na memória do worker que os criou.
+    """
+
+    def __init__(
+        self,
+        session_factory=async_session_maker,
+        chunk_size: int = 5000,
+        chunk_pause_ms: int = 0,
+        max_jobs: int = 100,
+    ):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause_ms / 1000
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, RecalibrationJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(
+        self,
+        device_id: int,
+        sensor_type_id: int,
+        formula: Optional[str],
+        calibration_version: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> RecalibrationJob:
+        job = RecalibrationJob(
+            id=uuid.uuid4().hex,
+            device_id=device_id,
+            sensor_type_id=sensor_type_id,
+            formula=formula,
+            calibration_version=calibration_version,
+            start=start,
+            end=end,
+        )
+        self.jobs[job.id] = job
+        # Histórico limitado: descarta os jobs finalizados mais antigos
+        while len(self.jobs) > self.max_jobs:
+            oldest_id = next(iter(self.jobs))
+            if oldest_id in self._tasks:
+                break
+            self.jobs.pop(oldest_id)
+
+        task = asyncio.create_task(self._run(job), name=f"recalibration-{job.id}")
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    def get(self, job_id: str) -> Optional[RecalibrationJob]:
+        return self.jobs.get(job_id)
+
+    async def wait(self, job_id: str):
+        task = self._tasks.get(job_id)
+        if task:
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    # -------------------------------------------------------------------------
+    # EXECUÇÃO
+    # -------------------------------------------------------------------------
+    def _scope(self, job: RecalibrationJob):
+        conditions = [
+            Measurement.device_id == job.device_id,
+            Measurement.sensor_type_id == job.sensor_type_id,
+            Measurement.raw_value.is_not(None),
+        ]
+        if job.start:
+            conditions.append(Measurement.created_at >= job.start)
+        if job.end:
+            conditions.append(Measurement.created_at <= job.end)
+        return conditions
+
+    async def _run(self, job: RecalibrationJob):
+        job.status = "running"
+        try:
+            async with self.session_factory() as session:
+                count_query = select(func.count()).select_from(Measurement).where(*self._scope(job))
+                job.total_rows = (await session.exec(count_query)).one()
+
+            cursor = None
+            while True:
+                async with self.session_factory() as session:
+                    # Fórmula trocada de novo no meio do caminho: outro job assume
+                    link = await session.get(DeviceSensorLink, (job.device_id, job.sensor_type_id))
+                    if not link or link.calibration_version != job.calibration_version:
+                        job.status = "superseded"
+                        break
+
+                    query = select(Measurement.id, Measurement.created_at, Measurement.raw_value).where(*self._scope(job))
+                    if cursor:
+                        query = query.where(tuple_(Measurement.created_at, Measurement.id) > cursor)
+                    query = query.order_by(Measurement.created_at, Measurement.id).limit(self.chunk_size)
+
+                    rows = (await session.exec(query)).all()
+                    if not rows:
+                        job.status = "done"
+                        break
+
+                    raw = np.fromiter((row.raw_value for row in rows), dtype=np.float64, count=len(rows))
+                    calibrated = calibrate_array(job.formula, raw)
+
+                    # UPDATE em massa (executemany) por id + created_at: com `measurements`
+                    # particionada, o created_at poda para uma única partição por linha
+                    await session.exec(
+                        update(Measurement.__table__)
+                        .where(
+                            Measurement.__table__.c.id == bindparam("b_id"),
+                            Measurement.__table__.c.created_at == bindparam("b_created_at"),
+                        )
+                        .values(value=bindparam("b_value")),
+                        params=[
+                            {"b_id": row.id, "b_created_at": row.created_at, "b_value": value}
+                            for row, value in zip(rows, calibrated.tolist())
+                        ],
+                    )
+                    await session.commit()
+
+                cursor = (rows[-1].created_at, rows[-1].id)
+                job.processed_rows += len(rows)
+                job.chunks += 1
+                # Cede o loop (e opcionalmente pausa) entre transações
+                await asyncio.sleep(self.chunk_pause)
+
+            # Valores mudaram: rollups do intervalo são recalculados (só onde
+            # ainda há brutos; o histórico já expirado vive só nos rollups)
+            if job.status == "done" and job.processed_rows:
+                async with self.session_factory() as session:
+                    device = await session.get(Device, job.device_id)
+                    org = await session.get(Organization, device.organization_id) if device and device.organization_id else None
+                    raw_since = raw_retained_since(org, datetime.utcnow())
+                    await refresh_rollups(session, job.device_id, job.sensor_type_id, job.start, job.end, raw_since)
+                hot_window.invalidate()
+                analytics_cache.invalidate_range(job.device_id, job.sensor_type_id, job.start, job.end)
+
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"❌ Re-calibração {job.id} falhou: {e}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            logger.info(
+                f"🧮 Re-calibração {job.id} ({job.status}): "
+                f"{job.processed_rows}/{job.total_rows} linhas em {job.chunks} blocos."
+            )
+
+recalibration_runner = RecalibrationRunner(
+    chunk_size=settings.RECALIBRATION_CHUNK_SIZE,
+    chunk_pause_ms=settings.RECALIBRATION_CHUNK_PAUSE_MS,
+)
@@ -0,0 +1,326 @@
+"""
+Retenção por organização (campos *_retention_days de Organization).
+
+Ordem de cada rodada:
+  1. Downsampling: o job de rollup agrega as linhas pendentes. Só linhas
+     já agregadas (id <= watermark) são candidatas a remoção, então nenhum
+     dado bruto some antes de estar nos rollups.
+  2. Partições inteiras expiradas para TODAS as organizações (ou pela
+     retenção global MEASUREMENT_RETENTION_DAYS): DROP (instantâneo, devolve
+     o espaço ao sistema de arquivos). Só partições sem linhas pendentes de
+     rollup e, com o arquivo frio ligado, já arquivadas. Linhas expiradas
+     que caíram na partição DEFAULT saem por DELETE.
+  3. O resto: DELETE em blocos de `chunk_size` linhas, uma transação curta
+     por bloco (sem lock longo nem WAL gigante).
+  4. Rollups expirados de cada resolução, também em blocos.
+  5. Dias expirados no arquivo frio (Parquet), se houver.
+
+Cada rodada gera um RetentionReport por organização (linhas e bytes).
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, text, tuple_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.analytics_cache import analytics_cache
+from app.core.archive import ColdArchive, cold_archive
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.partitions import PARENT_TABLE, default_partition, drop_partition, is_partitioned, list_partitions
+from app.core.rollups import WATERMARK_NAME, rollup_new_rows
+from app.models.device import Device
+from app.models.measurement import Measurement
+from app.models.measurement_rollup import MeasurementRollup, RollupWatermark
+from app.models.organization import Organization
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RetentionReport:
+    organization_id: Optional[int] # None = partições removidas para todas as orgs
+    raw_rows_deleted: int = 0
+    rollup_rows_deleted: Dict[str, int] = field(default_factory=dict)
+    partitions_dropped: List[str] = field(default_factory=list)
+    archive_bytes_deleted: int = 0
+    # DROP: tamanho exato. DELETE: estimativa (linhas x bytes médios por linha);
+    # o espaço volta para o Postgres após o VACUUM, não para o disco.
+    bytes_reclaimed: int = 0
+    chunks: int = 0
+
+def rollup_retention_days(org: Organization) -> Dict[str, Optional[int]]:
+    return {
+        "minute": org.minute_rollup_retention_days,
+        "hour": org.hour_rollup_retention_days,
+        "day": org.day_rollup_retention_days,
+    }
+
+def raw_retained_since(
+    org: Optional[Organization],
+    now: datetime,
+    archive: ColdArchive = cold_archive,
+    global_retention_days: Optional[int] = settings.MEASUREMENT_RETENTION_DAYS,
+) -> Optional[datetime]:
+    """
+    A partir de quando os dados brutos da org estão completos no Postgres
+    (None = desde sempre). Antes disso a retenção ou o arquivo frio podem ter
+    removido linhas que só sobrevivem nos rollups.
+    """
+    bounds = []
+    if org and org.raw_retention_days:
+        bounds.append(now - timedelta(days=org.raw_retention_days))
+    if global_retention_days:
+        bounds.append(now - timedelta(days=global_retention_days))
+    if archive.enabled and archive.archived_until():
+        bounds.append(archive.archived_until())
+    return max(bounds, default=None)
+
+def rollups_retained_since(org: Optional[Organization], resolution: str, now: datetime) -> Optional[datetime]:
+    """A partir de quando os rollups da resolução estão completos (None = desde sempre)."""
+    days = rollup_retention_days(org).get(resolution) if org else None
+    return now - timedelta(days=days) if days else None
+
+async def _avg_row_bytes(session: AsyncSession, table: str) -> float:
+    if session.bind.dialect.name != "postgresql":
+        return 0.0
+    result = await session.exec(text(
+        "SELECT sum(pg_total_relation_size(pt.relid))::float8 / NULLIF(sum(c.reltuples), 0) "
+        "FROM pg_partition_tree(to_regclass(:table)) pt JOIN pg_class c ON c.oid = pt.relid "
+        "WHERE pt.isleaf"
+    ).bindparams(table=table))
+    return result.one()[0] or 0.0
+
+async def _rolled_up_id(session: AsyncSession) -> int:
+    query = select(RollupWatermark.last_id).where(RollupWatermark.name == WATERMARK_NAME)
+    return (await session.exec(query)).first() or 0
+
+class RetentionWorker:
+    def __init__(
+        self,
+        session_factory=async_session_maker,
+        interval_seconds: int = 3600,
+        chunk_size: int = 10000,
+        chunk_pause_ms: int = 0,
+        archive: ColdArchive = cold_archive,
+        archive_after_days: Optional[int] = None,
+        global_retention_days: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        self.archive = archive
+        self.archive_after_days = archive_after_days
+        self.global_retention_days = global_retention_days
+        self.interval = interval_seconds
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause_ms / 1000
+        self.last_run_at: Optional[datetime] = None
+        self.last_reports: List[RetentionReport] = []
+        self._task: Optional[asyncio.Task] = None
+
+    # -------------------------------------------------------------------------
+    # RODADA
+    # -------------------------------------------------------------------------
+    async def run_once(self, now: Optional[datetime] = None) -> List[RetentionReport]:
+        now = now or datetime.utcnow()
+
+        # 1. Downsampling antes de qualquer remoção
+        async with self.session_factory() as session:
+            await rollup_new_rows(session)
+            rolled_up_id = await _rolled_up_id(session)
+            orgs = (await session.exec(select(Organization))).all()
+            orphan_devices = (await session.exec(
+                select(func.count(Device.id)).where(Device.organization_id.is_(None))
+            )).one()
+
+        reports = {org.id: RetentionReport(organization_id=org.id) for org in orgs}
+
+        # 2. Partições: retenção global ou quando nenhuma org (nem device sem org) precisa delas
+        partition_cutoffs = []
+        if self.global_retention_days:
+            partition_cutoffs.append(now - timedelta(days=self.global_retention_days))
+        raw_days = [org.raw_retention_days for org in orgs]
+        if orgs and all(raw_days) and not orphan_devices:
+            partition_cutoffs.append(now - timedelta(days=max(raw_days)))
+        if partition_cutoffs:
+            global_report = await self.drop_expired_partitions(max(partition_cutoffs), rolled_up_id)
+            if global_report.partitions_dropped or global_report.raw_rows_deleted:
+                reports[None] = global_report
+
+        for org in orgs:
+            report = reports[org.id]
+            cutoffs = []
+            # 3. Dados brutos
+            if org.raw_retention_days:
+                cutoff = now - timedelta(days=org.raw_retention_days)
+                cutoffs.append(cutoff)
+                await self._delete_raw(org.id, cutoff, rolled_up_id, report)
+                # 5. Arquivo frio: mesma política dos dados brutos
+                report.archive_bytes_deleted = await asyncio.to_thread(self.archive.delete_before, org.id, cutoff)
+                report.bytes_reclaimed += report.archive_bytes_deleted
+            # 4. Rollups
+            for resolution, days in rollup_retention_days(org).items():
+                if days:
+                    cutoffs.append(now - timedelta(days=days))
+                    await self._delete_rollups(org.id, resolution, cutoffs[-1], report)
+            # Buckets antigos em cache deixaram de existir no banco/arquivo
+            if report.raw_rows_deleted or report.rollup_rows_deleted or report.archive_bytes_deleted:
+                analytics_cache.invalidate_organization(org.id, before=max(cutoffs))
+
+        self.last_run_at = now
+        self.last_reports = [
+            r for r in reports.values()
+            if r.raw_rows_deleted or r.partitions_dropped or r.rollup_rows_deleted or r.archive_bytes_deleted
+        ]
+        for report in self.last_reports:
+            logger.info(
+                f"🧹 Retenção org={report.organization_id}: {report.raw_rows_deleted} brutas, "
+                f"rollups={report.rollup_rows_deleted}, partições={report.partitions_dropped}, "
+                f"~{report.bytes_reclaimed / 1024 / 1024:.1f} MB"
+            )
+        return self.last_reports
+
+    async def drop_expired_partitions(self, cutoff: datetime, rolled_up_id: Optional[int] = None) -> RetentionReport:
+        """
+        DROP das partições inteiramente anteriores ao cutoff, para todas as orgs.
+        Pula (até a próxima rodada) partições com linhas ainda não agregadas nos
+        rollups e, com o arquivo frio ligado, as que o arquivador ainda não fechou.
+        """
+        report = RetentionReport(organization_id=None)
+        async with self.session_factory() as session:
+            if not await is_partitioned(session):
+                return report
+            if rolled_up_id is None:
+                await rollup_new_rows(session)
+                rolled_up_id = await _rolled_up_id(session)
+            if self.archive.enabled and self.archive_after_days:
+                cutoff = min(cutoff, self.archive.archived_until() or datetime.min)
+
+            for partition in await list_partitions(session):
+                if partition.end is None or partition.end > cutoff:
+                    continue
+                # Partição com linhas ainda não agregadas fica para a próxima rodada
+                pending = (await session.exec(text(
+                    f"SELECT 1 FROM {partition.name} WHERE id > :last_id LIMIT 1"
+                ).bindparams(last_id=rolled_up_id))).first()
+                if pending:
+                    continue
+                report.bytes_reclaimed += await drop_partition(session, partition)
+                report.partitions_dropped.append(partition.name)
+                await session.commit()
+
+            # Leituras expiradas na DEFAULT (faixas já removidas): não há partição para DROP
+            default = await default_partition(session)
+            if default:
+                result = await session.exec(text(
+                    f"DELETE FROM {default} WHERE created_at < :cutoff AND id <= :last_id"
+                ).bindparams(cutoff=cutoff, last_id=rolled_up_id))
+                await session.commit()
+                report.raw_rows_deleted += result.rowcount or 0
+
+        if report.partitions_dropped:
+            logger.info(f"🗑️ Partições removidas (< {cutoff:%Y-%m-%d}): {', '.join(report.partitions_dropped)}")
+        return report
+
+    async def _delete_raw(self, organization_id: int, cutoff: datetime, rolled_up_id: int, report: RetentionReport):
+        async with self.session_factory() as session:
+            row_bytes = await _avg_row_bytes(session, PARENT_TABLE)
+
+        while True:
+            async with self.session_factory() as session:
+                ids = (
+                    select(Measurement.id)
+                    .where(
+                        Measurement.organization_id == organization_id,
+                        Measurement.created_at < cutoff,
+                        Measurement.id <= rolled_up_id,
+                    )
+                    .limit(self.chunk_size)
+                )
+                # created_at repetido no DELETE: poda de partições também aqui
+                result = await session.exec(
+                    delete(Measurement)
+                    .where(Measurement.id.in_(ids.scalar_subquery()), Measurement.created_at < cutoff)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+
+            deleted = result.rowcount or 0
+            report.raw_rows_deleted += deleted
+            report.bytes_reclaimed += int(deleted * row_bytes)
+            report.chunks += 1
+            if deleted < self.chunk_size:
+                return
+            await asyncio.sleep(self.chunk_pause)
+
+    async def _delete_rollups(self, organization_id: int, resolution: str, cutoff: datetime, report: RetentionReport):
+        key = (
+            MeasurementRollup.resolution,
+            MeasurementRollup.device_id,
+            MeasurementRollup.sensor_type_id,
+            MeasurementRollup.bucket,
+        )
+        async with self.session_factory() as session:
+            row_bytes = await _avg_row_bytes(session, MeasurementRollup.__tablename__)
+
+        while True:
+            async with self.session_factory() as session:
+                expired = (
+                    select(*key)
+                    .where(
+                        MeasurementRollup.organization_id == organization_id,
+                        MeasurementRollup.resolution == resolution,
+                        MeasurementRollup.bucket < cutoff,
+                    )
+                    .limit(self.chunk_size)
+                )
+                result = await session.exec(
+                    delete(MeasurementRollup)
+                    .where(tuple_(*key).in_(expired))
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+
+            deleted = result.rowcount or 0
+            if deleted:
+                report.rollup_rows_deleted[resolution] = report.rollup_rows_deleted.get(resolution, 0) + deleted
+                report.bytes_reclaimed += int(deleted * row_bytes)
+            report.chunks += 1
+            if deleted < self.chunk_size:
+                return
+            await asyncio.sleep(self.chunk_pause)
+
+    # -------------------------------------------------------------------------
+    # CICLO DE VIDA
+    # -------------------------------------------------------------------------
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Retenção falhou: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="retention-worker")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+retention_worker = RetentionWorker(
+    interval_seconds=settings.RETENTION_INTERVAL_SECONDS,
+    chunk_size=settings.RETENTION_CHUNK_SIZE,
+    chunk_pause_ms=settings.RETENTION_CHUNK_PAUSE_MS,
+    archive_after_days=settings.ARCHIVE_AFTER_DAYS,
+    global_retention_days=settings.MEASUREMENT_RETENTION_DAYS,
+)
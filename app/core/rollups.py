@@ -0,0 +1,476 @@
+"""
+Rollups incrementais de measurements (minuto / hora / dia).
+
+Um job periódico agrega só as linhas novas desde o watermark (por id, não
+por created_at: leituras atrasadas enviadas com `timestamp` antigo recebem
+id novo e entram no bucket certo). Cada rodada faz UMA varredura das linhas
+novas em buckets de minuto; hora e dia são derivados desses agregados em
+Python e tudo é somado às linhas existentes via UPSERT, na mesma transação
+que avança o watermark. O watermark só passa de um id quando nenhuma
+transação que poderia ter ids menores segue aberta (`safe_rollup_id`).
+
+O analytics lê o rollup mais grosso que ainda divide o bucket pedido (ex:
+minuto para 5m/15m, hora para 6h) e reagrupa com date_bin; só toca dados
+brutos para as linhas ainda não agregadas (id > last_id), na mesma consulta
+(mesmo snapshot).
+"""
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Integer, cast, delete, func, literal_column, null, text, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.models.measurement import Measurement
+from app.models.measurement_rollup import MeasurementRollup, RollupWatermark
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = "measurements"
+
+# Da mais fina para a mais grossa
+RESOLUTIONS = ("minute", "hour", "day")
+
+_SQLITE_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+def truncate(moment: datetime, resolution: str) -> datetime:
+    """date_trunc em Python."""
+    moment = moment.replace(second=0, microsecond=0)
+    if resolution in ("hour", "day"):
+        moment = moment.replace(minute=0)
+    if resolution == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+# -----------------------------------------------------------------------------
+# BUCKETS DE LARGURA ARBITRÁRIA (5m, 15m, 6h, 1d...)
+# -----------------------------------------------------------------------------
+# Buckets alinhados à época Unix (mesma origem do date_bin, do SQLite e do NumPy)
+EPOCH = datetime(1970, 1, 1)
+
+RESOLUTION_WIDTHS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+_BUCKET_PATTERN = re.compile(r"^(\d+)([mhd])$")
+_BUCKET_UNITS = {"m": timedelta(minutes=1), "h": timedelta(hours=1), "d": timedelta(days=1)}
+
+def parse_bucket(bucket_size: str) -> timedelta:
+    """'minute'/'hour'/'day' ou '<n>m', '<n>h', '<n>d' -> largura do bucket."""
+    if bucket_size in RESOLUTION_WIDTHS:
+        return RESOLUTION_WIDTHS[bucket_size]
+    match = _BUCKET_PATTERN.match(bucket_size)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Bucket inválido: {bucket_size!r} (use minute/hour/day ou ex: 5m, 15m, 6h, 1d).")
+    return int(match.group(1)) * _BUCKET_UNITS[match.group(2)]
+
+def floor_bucket(moment: datetime, width: timedelta) -> datetime:
+    return EPOCH + (moment - EPOCH) // width * width
+
+def ceil_bucket(moment: datetime, width: timedelta) -> datetime:
+    floor = floor_bucket(moment, width)
+    return floor if floor == moment else floor + width
+
+def pick_resolution(width: timedelta) -> str:
+    """Rollup mais grosso cuja largura divide o bucket pedido."""
+    return [r for r in RESOLUTIONS if width % RESOLUTION_WIDTHS[r] == timedelta(0)][-1]
+
+def bin_expression(dialect_name: str, width: timedelta, column=Measurement.created_at):
+    """date_bin no PostgreSQL; aritmética sobre epoch no SQLite (testes)."""
+    seconds = int(width.total_seconds())
+    if dialect_name == "sqlite":
+        epoch = cast(func.strftime("%s", column), Integer)
+        return func.datetime(epoch // seconds * seconds, "unixepoch")
+    # Literais (não parâmetros): a mesma expressão no SELECT e no GROUP BY
+    return func.date_bin(
+        literal_column(f"interval '{seconds} seconds'"), column, literal_column("timestamp '1970-01-01'")
+    )
+
+def bucket_expression(dialect_name: str, resolution: str, column=Measurement.created_at):
+    """date_trunc no PostgreSQL; strftime no SQLite (testes)."""
+    if dialect_name == "sqlite":
+        return func.strftime(_SQLITE_FORMATS[resolution], column)
+    return func.date_trunc(resolution, column)
+
+def as_datetime(value) -> datetime:
+    # SQLite devolve o bucket do strftime como texto
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+# -----------------------------------------------------------------------------
+# AGREGAÇÃO / UPSERT
+# -----------------------------------------------------------------------------
+RollupKey = Tuple[str, int, int, datetime]
+
+def _merge(target: dict, total: float, count: int, low: float, high: float):
+    target["sum_value"] += total
+    target["count"] += count
+    target["min_value"] = min(target["min_value"], low)
+    target["max_value"] = max(target["max_value"], high)
+
+def cascade_minutes(minute_rows: Iterable) -> List[dict]:
+    """
+    (device, sensor, org, bucket_minuto, soma, contagem, min, max) ->
+    linhas de rollup das três resoluções, já somadas por chave.
+    """
+    rollups: Dict[RollupKey, dict] = {}
+    for device_id, sensor_type_id, organization_id, bucket, total, count, low, high in minute_rows:
+        bucket = as_datetime(bucket)
+        for resolution in RESOLUTIONS:
+            key = (resolution, device_id, sensor_type_id, truncate(bucket, resolution))
+            if key not in rollups:
+                rollups[key] = {
+                    "resolution": resolution,
+                    "device_id": device_id,
+                    "sensor_type_id": sensor_type_id,
+                    "bucket": key[3],
+                    "organization_id": organization_id,
+                    "sum_value": 0.0,
+                    "count": 0,
+                    "min_value": low,
+                    "max_value": high,
+                }
+            _merge(rollups[key], float(total), int(count), low, high)
+    # Ordem fixa de chaves: dois upserts concorrentes não entram em deadlock
+    return [rollups[key] for key in sorted(rollups)]
+
+async def upsert_rollups(session: AsyncSession, rows: List[dict]):
+    """Soma os agregados às linhas existentes (INSERT ... ON CONFLICT DO UPDATE)."""
+    if not rows:
+        return
+    dialect_name = session.bind.dialect.name
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    least, greatest = (func.least, func.greatest) if dialect_name == "postgresql" else (func.min, func.max)
+
+    table = MeasurementRollup.__table__
+    stmt = dialect.insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.resolution, table.c.device_id, table.c.sensor_type_id, table.c.bucket],
+        set_={
+            "sum_value": table.c.sum_value + stmt.excluded.sum_value,
+            "count": table.c.count + stmt.excluded.count,
+            "min_value": least(table.c.min_value, stmt.excluded.min_value),
+            "max_value": greatest(table.c.max_value, stmt.excluded.max_value),
+        },
+    )
+    await session.exec(stmt, params=rows)
+
+def _minute_aggregates(dialect_name: str, *conditions):
+    bucket = bucket_expression(dialect_name, "minute").label("bucket")
+    return (
+        select(
+            Measurement.device_id,
+            Measurement.sensor_type_id,
+            Measurement.organization_id,
+            bucket,
+            func.sum(Measurement.value),
+            func.count(Measurement.id),
+            func.min(Measurement.value),
+            func.max(Measurement.value),
+        )
+        .where(*conditions)
+        .group_by(Measurement.device_id, Measurement.sensor_type_id, Measurement.organization_id, bucket)
+    )
+
+async def _lock_watermark(session: AsyncSession) -> RollupWatermark:
+    query = select(RollupWatermark).where(RollupWatermark.name == WATERMARK_NAME).with_for_update()
+    watermark = (await session.exec(query)).first()
+    if watermark is None:
+        watermark = RollupWatermark(name=WATERMARK_NAME)
+        session.add(watermark)
+        await session.flush()
+    return watermark
+
+async def _oldest_running_xid(session: AsyncSession) -> Optional[int]:
+    """xmin do snapshot atual: toda transação com xid menor já terminou (None fora do PostgreSQL)."""
+    if session.bind.dialect.name != "postgresql":
+        return None
+    return (await session.exec(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"))).one()[0]
+
+async def _max_id(session: AsyncSession) -> Tuple[int, Optional[int]]:
+    """Maior id visível e o xmax do MESMO snapshot (transações em voo nele têm xid < xmax)."""
+    if session.bind.dialect.name != "postgresql":
+        return (await session.exec(select(func.max(Measurement.id)))).one() or 0, None
+    max_id, xmax = (await session.exec(text(
+        f"SELECT (SELECT max(id) FROM {Measurement.__tablename__}), "
+        "pg_snapshot_xmax(pg_current_snapshot())::text::bigint"
+    ))).one()
+    return max_id or 0, xmax
+
+def safe_rollup_id(
+    watermark: RollupWatermark,
+    max_id: int,
+    now: datetime,
+    lag_seconds: int,
+    oldest_running_xid: Optional[int] = None,
+) -> int:
+    """
+    Maior id que pode ser agregado sem pular linhas de transações ainda abertas.
+    O candidato (pending_id) vale depois do lag E, no PostgreSQL, quando todas
+    as transações em voo no snapshot em que ele foi lido já terminaram: um
+    COPY/lote longo que alocou ids menores e ainda não fez COMMIT segura o
+    watermark, em vez de ter as linhas puladas para sempre.
+    """
+    if lag_seconds <= 0:
+        return max_id
+    if not watermark.pending_at or now - watermark.pending_at < timedelta(seconds=lag_seconds):
+        return watermark.last_id
+    if watermark.pending_xmax is not None and oldest_running_xid is not None and oldest_running_xid < watermark.pending_xmax:
+        return watermark.last_id
+    return watermark.pending_id
+
+async def rollup_new_rows(
+    session: AsyncSession,
+    lag_seconds: Optional[int] = None,
+    max_rows: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Agrega as linhas com last_id < id <= limite seguro (`safe_rollup_id`),
+    em blocos de `max_rows` ids, cada bloco numa transação. Retorna as
+    linhas agregadas.
+    """
+    lag_seconds = settings.ROLLUP_LAG_SECONDS if lag_seconds is None else lag_seconds
+    max_rows = max_rows or settings.ROLLUP_MAX_ROWS_PER_RUN
+    now = now or datetime.utcnow()
+    processed = 0
+    while True:
+        # Antes do lock: a própria transação ainda não tem xid para segurar o xmin
+        oldest_running_xid = await _oldest_running_xid(session)
+        watermark = await _lock_watermark(session)
+        max_id, snapshot_xmax = await _max_id(session)
+        safe_id = safe_rollup_id(watermark, max_id, now, lag_seconds, oldest_running_xid)
+
+        upper = min(safe_id, watermark.last_id + max_rows)
+        if upper > watermark.last_id:
+            query = _minute_aggregates(
+                session.bind.dialect.name,
+                Measurement.id > watermark.last_id,
+                Measurement.id <= upper,
+            )
+            minute_rows = (await session.exec(query)).all()
+            await upsert_rollups(session, cascade_minutes(minute_rows))
+            processed += sum(row[5] for row in minute_rows)
+            watermark.last_id = upper
+
+        caught_up = watermark.last_id >= safe_id
+        if caught_up and (lag_seconds <= 0 or watermark.pending_id <= watermark.last_id):
+            # Candidato da próxima rodada: tudo o que existe agora
+            watermark.pending_id = max_id
+            watermark.pending_at = now
+            watermark.pending_xmax = snapshot_xmax
+        watermark.updated_at = now
+        session.add(watermark)
+        await session.commit()
+
+        if caught_up:
+            return processed
+
+async def refresh_rollups(
+    session: AsyncSession,
+    device_id: int,
+    sensor_type_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    raw_since: Optional[datetime] = None,
+):
+    """
+    Recalcula do zero os rollups de um dispositivo/sensor num intervalo
+    (ex: após re-calibrar o histórico). O intervalo é alargado para dias
+    inteiros, então as três resoluções ficam consistentes entre si.
+    Linhas ainda não agregadas (id > last_id) ficam para o job.
+
+    Só dias com os dados brutos completos no Postgres são recalculados: a
+    partir do primeiro bruto que restou do par e do primeiro dia inteiro
+    depois de `raw_since` (corte de retenção / fronteira do arquivo). Antes
+    disso os rollups são a única cópia e ficam como estão.
+    """
+    watermark = await _lock_watermark(session)
+
+    conditions = [
+        MeasurementRollup.device_id == device_id,
+        MeasurementRollup.sensor_type_id == sensor_type_id,
+    ]
+    raw_conditions = [
+        Measurement.device_id == device_id,
+        Measurement.sensor_type_id == sensor_type_id,
+        Measurement.id <= watermark.last_id,
+    ]
+    first_raw = (await session.exec(select(func.min(Measurement.created_at)).where(*raw_conditions))).one()
+    if first_raw is None:
+        await session.commit()
+        return
+    first_day = truncate(first_raw, "day")
+    if raw_since and raw_since > first_day:
+        # Dia do corte pode ter perdido brutos: começa no dia inteiro seguinte
+        first_day = truncate(raw_since, "day")
+        if first_day < raw_since:
+            first_day += timedelta(days=1)
+    start = max(truncate(start, "day"), first_day) if start else first_day
+    conditions.append(MeasurementRollup.bucket >= start)
+    raw_conditions.append(Measurement.created_at >= start)
+    if end:
+        end = truncate(end, "day") + timedelta(days=1)
+        conditions.append(MeasurementRollup.bucket < end)
+        raw_conditions.append(Measurement.created_at < end)
+
+    await session.exec(delete(MeasurementRollup).where(*conditions))
+    minute_rows = (await session.exec(_minute_aggregates(session.bind.dialect.name, *raw_conditions))).all()
+    await upsert_rollups(session, cascade_minutes(minute_rows))
+    await session.commit()
+
+# -----------------------------------------------------------------------------
+# LEITURA (analytics)
+# -----------------------------------------------------------------------------
+def bucket_key(bucket: dict) -> Tuple[datetime, int, int]:
+    return bucket["bucket"], bucket["device_id"] or 0, bucket["sensor_type_id"]
+
+def merge_buckets(*sources: Iterable[dict]) -> List[dict]:
+    """Soma buckets de mesma chave vindos de fontes diferentes (rollup, brutos, arquivo)."""
+    merged: Dict[Tuple[datetime, int, int], dict] = {}
+    for source in sources:
+        for bucket in source:
+            key = bucket_key(bucket)
+            if key not in merged:
+                merged[key] = {**bucket, "sum_value": 0.0, "count": 0}
+            _merge(merged[key], float(bucket["sum_value"]), int(bucket["count"]), bucket["min_value"], bucket["max_value"])
+    return [merged[key] for key in sorted(merged)]
+
+async def query_buckets(
+    session: AsyncSession,
+    organization_id: int,
+    bucket_size: str,
+    start: datetime,
+    end: Optional[datetime] = None,
+    group_by: str = "sensor",
+    device_id: Optional[int] = None,
+    sensor_type_id: Optional[int] = None,
+) -> List[dict]:
+    """
+    Agregados por (bucket, sensor) — ou (bucket, dispositivo, sensor) com
+    group_by="device" — em [start, end), com start/end alinhados à
+    resolução do rollup usado: rollup para o que já foi agregado + dados
+    brutos só para id > last_id. Filtros opcionais por dispositivo/sensor
+    usam a chave primária do rollup e os índices por organização.
+    """
+    dialect_name = session.bind.dialect.name
+    width = parse_bucket(bucket_size)
+    resolution = pick_resolution(width)
+    start = floor_bucket(start, RESOLUTION_WIDTHS[resolution])
+    by_device = group_by == "device"
+
+    def grouped(bucket_column, device_column, sensor_column, value_columns, conditions):
+        bucket = bin_expression(dialect_name, width, bucket_column)
+        device = device_column if by_device else cast(null(), Integer)
+        keys = [bucket, device_column, sensor_column] if by_device else [bucket, sensor_column]
+        if device_id:
+            conditions.append(device_column == device_id)
+        if sensor_type_id:
+            conditions.append(sensor_column == sensor_type_id)
+        return (
+            select(bucket.label("bucket"), device.label("device_id"), sensor_column.label("sensor_type_id"), *value_columns)
+            .where(*conditions)
+            .group_by(*keys)
+        )
+
+    rolled_conditions = [
+        MeasurementRollup.resolution == resolution,
+        MeasurementRollup.organization_id == organization_id,
+        MeasurementRollup.bucket >= start,
+    ]
+    raw_conditions = [
+        Measurement.organization_id == organization_id,
+        Measurement.created_at >= start,
+    ]
+    if end:
+        end = ceil_bucket(end, RESOLUTION_WIDTHS[resolution])
+        rolled_conditions.append(MeasurementRollup.bucket < end)
+        raw_conditions.append(Measurement.created_at < end)
+
+    rolled = grouped(
+        MeasurementRollup.bucket, MeasurementRollup.device_id, MeasurementRollup.sensor_type_id,
+        [
+            func.sum(MeasurementRollup.sum_value),
+            func.sum(MeasurementRollup.count),
+            func.min(MeasurementRollup.min_value),
+            func.max(MeasurementRollup.max_value),
+        ],
+        rolled_conditions,
+    )
+
+    last_id = (
+        select(RollupWatermark.last_id)
+        .where(RollupWatermark.name == WATERMARK_NAME)
+        .scalar_subquery()
+    )
+    fresh = grouped(
+        Measurement.created_at, Measurement.device_id, Measurement.sensor_type_id,
+        [
+            func.sum(Measurement.value),
+            func.count(Measurement.id),
+            func.min(Measurement.value),
+            func.max(Measurement.value),
+        ],
+        raw_conditions + [Measurement.id > func.coalesce(last_id, 0)],
+    )
+
+    result = await session.exec(union_all(rolled, fresh))
+    return merge_buckets(
+        {
+            "bucket": as_datetime(bucket),
+            "device_id": device,
+            "sensor_type_id": sensor,
+            "sum_value": total,
+            "count": count,
+            "min_value": low,
+            "max_value": high,
+        }
+        for bucket, device, sensor, total, count, low, high in result.all()
+    )
+
+# -----------------------------------------------------------------------------
+# JOB PERIÓDICO (lifespan)
+# -----------------------------------------------------------------------------
+class RollupWorker:
+    def __init__(self, session_factory=async_session_maker, interval_seconds: int = 30):
+        self.session_factory = session_factory
+        self.interval = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            try:
+                async with self.session_factory() as session:
+                    processed = await rollup_new_rows(session)
+                if processed:
+                    logger.info(f"📊 Rollup: {processed} linhas agregadas.")
+            except Exception as e:
+                logger.error(f"❌ Rollup falhou: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="rollup-worker")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+rollup_worker = RollupWorker(interval_seconds=settings.ROLLUP_INTERVAL_SECONDS)
@@ -1,40 +1,400 @@
-from typing import Dict, List
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
 from fastapi import WebSocket
 
+from app.core.broadcast import create_broadcast
+from app.core.config import settings
+from app.core.frames import Frame
+
+# Fechamento por cliente lento: "Try Again Later"
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Chave do índice de rotas: (device_id, sensor_type_id); None = qualquer um
+RouteKey = Tuple[Optional[int], Optional[int]]
+
+class ClientConnection:
+    """
+    Um socket com fila de saída própria (limitada) e um writer dedicado.
+    O broadcast só enfileira: um dashboard lento atrasa apenas a si mesmo.
+
+    Fila cheia (policy):
+      - "drop_oldest": descarta a mensagem mais antiga da fila.
+      - "coalesce":    substitui a leitura pendente do mesmo (device, sensor)
+                       pela mais nova; sem pendente do par, descarta a mais antiga.
+      - "disconnect":  fecha o socket (o cliente reconecta e recomeça do zero).
+    Um envio travado por mais de `send_timeout` segundos também fecha o socket.
+
+    A fila guarda Frames compartilhados: a mensagem é serializada uma vez por
+    codificação, não uma vez por socket (`encoding`: "json" ou "msgpack").
+
+    Assinatura: `device_ids` / `sensor_type_ids` (None = todos). Sem
+    mensagem de subscribe o cliente recebe a organização inteira.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        organization_id: int,
+        on_evict,
+        max_queue: int = 256,
+        policy: str = "drop_oldest",
+        send_timeout: float = 10,
+        encoding: str = "json",
+    ):
+        self.websocket = websocket
+        self.organization_id = organization_id
+        self.encoding = encoding
+        self.device_ids: Optional[Set[int]] = None
+        self.sensor_type_ids: Optional[Set[int]] = None
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self._on_evict = on_evict
+
+        # Entradas [chave (device, sensor), frame, instante do enqueue]
+        self._queue: Deque[list] = deque()
+        self._pending: Dict[tuple, list] = {} # Entrada mais nova de cada par (coalesce)
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closer: Optional[asyncio.Task] = None
+        self.closed = False
+
+        # Métricas
+        self.connected_at = time.monotonic()
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._total_lag_ms = 0.0
+        self.evicted_reason: Optional[str] = None
+
+    def route_keys(self) -> List[RouteKey]:
+        """Combinações (device, sensor) que esta conexão quer receber."""
+        devices = [None] if self.device_ids is None else sorted(self.device_ids)
+        sensors = [None] if self.sensor_type_ids is None else sorted(self.sensor_type_ids)
+        return [(device, sensor) for device in devices for sensor in sensors]
+
+    def start(self):
+        self._task = asyncio.create_task(self._write(), name=f"ws-writer-org-{self.organization_id}")
+
+    def stop(self):
+        self.closed = True
+        self._queue.clear()
+        self._pending.clear()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    # -------------------------------------------------------------------------
+    # FILA
+    # -------------------------------------------------------------------------
+    def _forget(self, entry: list):
+        if entry[0] is not None and self._pending.get(entry[0]) is entry:
+            del self._pending[entry[0]]
+
+    def enqueue(self, frame: Frame) -> bool:
+        """Não bloqueia. False se a mensagem não entrou (socket fechado/evictado)."""
+        if self.closed:
+            return False
+        message = frame.message
+        key = (message.get("device_id"), message.get("sensor_type_id")) if self.policy == "coalesce" else None
+
+        if len(self._queue) >= self.max_queue:
+            if self.policy == "disconnect":
+                self.evict(f"fila cheia ({self.max_queue})")
+                return False
+            if key is not None and key in self._pending:
+                self._pending[key][1] = frame # Mesmo lugar na fila, valor mais novo
+                self.coalesced += 1
+                return True
+            self._forget(self._queue.popleft())
+            self.dropped += 1
+
+        entry = [key, frame, time.monotonic()]
+        self._queue.append(entry)
+        if key is not None:
+            self._pending[key] = entry
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._ready.set()
+        return True
+
+    async def _write(self):
+        try:
+            while True:
+                while not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                entry = self._queue.popleft()
+                self._forget(entry)
+                # asyncio.timeout (e não wait_for): sem criar uma task por envio
+                async with asyncio.timeout(self.send_timeout):
+                    if self.encoding == "msgpack":
+                        await self.websocket.send_bytes(entry[1].binary())
+                    else:
+                        await self.websocket.send_text(entry[1].text())
+
+                lag = (time.monotonic() - entry[2]) * 1000
+                self.sent += 1
+                self.last_lag_ms = lag
+                self.max_lag_ms = max(self.max_lag_ms, lag)
+                self._total_lag_ms += lag
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.evict(f"envio travado por mais de {self.send_timeout:.0f}s")
+        except Exception as e:
+            self.evict(f"erro no envio: {e}")
+
+    def evict(self, reason: str):
+        """Remove o cliente lento/quebrado e fecha o socket em background."""
+        if self.closed:
+            return
+        self.evicted_reason = reason
+        self.stop()
+        print(f"🐢 Cliente evictado na Org {self.organization_id}: {reason}")
+        self._on_evict(self)
+        self._closer = asyncio.get_running_loop().create_task(self._close())
+
+    async def _close(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE), self.send_timeout)
+        except Exception:
+            pass # Socket já quebrado: nada a fechar
+
+    def stats(self) -> dict:
+        return {
+            "organization_id": self.organization_id,
+            "encoding": self.encoding,
+            "device_ids": sorted(self.device_ids) if self.device_ids is not None else None,
+            "sensor_type_ids": sorted(self.sensor_type_ids) if self.sensor_type_ids is not None else None,
+            "connected_seconds": round(time.monotonic() - self.connected_at, 1),
+            "queue_depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            # Lag = tempo entre o enqueue e o fim do envio
+            "last_lag_ms": round(self.last_lag_ms, 2),
+            "max_lag_ms": round(self.max_lag_ms, 2),
+            "avg_lag_ms": round(self._total_lag_ms / self.sent, 2) if self.sent else 0.0,
+        }
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+    """
+    Sockets conectados NESTE worker, por organização.
+    A publicação passa pelo backend de broadcast (app/core/broadcast.py), que
+    entrega em `deliver` de todos os workers com sockets da organização.
+
+    Roteamento: índice org -> (device, sensor) -> conexões, com None como
+    curinga em cada dimensão. Uma leitura (d, s) consulta só as chaves
+    (d, s), (d, None), (None, s) e (None, None); como as chaves de uma
+    conexão são o produto dos seus filtros, ela aparece em no máximo uma.
+    """
 
-    async def connect(self, websocket: WebSocket, organization_id: int):
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        max_queue: int = 256,
+        policy: str = "drop_oldest",
+        send_timeout: float = 10,
+        max_subscriptions: int = 1000,
+    ):
+        self.active_connections: Dict[int, List[ClientConnection]] = {}
+        self._routes: Dict[int, Dict[RouteKey, List[ClientConnection]]] = {}
+        self.backend = create_broadcast(self.deliver, backend)
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.max_subscriptions = max_subscriptions
+        self.evictions = 0
+        self._background: Set[asyncio.Task] = set()
+
+    async def start(self):
+        await self.backend.start()
+
+    async def stop(self):
+        await self.backend.stop()
+
+    async def connect(self, websocket: WebSocket, organization_id: int, encoding: str = "json"):
         await websocket.accept()
         if organization_id not in self.active_connections:
             self.active_connections[organization_id] = []
-        
-        self.active_connections[organization_id].append(websocket)
+            await self.backend.subscribe(organization_id)
+
+        connection = ClientConnection(
+            websocket, organization_id, self._evicted,
+            max_queue=self.max_queue, policy=self.policy, send_timeout=self.send_timeout, encoding=encoding,
+        )
+        connection.start()
+        self.active_connections[organization_id].append(connection)
+        self._index(connection)
         print(f"🔌 Cliente conectado na Org {organization_id}. Total nesta sala: {len(self.active_connections[organization_id])}")
 
+    def _remove(self, connection: ClientConnection) -> bool:
+        organization_id = connection.organization_id
+        connections = self.active_connections.get(organization_id)
+        if not connections or connection not in connections:
+            return False
+        connections.remove(connection)
+        self._unindex(connection)
+        if not connections:
+            del self.active_connections[organization_id]
+            task = asyncio.get_running_loop().create_task(self._release(organization_id))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        return True
+
+    def _evicted(self, connection: ClientConnection):
+        if self._remove(connection):
+            self.evictions += 1
+
     def disconnect(self, websocket: WebSocket, organization_id: int):
-        if organization_id in self.active_connections:
-            if websocket in self.active_connections[organization_id]:
-                self.active_connections[organization_id].remove(websocket)
+        for connection in self.active_connections.get(organization_id, [])[:]:
+            if connection.websocket is websocket:
+                connection.stop()
+                self._remove(connection)
                 print(f"❌ Cliente desconectado da Org {organization_id}.")
-                
-                if not self.active_connections[organization_id]:
-                    del self.active_connections[organization_id]
 
-    async def broadcast(self, message: dict, organization_id: int):
+    # -------------------------------------------------------------------------
+    # ASSINATURAS
+    # -------------------------------------------------------------------------
+    def _index(self, connection: ClientConnection):
+        routes = self._routes.setdefault(connection.organization_id, {})
+        for key in connection.route_keys():
+            routes.setdefault(key, []).append(connection)
+
+    def _unindex(self, connection: ClientConnection):
+        routes = self._routes.get(connection.organization_id, {})
+        for key in connection.route_keys():
+            subscribers = routes.get(key)
+            if subscribers and connection in subscribers:
+                subscribers.remove(connection)
+                if not subscribers:
+                    del routes[key]
+        if not routes:
+            self._routes.pop(connection.organization_id, None)
+
+    def _find(self, websocket: WebSocket, organization_id: int) -> Optional[ClientConnection]:
+        for connection in self.active_connections.get(organization_id, []):
+            if connection.websocket is websocket:
+                return connection
+        return None
+
+    def _update_filters(self, connection: ClientConnection, devices: Optional[Set[int]], sensors: Optional[Set[int]]):
+        combinations = (len(devices) if devices is not None else 1) * (len(sensors) if sensors is not None else 1)
+        if combinations > self.max_subscriptions:
+            raise ValueError(f"Assinatura com {combinations} combinações device x sensor (máx. {self.max_subscriptions}).")
+        self._unindex(connection)
+        connection.device_ids, connection.sensor_type_ids = devices, sensors
+        self._index(connection)
+
+    def subscribe(
+        self,
+        websocket: WebSocket,
+        organization_id: int,
+        device_ids: Optional[Iterable[int]] = None,
+        sensor_type_ids: Optional[Iterable[int]] = None,
+    ) -> Optional[ClientConnection]:
         """
-        Envia mensagem APENAS para conexões da organização especificada.
-        Implementa o Isolamento Vertical no nível de transporte.
+        Adiciona ids à assinatura. Uma dimensão ainda "todos" passa a ser só os
+        ids informados; uma dimensão omitida (None) não muda.
+        ValueError se a assinatura passar de `max_subscriptions` combinações.
         """
+        connection = self._find(websocket, organization_id)
+        if connection is None:
+            return None
+        devices, sensors = connection.device_ids, connection.sensor_type_ids
+        if device_ids is not None:
+            devices = (devices or set()) | set(device_ids)
+        if sensor_type_ids is not None:
+            sensors = (sensors or set()) | set(sensor_type_ids)
+        self._update_filters(connection, devices, sensors)
+        return connection
+
+    def unsubscribe(
+        self,
+        websocket: WebSocket,
+        organization_id: int,
+        device_ids: Optional[Iterable[int]] = None,
+        sensor_type_ids: Optional[Iterable[int]] = None,
+    ) -> Optional[ClientConnection]:
+        """
+        Remove ids da assinatura (dimensão em "todos" não muda).
+        Sem ids nas duas dimensões: volta a receber a organização inteira.
+        """
+        connection = self._find(websocket, organization_id)
+        if connection is None:
+            return None
+        if device_ids is None and sensor_type_ids is None:
+            self._update_filters(connection, None, None)
+            return connection
+        devices, sensors = connection.device_ids, connection.sensor_type_ids
+        if device_ids is not None and devices is not None:
+            devices = devices - set(device_ids)
+        if sensor_type_ids is not None and sensors is not None:
+            sensors = sensors - set(sensor_type_ids)
+        self._update_filters(connection, devices, sensors)
+        return connection
+
+    async def _release(self, organization_id: int):
+        # Um cliente da mesma org pode ter conectado enquanto a tarefa esperava
         if organization_id not in self.active_connections:
+            await self.backend.unsubscribe(organization_id)
+
+    async def publish(self, messages: List[dict], organization_id: int):
+        """Publica para os sockets da organização em TODOS os workers."""
+        await self.backend.publish(organization_id, messages)
+
+    async def deliver(self, organization_id: int, messages: List[dict]):
+        """Chamado pelo backend: entrega às conexões locais."""
+        for message in messages:
+            await self.broadcast(message, organization_id)
+
+    async def broadcast(self, message: dict, organization_id: int):
+        """
+        Enfileira a mensagem APENAS para conexões (locais) da organização especificada
+        que assinam o (device, sensor) da leitura.
+        Implementa o Isolamento Vertical no nível de transporte. Não espera o envio.
+        """
+        routes = self._routes.get(organization_id)
+        if not routes:
             return
+        device_id, sensor_type_id = message.get("device_id"), message.get("sensor_type_id")
+        targets: List[ClientConnection] = []
+        # dict.fromkeys: mensagem sem device/sensor repetiria a chave (None, None)
+        for key in dict.fromkeys(((device_id, sensor_type_id), (device_id, None), (None, sensor_type_id), (None, None))):
+            targets.extend(routes.get(key, ()))
+        if not targets:
+            return
+        frame = Frame(message) # Serializado uma vez, no primeiro envio de cada codificação
+        for connection in targets:
+            connection.enqueue(frame)
+
+    def send(self, websocket: WebSocket, organization_id: int, message: dict) -> bool:
+        """Enfileira para UMA conexão (respostas de assinatura), na ordem das leituras."""
+        connection = self._find(websocket, organization_id)
+        return connection is not None and connection.enqueue(Frame(message))
 
-        for connection in self.active_connections[organization_id][:]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"⚠️ Erro ao enviar WS na Org {organization_id}: {e}")
-                self.disconnect(connection, organization_id)
+    def stats(self) -> dict:
+        clients = [connection.stats() for connections in self.active_connections.values() for connection in connections]
+        return {
+            "policy": self.policy,
+            "max_queue": self.max_queue,
+            "connections": len(clients),
+            "evictions": self.evictions,
+            "max_lag_ms": max((client["max_lag_ms"] for client in clients), default=0.0),
+            "clients": clients,
+        }
 
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager(
+    max_queue=settings.WS_SEND_QUEUE_SIZE,
+    policy=settings.WS_SLOW_CONSUMER_POLICY,
+    send_timeout=settings.WS_SEND_TIMEOUT_SECONDS,
+    max_subscriptions=settings.WS_MAX_SUBSCRIPTIONS,
+)
@@ -0,0 +1,180 @@
+"""
+Consistência do organization_id desnormalizado em measurements.
+
+measurements.organization_id é carimbado na ingestão a partir do dispositivo
+autenticado. Se a organização de um Device mudar (por qualquer caminho de
+código), os listeners abaixo detectam a mudança no flush e, após o COMMIT,
+agendam a sincronização das medições e rollups daquele dispositivo.
+
+CLI (preenche linhas com organization_id NULL, ex: gravadas durante o deploy):
+    python -m app.core.tenancy backfill
+"""
+import argparse
+import asyncio
+import logging
+from typing import Set
+
+from sqlalchemy import event, func, inspect, update
+from sqlalchemy.orm import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.analytics_cache import analytics_cache
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.hot_window import hot_window
+from app.models.device import Device
+from app.models.measurement import Measurement
+from app.models.measurement_rollup import MeasurementRollup
+
+logger = logging.getLogger(__name__)
+
+_MOVED_DEVICES_KEY = "moved_devices"
+
+class OrganizationSync:
+    """
+    Corrige measurements/rollups cujo organization_id diverge do dispositivo,
+    em blocos de `batch_size` linhas (uma transação curta por bloco).
+    """
+
+    def __init__(self, session_factory=async_session_maker, batch_size: int = 10000, recheck_after_seconds: float = 60):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        # Outros workers podem carimbar a org antiga até o TTL do cache de
+        # autenticação expirar: a verificação roda de novo depois desse prazo
+        self.recheck_after = recheck_after_seconds
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def count_mismatched(self, session: AsyncSession, device_id: int) -> int:
+        """Medições do dispositivo com organization_id diferente do atual."""
+        organization_id = select(Device.organization_id).where(Device.id == device_id).scalar_subquery()
+        query = select(func.count(Measurement.id)).where(
+            Measurement.device_id == device_id,
+            Measurement.organization_id.is_distinct_from(organization_id),
+        )
+        return (await session.exec(query)).one()
+
+    async def sync_device(self, device_id: int) -> int:
+        """Alinha measurements e rollups do dispositivo com a org atual. Retorna as linhas corrigidas."""
+        fixed = 0
+        while True:
+            async with self.session_factory() as session:
+                device = await session.get(Device, device_id)
+                if device is None:
+                    return fixed
+                stale = (
+                    select(Measurement.id)
+                    .where(
+                        Measurement.device_id == device_id,
+                        Measurement.organization_id.is_distinct_from(device.organization_id),
+                    )
+                    .limit(self.batch_size)
+                )
+                result = await session.exec(
+                    update(Measurement)
+                    .where(Measurement.id.in_(stale.scalar_subquery()))
+                    .values(organization_id=device.organization_id)
+                    .execution_options(synchronize_session=False)
+                )
+                if (result.rowcount or 0) < self.batch_size:
+                    await session.exec(
+                        update(MeasurementRollup)
+                        .where(
+                            MeasurementRollup.device_id == device_id,
+                            MeasurementRollup.organization_id.is_distinct_from(device.organization_id),
+                        )
+                        .values(organization_id=device.organization_id)
+                        .execution_options(synchronize_session=False)
+                    )
+                await session.commit()
+
+            fixed += result.rowcount or 0
+            if (result.rowcount or 0) < self.batch_size:
+                return fixed
+            await asyncio.sleep(0)
+
+    async def _sync_and_recheck(self, device_id: int):
+        try:
+            fixed = await self.sync_device(device_id)
+            hot_window.invalidate() # Séries da janela quente são indexadas pela org
+            analytics_cache.clear() # Histórico saiu de uma org e entrou em outra
+            await asyncio.sleep(self.recheck_after)
+            fixed += await self.sync_device(device_id)
+            hot_window.invalidate()
+            analytics_cache.clear()
+            logger.info(f"🏢 Device {device_id} mudou de organização: {fixed} medições realinhadas.")
+        except Exception as e:
+            logger.error(f"❌ Sincronização de organização do device {device_id} falhou: {e}")
+
+    def schedule(self, device_id: int):
+        try:
+            task = asyncio.get_running_loop().create_task(
+                self._sync_and_recheck(device_id), name=f"organization-sync-{device_id}"
+            )
+        except RuntimeError:
+            logger.warning(f"⚠️ Device {device_id} mudou de organização fora de um event loop: rode a sincronização manualmente.")
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def wait(self):
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await self.wait()
+
+    async def backfill(self) -> int:
+        """Preenche organization_id NULL a partir de devices, por faixas de id."""
+        async with self.session_factory() as session:
+            low, high = (await session.exec(select(func.min(Measurement.id), func.max(Measurement.id)))).one()
+        if low is None:
+            return 0
+
+        filled = 0
+        organization_id = select(Device.organization_id).where(Device.id == Measurement.device_id).scalar_subquery()
+        for start in range(low - 1, high, self.batch_size):
+            async with self.session_factory() as session:
+                result = await session.exec(
+                    update(Measurement)
+                    .where(
+                        Measurement.id > start,
+                        Measurement.id <= start + self.batch_size,
+                        Measurement.organization_id.is_(None),
+                    )
+                    .values(organization_id=organization_id)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+            filled += result.rowcount or 0
+        return filled
+
+organization_sync = OrganizationSync(recheck_after_seconds=settings.DEVICE_AUTH_CACHE_TTL_SECONDS)
+
+# -----------------------------------------------------------------------------
+# DETECÇÃO (eventos do ORM)
+# -----------------------------------------------------------------------------
+@event.listens_for(Session, "after_flush")
+def _track_organization_changes(session, flush_context):
+    for obj in session.dirty:
+        if isinstance(obj, Device) and inspect(obj).attrs.organization_id.history.has_changes():
+            session.info.setdefault(_MOVED_DEVICES_KEY, set()).add(obj.id)
+
+@event.listens_for(Session, "after_commit")
+def _sync_moved_devices(session):
+    for device_id in session.info.pop(_MOVED_DEVICES_KEY, ()):
+        organization_sync.schedule(device_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_moved_devices(session):
+    session.info.pop(_MOVED_DEVICES_KEY, None)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consistência de measurements.organization_id")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backfill")
+    parser.parse_args()
+
+    filled = asyncio.run(organization_sync.backfill())
+    print(f"✅ {filled} medições preenchidas com organization_id.")
@@ -1,6 +1,8 @@
 import streamlit as st
 import requests
 import pytz
+import pandas as pd
+import pyarrow as pa
 from datetime import datetime
 
 # --- CONSTANTES ---
@@ -8,6 +10,7 @@ from datetime import datetime
 API_URL = "http://backend:8000/api/v1"
 WS_URL = "ws://backend:8000/api/v1/measurements/ws"
 FUSO_BR = pytz.timezone("America/Sao_Paulo")
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
 
 # --- FUNÇÕES ÚTEIS ---
 def converter_para_local(iso_str):
@@ -16,6 +19,21 @@ def converter_para_local(iso_str):
     dt_utc = datetime.fromisoformat(iso_str).replace(tzinfo=pytz.UTC)
     return dt_utc.astimezone(FUSO_BR)
 
+def converter_serie_para_local(serie: pd.Series) -> pd.Series:
+    """Versão vetorizada: coluna inteira UTC (naive, aware ou texto ISO) -> Local (SP)"""
+    return pd.to_datetime(serie, utc=True).dt.tz_convert(FUSO_BR)
+
+def ler_dataframe(response) -> pd.DataFrame:
+    """
+    Corpo da resposta -> DataFrame.
+    Arrow IPC (pedido com Accept: ARROW_STREAM): colunas numéricas viram arrays
+    NumPy sem cópia; sem montar dicts linha a linha. JSON continua aceito.
+    """
+    if response.headers.get("content-type", "").startswith(ARROW_STREAM):
+        table = pa.ipc.open_stream(response.content).read_all()
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+    return pd.DataFrame(response.json())
+
 def carregar_mapa_sensores():
     """
     Retorna dicionário rico: {id: {'name': 'Temperatura', 'unit': '°C'}}
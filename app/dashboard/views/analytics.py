@@ -3,7 +3,7 @@ import requests
 import pandas as pd
 import altair as alt
 import math
-from app.dashboard.utils import API_URL, carregar_mapa_sensores, converter_para_local
+from app.dashboard.utils import API_URL, ARROW_STREAM, carregar_mapa_sensores, converter_serie_para_local, ler_dataframe
 
 def render_analytics_view():
     st.title("📊 Análise Inteligente de Dados")
@@ -24,12 +24,15 @@ def render_analytics_view():
             )
         with c2:
             # Seleção inteligente do bucket padrão
-            default_idx = 0 if periodo == '1h' else 1 if periodo == '1d' else 2
+            default_idx = 0 if periodo == '1h' else 3 if periodo == '1d' else 5
             bucket = st.selectbox(
                 "Agrupamento (Resolução)", 
-                ["minute", "hour", "day"], 
+                ["minute", "5m", "15m", "hour", "6h", "day"], 
                 index=default_idx, 
-                format_func=lambda x: {"minute":"Minuto a Minuto", "hour":"Hora em Hora", "day":"Diário"}[x]
+                format_func=lambda x: {
+                    "minute":"Minuto a Minuto", "5m":"5 Minutos", "15m":"15 Minutos",
+                    "hour":"Hora em Hora", "6h":"6 Horas", "day":"Diário",
+                }[x]
             )
         with c3:
             st.write(""); st.write("") # Espaçamento para alinhar o botão
@@ -50,7 +53,7 @@ def render_analytics_view():
                 res = requests.get(
                     f"{API_URL}/measurements/analytics/", 
                     params=params, 
-                    headers=headers # <--- Autenticação
+                    headers={**headers, "Accept": ARROW_STREAM} # <--- Autenticação + formato colunar
                 )
             
             # Tratamento de Erros de Autenticação
@@ -59,31 +62,26 @@ def render_analytics_view():
                 return
 
             if res.status_code == 200:
-                data = res.json()
-                if not data:
+                data = ler_dataframe(res)
+                if data.empty:
                     st.warning("📭 Nenhum dado encontrado para este período.")
                     return
 
-                # Processa JSON para DataFrame
-                rows = []
-                for item in data:
-                    s_id = item['sensor_type_id']
+                # Monta o DataFrame por colunas (vetorizado, sem loop por linha)
+                nomes = {s_id: info['name'] for s_id, info in sensor_map.items()}
+                unidades = {s_id: info['unit'] for s_id, info in sensor_map.items()}
+                sensor_ids = data['sensor_type_id']
+
+                df = pd.DataFrame({
+                    "Data": converter_serie_para_local(data['bucket']),
                     # Usa o mapa para pegar nome amigável ou fallback para o ID
-                    info = sensor_map.get(s_id, {'name': f"Sensor {s_id}", 'unit': ''})
-                    
-                    dt_local = converter_para_local(item['bucket'])
-                    
-                    rows.append({
-                        "Data": dt_local,
-                        "Sensor": info['name'],
-                        "Unidade": info['unit'],
-                        "Média": item['avg_value'],
-                        "Mínima": item['min_value'],
-                        "Máxima": item['max_value'],
-                        "Amostras": item['count']
-                    })
-                
-                df = pd.DataFrame(rows)
+                    "Sensor": sensor_ids.map(nomes).fillna("Sensor " + sensor_ids.astype(str)),
+                    "Unidade": sensor_ids.map(unidades).fillna(""),
+                    "Média": data['avg_value'],
+                    "Mínima": data['min_value'],
+                    "Máxima": data['max_value'],
+                    "Amostras": data['count']
+                })
                 
                 # --- RENDERIZAÇÃO EM CARDS ---
                 st.divider()
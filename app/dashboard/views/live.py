@@ -92,15 +92,26 @@ async def run_live_dashboard(main_placeholder, location_filter):
         main_placeholder.warning("Nenhum dispositivo encontrado ou erro de conexão.")
         return
 
-    # Inicializa Estado do Grid se não existir
-    if "live_grid" not in st.session_state:
+    # Inicializa Estado do Grid (e zera ao trocar de filtro: só chegam devices assinados)
+    if "live_grid" not in st.session_state or st.session_state.get("live_filter") != location_filter:
         st.session_state.live_grid = {}
+        st.session_state.live_filter = location_filter
 
     try:
         async with websockets.connect(WS_URL) as websocket:
+            # Filtro no servidor: só as leituras da localização escolhida trafegam
+            if location_filter != "Todas":
+                await websocket.send(json.dumps({"action": "subscribe", "locations": [location_filter]}))
+
             while True:
                 msg = await websocket.recv()
                 data = json.loads(msg)
+
+                # Respostas de assinatura/erro não são leituras
+                if "type" in data:
+                    if data["type"] == "error":
+                        main_placeholder.error(f"Assinatura rejeitada: {data['detail']}")
+                    continue
                 
                 dev_id = data['device_id']
                 sens_id = data['sensor_type_id']
@@ -135,13 +146,7 @@ async def run_live_dashboard(main_placeholder, location_filter):
                 st.session_state.live_grid[dev_id]['last_seen'] = dt
 
                 # --- RENDERIZAÇÃO ---
-                devices_to_show = []
-                for d_id, d_info in device_map.items():
-                    # Filtro de Localização
-                    if location_filter != "Todas" and d_info.get('location') != location_filter:
-                        continue
-                    if d_id in st.session_state.live_grid:
-                        devices_to_show.append(d_id)
+                devices_to_show = [d_id for d_id in device_map if d_id in st.session_state.live_grid]
 
                 with main_placeholder.container():
                     if not devices_to_show:
@@ -7,6 +7,18 @@ from sqlalchemy.orm import sessionmaker
 from sqlmodel.ext.asyncio.session import AsyncSession
 from app.core.database import init_db, engine
 from app.core.seed import create_initial_data
+from app.core.config import settings
+from app.core.ingest_buffer import ingest_buffer
+from app.core.recalibration import recalibration_runner
+from app.core.partitions import partition_manager
+from app.core.rollups import rollup_worker
+from app.core.retention import retention_worker
+from app.core.archive import archiver
+from app.core.hot_window import hot_window
+from app.core.socket import manager
+from app.core.events import event_bus
+from app.core.tenancy import organization_sync # Registra os listeners de mudança de org
+from app.core.pagination import CURSOR_HEADER
 
 # --- IMPORTS DE MODELOS ---
 from app.models.device import Device
@@ -14,6 +26,7 @@ from app.models.sensor_type import SensorType
 from app.models.measurement import Measurement
 from app.models.device_sensor import DeviceSensorLink
 from app.models.device_token import DeviceToken
+from app.models.measurement_rollup import MeasurementRollup, RollupWatermark
 
 # --- IMPORT DO MIDDLEWARE ---
 from app.core.middleware import DeviceAuthMiddleware     
@@ -29,8 +42,42 @@ async def lifespan(app: FastAPI):
         await create_initial_data(session)
         print("✅ Seed executado com sucesso.")
 
+    # Assinantes pós-COMMIT (realtime, janela quente, cache) em tasks próprias
+    await event_bus.start()
+
+    # Write-Behind: flusher de group commit em background
+    if settings.INGEST_BUFFER_ENABLED:
+        await ingest_buffer.start()
+
+    # Partições futuras de measurements + retenção por DROP de partição
+    await partition_manager.start()
+    # Rollups incrementais (minuto/hora/dia) do analytics
+    await rollup_worker.start()
+    # Retenção por organização (downsampling -> remoção em blocos)
+    await retention_worker.start()
+    # Arquivo frio: partições antigas -> Parquet (no-op sem ARCHIVE_PATH/ARCHIVE_AFTER_DAYS)
+    await archiver.start()
+    # Realtime: LISTEN do backend de broadcast (no-op no backend "memory")
+    await manager.start()
+    # Janela quente do analytics (aquece do banco em background)
+    if settings.HOT_WINDOW_ENABLED:
+        await hot_window.start()
+
     yield # A aplicação roda aqui
     
+    # Drena o buffer antes de encerrar (nenhuma leitura aceita é perdida)
+    await ingest_buffer.stop()
+    # Entrega aos assinantes o que o último flush publicou
+    await event_bus.stop()
+    # Re-calibrações em andamento são canceladas (blocos já gravados permanecem)
+    await recalibration_runner.shutdown()
+    await partition_manager.stop()
+    await rollup_worker.stop()
+    await retention_worker.stop()
+    await archiver.stop()
+    await hot_window.stop()
+    await manager.stop()
+    await organization_sync.shutdown()
     print("🛑 Encerrando aplicação.")
 
 # --- APP SETUP ---
@@ -55,6 +102,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],   # Permite GET, POST, PUT, DELETE, etc.
     allow_headers=["*"],   # Permite Authorization, Content-Type, etc.
+    expose_headers=[CURSOR_HEADER], # Paginação por cursor legível pelo browser
 )
 
 @app.get("/")
@@ -11,4 +11,6 @@ class DeviceSensorLink(SQLModel, table=True):
         default=None, foreign_key="sensor_types.id", primary_key=True
     )
     
-    calibration_formula: Optional[str] = Field(default=None)
\ No newline at end of file
+    calibration_formula: Optional[str] = Field(default=None)
+    # Incrementada a cada troca de fórmula (re-calibração do histórico usa como referência)
+    calibration_version: int = Field(default=1)
\ No newline at end of file
@@ -1,3 +1,4 @@
+from sqlalchemy import Index, text
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, TYPE_CHECKING
 from datetime import datetime
@@ -9,14 +10,28 @@ if TYPE_CHECKING:
 
 class Measurement(SQLModel, table=True):
     __tablename__ = "measurements"
+    # No PostgreSQL a tabela é particionada por RANGE(created_at) (migração
+    # 9a1f3c6d2e47, PK física (id, created_at)); o id continua único pela sequência.
+    __table_args__ = (
+        # Espelha a migração 513e5f6b5fb7 (criados CONCURRENTLY em produção)
+        Index("ix_measurements_device_sensor_created_at", "device_id", "sensor_type_id", text("created_at DESC")),
+        Index("ix_measurements_created_at_brin", "created_at", postgresql_using="brin"),
+        # Isolamento de tenant sem JOIN em devices (migração 7c2b9e14f0a3)
+        Index("ix_measurements_org_created_at", "organization_id", "created_at"),
+        Index("ix_measurements_org_device_created_at", "organization_id", "device_id", "created_at"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     
     # Foreign Keys (Banco de Dados)
     device_id: int = Field(foreign_key="devices.id")
     sensor_type_id: int = Field(foreign_key="sensor_types.id")
+    # Cópia de devices.organization_id carimbada na ingestão (sem FK: o ALTER
+    # validaria a tabela inteira). Mantida em sincronia por app.core.tenancy.
+    organization_id: Optional[int] = Field(default=None)
     
-    value: float 
+    value: float # Valor calibrado (o que os dashboards exibem)
+    raw_value: Optional[float] = Field(default=None) # Valor bruto enviado pelo dispositivo (None em dados legados)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     device: "Device" = Relationship(back_populates="measurements")
@@ -0,0 +1,47 @@
+from sqlalchemy import BigInteger, Index
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+
+class MeasurementRollup(SQLModel, table=True):
+    """
+    Agregados pré-calculados de measurements por dispositivo/sensor/bucket.
+    Guardam soma e contagem (não a média), então buckets parciais e
+    resoluções diferentes podem ser combinados sem perder precisão.
+    """
+    __tablename__ = "measurement_rollups"
+    __table_args__ = (
+        Index("ix_measurement_rollups_org_resolution_bucket", "organization_id", "resolution", "bucket"),
+        # Analytics filtrado por dispositivo (gráfico de um único equipamento)
+        Index("ix_measurement_rollups_org_resolution_device_bucket", "organization_id", "resolution", "device_id", "bucket"),
+    )
+
+    resolution: str = Field(primary_key=True, max_length=10) # minute | hour | day
+    device_id: int = Field(primary_key=True, foreign_key="devices.id")
+    sensor_type_id: int = Field(primary_key=True, foreign_key="sensor_types.id")
+    bucket: datetime = Field(primary_key=True) # Início do bucket (UTC)
+
+    organization_id: Optional[int] = Field(default=None, foreign_key="organization.id")
+
+    sum_value: float = 0.0
+    count: int = 0
+    min_value: float
+    max_value: float
+
+class RollupWatermark(SQLModel, table=True):
+    """
+    Progresso do job de rollup. Linhas com id <= last_id já estão agregadas.
+    pending_id/pending_at: maior id visto na rodada anterior; só é agregado
+    depois de `ROLLUP_LAG_SECONDS` (transações em voo com ids menores terminam antes).
+    pending_xmax (PostgreSQL): xmax do snapshot em que pending_id foi lido. O
+    candidato só vale quando nenhuma transação anterior a ele segue aberta
+    (COPY/lote longo com ids menores ainda sem COMMIT), além do lag.
+    """
+    __tablename__ = "rollup_watermarks"
+
+    name: str = Field(primary_key=True, max_length=50)
+    last_id: int = 0
+    pending_id: int = 0
+    pending_at: Optional[datetime] = None
+    pending_xmax: Optional[int] = Field(default=None, sa_type=BigInteger)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
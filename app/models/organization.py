@@ -14,6 +14,13 @@ class Organization(OrganizationBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     slug: str = Field(index=True, unique=True) # Ex: 'escola-infantil-01' para URLs amigáveis
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    # Política de retenção (dias; None = para sempre). Dados brutos só são
+    # apagados depois de agregados nos rollups (downsampling).
+    raw_retention_days: Optional[int] = None
+    minute_rollup_retention_days: Optional[int] = None
+    hour_rollup_retention_days: Optional[int] = None
+    day_rollup_retention_days: Optional[int] = None
     
     users: List["User"] = Relationship(back_populates="organization")
     devices: List["Device"] = Relationship(back_populates="organization")
\ No newline at end of file
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
 class MeasurementPayload(BaseModel):
     sensor_type_id: int
@@ -11,13 +11,37 @@ class MeasurementCreate(MeasurementPayload):
     device_id: int
 
 class MeasurementPublic(MeasurementCreate):
-    id: int
+    id: Optional[int] = None # None quando aceita em Write-Behind com ack-on-enqueue
+    raw_value: Optional[float] = None
     created_at: datetime
 
+class MeasurementBatchPayload(BaseModel):
+    """Lote de leituras de UM dispositivo (sensores misturados, timestamps por leitura)."""
+    readings: List[MeasurementPayload]
+
+class MeasurementBatchItemStatus(BaseModel):
+    index: int # Posição da leitura no lote enviado
+    accepted: bool
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+class MeasurementBatchResult(BaseModel):
+    accepted: int
+    rejected: int
+    items: List[MeasurementBatchItemStatus]
+
 class MeasurementAnalytics(BaseModel):
     bucket: datetime
     sensor_type_id: int
     avg_value: float
     min_value: float
     max_value: float
-    count: int
\ No newline at end of file
+    count: int
+    device_id: Optional[int] = None # Só com group_by=device
+
+class RealtimeSubscription(BaseModel):
+    """Mensagem do cliente no /measurements/ws. Listas omitidas não mudam a assinatura."""
+    action: Literal["subscribe", "unsubscribe"]
+    device_ids: Optional[List[int]] = None
+    sensor_type_ids: Optional[List[int]] = None
+    locations: Optional[List[str]] = None # Resolvidas para os devices da org no momento da mensagem
@@ -1,5 +1,5 @@
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 # Propriedades compartilhadas
@@ -8,6 +8,12 @@ class OrganizationBase(BaseModel):
     description: Optional[str] = None
     slug: str # Obrigatório para URL única
 
+    # Retenção em dias (None = para sempre). Ex: brutos 30, hora 365, dia None
+    raw_retention_days: Optional[int] = Field(default=None, ge=1)
+    minute_rollup_retention_days: Optional[int] = Field(default=None, ge=1)
+    hour_rollup_retention_days: Optional[int] = Field(default=None, ge=1)
+    day_rollup_retention_days: Optional[int] = Field(default=None, ge=1)
+
 # Propriedades para criação
 class OrganizationCreate(OrganizationBase):
     pass
@@ -17,6 +23,10 @@ class OrganizationUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
     slug: Optional[str] = None
+    raw_retention_days: Optional[int] = Field(default=None, ge=1)
+    minute_rollup_retention_days: Optional[int] = Field(default=None, ge=1)
+    hour_rollup_retention_days: Optional[int] = Field(default=None, ge=1)
+    day_rollup_retention_days: Optional[int] = Field(default=None, ge=1)
 
 # Propriedades para leitura (API Response)
 class OrganizationRead(OrganizationBase):
@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class RecalibrationRequest(BaseModel):
+    # Intervalo opcional: sem limites = todo o histórico do sensor
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+class RecalibrationJobPublic(BaseModel):
+    id: str
+    device_id: int
+    sensor_type_id: int
+    formula: Optional[str] = None
+    calibration_version: int
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    status: str
+    total_rows: Optional[int] = None
+    processed_rows: int
+    progress: float
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
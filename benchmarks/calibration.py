@@ -0,0 +1,37 @@
+"""
+Calibração escalar (safe_eval por leitura) vs vetorizada (calibrate_array).
+
+Uso:
+    python -m benchmarks.calibration --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.core.calibration import calibrate_array, safe_eval
+
+FORMULA = "round(sqrt(x) * 0.5 + log(x + 1), 2)"
+
+def main(num_rows: int):
+    values = np.random.uniform(0, 100, num_rows)
+
+    started = time.perf_counter()
+    calibrate_array(FORMULA, values)
+    vectorized = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for value in values.tolist():
+        safe_eval(FORMULA, value)
+    scalar = time.perf_counter() - started
+
+    print(f"Fórmula: {FORMULA} | {num_rows:,} leituras")
+    print(f"Escalar (safe_eval):        {scalar * 1000:>10.1f} ms")
+    print(f"Vetorizada (calibrate_array): {vectorized * 1000:>8.1f} ms ({scalar / vectorized:,.0f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de calibração")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    main(args.rows)
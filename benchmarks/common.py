@@ -0,0 +1,72 @@
+"""
+Utilitários compartilhados pelos benchmarks (dispositivos sintéticos, geração de linhas).
+Os scripts rodam contra o banco configurado no .env (PostgreSQL real).
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.seed import create_initial_data
+from app.models.device import Device
+from app.models.device_sensor import DeviceSensorLink
+from app.models.organization import Organization
+from app.models.sensor_type import SensorType
+
+BENCH_SLUG_PREFIX = "bench-device-"
+
+async def ensure_bench_devices(session: AsyncSession, num_devices: int) -> List[Tuple[int, List[int], int]]:
+    """
+    Garante `num_devices` dispositivos sintéticos (slug bench-device-N) vinculados
+    a todos os tipos de sensor. Retorna [(device_id, [sensor_type_id, ...], organization_id), ...].
+    """
+    await create_initial_data(session)
+
+    org = (await session.exec(select(Organization).where(Organization.slug == "iot-lab-main"))).first()
+    sensor_ids = [s.id for s in (await session.exec(select(SensorType))).all()]
+
+    existing = (await session.exec(
+        select(Device).where(Device.slug.startswith(BENCH_SLUG_PREFIX))
+    )).all()
+    by_slug: Dict[str, Device] = {d.slug: d for d in existing}
+
+    devices = []
+    for n in range(num_devices):
+        slug = f"{BENCH_SLUG_PREFIX}{n}"
+        device = by_slug.get(slug)
+        if not device:
+            device = Device(name=f"Bench {n}", slug=slug, organization_id=org.id)
+            session.add(device)
+            await session.flush()
+            for s_id in sensor_ids:
+                session.add(DeviceSensorLink(device_id=device.id, sensor_type_id=s_id))
+        devices.append((device.id, sensor_ids, org.id))
+
+    await session.commit()
+    return devices
+
+def synthetic_rows(
+    devices: List[Tuple[int, List[int], int]],
+    total_rows: int,
+    days: int,
+    end: datetime = None,
+) -> Iterator[dict]:
+    """Gera `total_rows` leituras espalhadas uniformemente nos últimos `days` dias."""
+    end = end or datetime.utcnow()
+    start = end - timedelta(days=days)
+    step = (end - start) / max(total_rows, 1)
+    pairs = [(d_id, s_id, org_id) for d_id, sensors, org_id in devices for s_id in sensors]
+
+    for i in range(total_rows):
+        device_id, sensor_type_id, organization_id = pairs[i % len(pairs)]
+        value = round(random.gauss(25.0, 5.0), 2)
+        yield {
+            "device_id": device_id,
+            "sensor_type_id": sensor_type_id,
+            "organization_id": organization_id,
+            "value": value,
+            "raw_value": value,
+            "created_at": start + step * i,
+        }
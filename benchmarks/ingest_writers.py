@@ -0,0 +1,67 @@
+"""
+Compara os caminhos de escrita de medições no PostgreSQL:
+  1. ORM linha a linha (session.add + commit por leitura, como o POST /measurements/)
+  2. INSERT multi-linha com RETURNING (insert_measurements)
+  3. COPY binário do asyncpg (copy_measurements)
+
+Uso:
+    python -m benchmarks.ingest_writers --rows 20000
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import delete
+
+from app.core.database import async_session_maker
+from app.core.ingestion import copy_measurements, insert_measurements
+from app.models.measurement import Measurement
+from benchmarks.common import ensure_bench_devices, synthetic_rows
+
+async def orm_row_by_row(rows):
+    async with async_session_maker() as session:
+        for row in rows:
+            session.add(Measurement(**row))
+            await session.commit()
+
+async def multi_row_insert(rows):
+    async with async_session_maker() as session:
+        await insert_measurements(session, rows)
+        await session.commit()
+
+async def binary_copy(rows):
+    async with async_session_maker() as session:
+        await copy_measurements(session, rows)
+        await session.commit()
+
+async def cleanup(device_ids):
+    async with async_session_maker() as session:
+        await session.exec(delete(Measurement).where(Measurement.device_id.in_(device_ids)))
+        await session.commit()
+
+async def main(num_rows: int):
+    async with async_session_maker() as session:
+        devices = await ensure_bench_devices(session, 10)
+    device_ids = [d_id for d_id, _, _ in devices]
+    rows = list(synthetic_rows(devices, num_rows, days=1))
+
+    print(f"{'Estratégia':<28}{'Tempo (s)':>12}{'Linhas/s':>14}")
+    for name, writer in [
+        ("ORM linha a linha", orm_row_by_row),
+        ("INSERT multi-linha", multi_row_insert),
+        ("COPY binário (asyncpg)", binary_copy),
+    ]:
+        await cleanup(device_ids)
+        started = time.perf_counter()
+        await writer(rows)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<28}{elapsed:>12.3f}{num_rows / elapsed:>14,.0f}")
+
+    await cleanup(device_ids)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dos caminhos de escrita")
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.rows))
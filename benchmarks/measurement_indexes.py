@@ -0,0 +1,135 @@
+"""
+Planos e latências das consultas de medições antes/depois dos índices da
+migração 513e5f6b5fb7 (b-tree composto + BRIN em created_at).
+
+Roteiro sugerido (50M linhas, ~10 min de seed):
+    python -m benchmarks.seed_measurements --rows 50000000 --devices 200 --days 90
+    python -m benchmarks.measurement_indexes --runs 5
+
+O script remove os índices, mede as consultas, recria os índices
+CONCURRENTLY (como a migração), roda ANALYZE e mede de novo.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from app.core.database import engine
+
+INDEX_DDL = {
+    "ix_measurements_device_sensor_created_at": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_measurements_device_sensor_created_at "
+        "ON measurements (device_id, sensor_type_id, created_at DESC)"
+    ),
+    "ix_measurements_created_at_brin": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_measurements_created_at_brin "
+        "ON measurements USING brin (created_at)"
+    ),
+}
+
+# Mesmo formato das consultas emitidas por read_measurements / get_analytics
+QUERIES = {
+    "historico_dispositivo": """
+        SELECT m.* FROM measurements m JOIN devices d ON m.device_id = d.id
+        WHERE d.organization_id = :org_id AND m.device_id = :device_id
+          AND m.sensor_type_id = :sensor_id
+        ORDER BY m.created_at DESC LIMIT 100
+    """,
+    "historico_intervalo": """
+        SELECT m.* FROM measurements m JOIN devices d ON m.device_id = d.id
+        WHERE d.organization_id = :org_id AND m.device_id = :device_id
+          AND m.created_at >= :start AND m.created_at <= :end
+        ORDER BY m.created_at DESC LIMIT 100
+    """,
+    "analytics_1d_hora": """
+        SELECT date_trunc('hour', m.created_at) AS bucket, m.sensor_type_id,
+               avg(m.value), min(m.value), max(m.value), count(m.id)
+        FROM measurements m JOIN devices d ON m.device_id = d.id
+        WHERE d.organization_id = :org_id AND m.created_at >= :start
+        GROUP BY bucket, m.sensor_type_id ORDER BY bucket
+    """,
+}
+
+async def query_params(conn) -> dict:
+    row = (await conn.execute(text(
+        "SELECT m.device_id, m.sensor_type_id, d.organization_id, max(m.created_at) "
+        "FROM measurements m JOIN devices d ON m.device_id = d.id "
+        "WHERE m.id = (SELECT max(id) FROM measurements) "
+        "GROUP BY m.device_id, m.sensor_type_id, d.organization_id"
+    ))).one()
+    newest = row[3]
+    return {
+        "device_id": row[0],
+        "sensor_id": row[1],
+        "org_id": row[2],
+        "start": newest - timedelta(days=1),
+        "end": newest,
+    }
+
+async def measure(conn, params: dict, runs: int) -> dict:
+    report = {}
+    for name, sql in QUERIES.items():
+        bound = {k: v for k, v in params.items() if f":{k}" in sql}
+        plan = (await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), bound)).scalar()
+        plan = plan if isinstance(plan, list) else json.loads(plan)
+
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            (await conn.execute(text(sql), bound)).all()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        report[name] = {
+            "node": plan[0]["Plan"]["Node Type"],
+            "plan_ms": plan[0]["Execution Time"],
+            "median_ms": statistics.median(timings),
+        }
+    return report
+
+def print_report(title: str, report: dict):
+    print(f"\n{title}")
+    print(f"{'Consulta':<24}{'Nó raiz do plano':<22}{'EXPLAIN (ms)':>14}{'Mediana (ms)':>14}")
+    for name, row in report.items():
+        print(f"{name:<24}{row['node']:<22}{row['plan_ms']:>14.2f}{row['median_ms']:>14.2f}")
+
+async def main(runs: int):
+    # CREATE/DROP INDEX CONCURRENTLY exigem autocommit
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        total = (await conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'measurements'"))).scalar()
+        print(f"measurements: ~{total:,} linhas (estimativa do planner)")
+
+        params = await query_params(conn)
+
+        for index_name in INDEX_DDL:
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+        await conn.execute(text("ANALYZE measurements"))
+        before = await measure(conn, params, runs)
+        print_report("SEM índices", before)
+
+        for index_name, ddl in INDEX_DDL.items():
+            started = time.perf_counter()
+            await conn.execute(text(ddl))
+            size = (await conn.execute(text(f"SELECT pg_size_pretty(pg_relation_size('{index_name}'))"))).scalar()
+            print(f"🔨 {index_name}: {time.perf_counter() - started:.1f}s, {size}")
+        await conn.execute(text("ANALYZE measurements"))
+
+        after = await measure(conn, params, runs)
+        print_report("COM índices", after)
+
+        print(f"\n{'Consulta':<24}{'Ganho':>10}")
+        for name in QUERIES:
+            print(f"{name:<24}{before[name]['median_ms'] / after[name]['median_ms']:>9.1f}x")
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dos índices de measurements")
+    parser.add_argument("--runs", type=int, default=5, help="Execuções por consulta (mediana)")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.runs))
@@ -0,0 +1,51 @@
+"""
+Popula o banco com medições sintéticas via COPY binário (asyncpg).
+
+Uso:
+    python -m benchmarks.seed_measurements --rows 50000000 --devices 200 --days 90
+"""
+import argparse
+import asyncio
+import logging
+import time
+from itertools import islice
+
+from app.core.database import async_session_maker
+from app.core.ingestion import copy_measurements, publish_copied
+from benchmarks.common import ensure_bench_devices, synthetic_rows
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S")
+logger = logging.getLogger("SeedBenchmark")
+
+async def seed(rows: int, num_devices: int, days: int, commit_every: int):
+    async with async_session_maker() as session:
+        devices = await ensure_bench_devices(session, num_devices)
+
+    generator = synthetic_rows(devices, rows, days)
+    written = 0
+    started = time.perf_counter()
+
+    # Uma transação por bloco: COPY gigante numa só transação segura WAL e locks
+    while written < rows:
+        block = islice(generator, commit_every)
+        async with async_session_maker() as session:
+            count = await copy_measurements(session, block)
+            await session.commit()
+            await publish_copied(session)
+        if not count:
+            break
+        written += count
+        elapsed = time.perf_counter() - started
+        logger.info(f"📥 {written:,}/{rows:,} linhas ({written / elapsed:,.0f} linhas/s)")
+
+    logger.info(f"✅ Seed concluído: {written:,} linhas em {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed de medições sintéticas via COPY")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--commit-every", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    asyncio.run(seed(args.rows, args.devices, args.days, args.commit_every))
@@ -0,0 +1,97 @@
+"""
+Fan-out do realtime: serializar por socket vs Frame compartilhado.
+
+Sockets falsos (sem rede): mede só o custo de serialização + enfileiramento
+do ConnectionManager para N dashboards da mesma organização.
+
+Uso:
+    python -m benchmarks.websocket_fanout --sockets 1000 --messages 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from app.core.frames import Frame, orjson
+from app.core.socket import ConnectionManager
+
+class FakeSocket:
+    def __init__(self, done: "Counter"):
+        self.done = done
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.done.hit()
+
+    async def send_bytes(self, data):
+        self.done.hit()
+
+class Counter:
+    """Sinaliza quando todos os envios esperados terminaram."""
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.count = 0
+        self.finished = asyncio.Event()
+
+    def hit(self):
+        self.count += 1
+        if self.count >= self.expected:
+            self.finished.set()
+
+def reading(i: int) -> dict:
+    return {
+        "id": i,
+        "device_id": i % 50,
+        "sensor_type_id": 1,
+        "value": 20.0 + i % 10,
+        "raw_value": 20.0 + i % 10,
+        "created_at": "2026-03-01T10:00:00.000000",
+    }
+
+async def fan_out(num_sockets: int, num_messages: int, encoding: str, per_socket: bool) -> float:
+    manager = ConnectionManager(backend="memory", max_queue=num_messages + 1)
+    done = Counter(num_sockets * num_messages)
+    sockets = [FakeSocket(done) for _ in range(num_sockets)]
+    with contextlib.redirect_stdout(io.StringIO()): # Silencia os logs de conexão
+        for socket in sockets:
+            await manager.connect(socket, 1, encoding=encoding)
+
+    started = time.perf_counter()
+    for i in range(num_messages):
+        message = reading(i)
+        if per_socket:
+            # Comportamento antigo: um Frame (serialização) por socket
+            for connection in manager.active_connections[1]:
+                connection.enqueue(Frame(message))
+        else:
+            await manager.broadcast(message, 1)
+    await done.finished.wait()
+    elapsed = time.perf_counter() - started
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for socket in sockets:
+            manager.disconnect(socket, 1)
+    return elapsed
+
+async def main(num_sockets: int, num_messages: int):
+    per_socket = await fan_out(num_sockets, num_messages, "json", per_socket=True)
+    shared_json = await fan_out(num_sockets, num_messages, "json", per_socket=False)
+    shared_msgpack = await fan_out(num_sockets, num_messages, "msgpack", per_socket=False)
+
+    total = num_sockets * num_messages
+    print(f"{num_sockets:,} sockets x {num_messages:,} mensagens = {total:,} envios | orjson: {'sim' if orjson else 'não'}")
+    print(f"Serialização por socket:    {per_socket * 1000:>10.1f} ms ({per_socket / total * 1e6:.2f} µs/envio)")
+    print(f"Frame compartilhado (json): {shared_json * 1000:>10.1f} ms ({shared_json / total * 1e6:.2f} µs/envio)")
+    print(f"Frame compartilhado (msgpack): {shared_msgpack * 1000:>7.1f} ms ({shared_msgpack / total * 1e6:.2f} µs/envio)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de fan-out do WebSocket")
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.sockets, args.messages))
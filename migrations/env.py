@@ -16,6 +16,7 @@ from app.models.user import User
 from app.models.device_sensor import DeviceSensorLink
 from app.models.device_token import DeviceToken
 from app.models.organization import Organization
+from app.models.measurement_rollup import MeasurementRollup, RollupWatermark
 
 config = context.config
 
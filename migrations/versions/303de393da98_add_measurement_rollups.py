@@ -0,0 +1,56 @@
+"""add_measurement_rollups
+
+Revision ID: 303de393da98
+Revises: 9a1f3c6d2e47
+Create Date: 2026-10-17 13:42:10.371560
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '303de393da98'
+down_revision: Union[str, Sequence[str], None] = '9a1f3c6d2e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tabelas vazias: o RollupWorker faz o backfill do histórico em blocos
+    # (watermark começa em 0) sem nenhum passo manual.
+    op.create_table('measurement_rollups',
+    sa.Column('resolution', sqlmodel.sql.sqltypes.AutoString(length=10), nullable=False),
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('sensor_type_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('organization_id', sa.Integer(), nullable=True),
+    sa.Column('sum_value', sa.Float(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('min_value', sa.Float(), nullable=False),
+    sa.Column('max_value', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ),
+    sa.ForeignKeyConstraint(['organization_id'], ['organization.id'], ),
+    sa.ForeignKeyConstraint(['sensor_type_id'], ['sensor_types.id'], ),
+    sa.PrimaryKeyConstraint('resolution', 'device_id', 'sensor_type_id', 'bucket')
+    )
+    op.create_index('ix_measurement_rollups_org_resolution_bucket', 'measurement_rollups', ['organization_id', 'resolution', 'bucket'], unique=False)
+    op.create_table('rollup_watermarks',
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(length=50), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('pending_id', sa.Integer(), nullable=False),
+    sa.Column('pending_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rollup_watermarks')
+    op.drop_index('ix_measurement_rollups_org_resolution_bucket', table_name='measurement_rollups')
+    op.drop_table('measurement_rollups')
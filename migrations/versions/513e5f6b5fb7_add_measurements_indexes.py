@@ -0,0 +1,63 @@
+"""add_measurements_indexes
+
+Revision ID: 513e5f6b5fb7
+Revises: c44e7895832d
+Create Date: 2026-10-17 10:04:18.227931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '513e5f6b5fb7'
+down_revision: Union[str, Sequence[str], None] = 'c44e7895832d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY não roda dentro de transação: autocommit_block encerra a
+    # transação da migração. A tabela segue aceitando INSERTs durante o build.
+    # Se o build falhar, o Postgres deixa um índice INVALID: faça DROP INDEX
+    # CONCURRENTLY e rode a migração de novo (if_not_exists pularia o inválido).
+    with op.get_context().autocommit_block():
+        # Histórico por dispositivo/sensor, mais recente primeiro (read_measurements)
+        op.create_index(
+            'ix_measurements_device_sensor_created_at',
+            'measurements',
+            ['device_id', 'sensor_type_id', sa.text('created_at DESC')],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # BRIN: poucos KB para varrer por intervalo de tempo (analytics);
+        # eficaz porque created_at cresce junto com a ordem física das linhas
+        op.create_index(
+            'ix_measurements_created_at_brin',
+            'measurements',
+            ['created_at'],
+            postgresql_using='brin',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_measurements_created_at_brin',
+            table_name='measurements',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            'ix_measurements_device_sensor_created_at',
+            table_name='measurements',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,36 @@
+"""add_organization_retention_policies
+
+Revision ID: 5d958435b6db
+Revises: 303de393da98
+Create Date: 2026-10-17 15:08:33.640127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d958435b6db'
+down_revision: Union[str, Sequence[str], None] = '303de393da98'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # NULL = retenção infinita (comportamento atual)
+    op.add_column('organization', sa.Column('raw_retention_days', sa.Integer(), nullable=True))
+    op.add_column('organization', sa.Column('minute_rollup_retention_days', sa.Integer(), nullable=True))
+    op.add_column('organization', sa.Column('hour_rollup_retention_days', sa.Integer(), nullable=True))
+    op.add_column('organization', sa.Column('day_rollup_retention_days', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('organization', 'day_rollup_retention_days')
+    op.drop_column('organization', 'hour_rollup_retention_days')
+    op.drop_column('organization', 'minute_rollup_retention_days')
+    op.drop_column('organization', 'raw_retention_days')
@@ -0,0 +1,90 @@
+"""add_organization_id_to_measurements
+
+Revision ID: 7c2b9e14f0a3
+Revises: 5d958435b6db
+Create Date: 2026-10-17 16:21:47.085512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2b9e14f0a3'
+down_revision: Union[str, Sequence[str], None] = '5d958435b6db'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH = 50000
+
+INDEXES = {
+    'ix_measurements_org_created_at': 'organization_id, created_at',
+    'ix_measurements_org_device_created_at': 'organization_id, device_id, created_at',
+}
+
+
+def _backfill(bind) -> None:
+    """Copia devices.organization_id por faixas de id, uma transação por faixa."""
+    last = 0
+    while True:
+        high = bind.execute(sa.text("SELECT max(id) FROM measurements")).scalar() or 0
+        if last >= high:
+            return
+        # Relê max(id) ao final: linhas gravadas durante o backfill também entram
+        for start in range(last, high, BACKFILL_BATCH):
+            bind.execute(sa.text(
+                "UPDATE measurements m SET organization_id = d.organization_id "
+                "FROM devices d WHERE m.device_id = d.id "
+                "AND m.id > :low AND m.id <= :high AND m.organization_id IS NULL"
+            ), {"low": start, "high": start + BACKFILL_BATCH})
+        last = high
+
+
+def _create_index_online(bind, name: str, columns: str) -> None:
+    partitioned = bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('measurements')"
+    )).first()
+    if not partitioned:
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON measurements ({columns})")
+        return
+
+    # Tabela particionada não aceita CONCURRENTLY no pai: índice "casca" em
+    # ONLY measurements, índice concorrente em cada partição e ATTACH
+    # (o índice do pai fica válido quando todas as partições estão anexadas)
+    op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY measurements ({columns})")
+    partitions = bind.execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'measurements'::regclass"
+    )).scalars().all()
+    for partition in partitions:
+        child = f"{partition}_{name[len('ix_measurements_'):]}"[:63]
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} ({columns})")
+        op.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Coluna nullable sem default: só metadados. Sem FK (a validação varreria
+    # e travaria a tabela inteira); a consistência fica com app.core.tenancy.
+    op.add_column('measurements', sa.Column('organization_id', sa.Integer(), nullable=True))
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for name, columns in INDEXES.items():
+            op.create_index(name, 'measurements', [c.strip() for c in columns.split(',')], unique=False)
+        return
+
+    with op.get_context().autocommit_block():
+        _backfill(bind)
+        for name, columns in INDEXES.items():
+            _create_index_online(bind, name, columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in INDEXES:
+        op.drop_index(name, table_name='measurements', if_exists=True)
+    op.drop_column('measurements', 'organization_id')
@@ -0,0 +1,129 @@
+"""partition_measurements_by_created_at
+
+Revision ID: 9a1f3c6d2e47
+Revises: 513e5f6b5fb7
+Create Date: 2026-10-17 11:27:05.918344
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a1f3c6d2e47'
+down_revision: Union[str, Sequence[str], None] = '513e5f6b5fb7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partições diárias criadas pela própria migração; depois disso o
+# PartitionManager (lifespan / python -m app.core.partitions) assume.
+INITIAL_PARTITIONS = 7
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Migração ONLINE (sem copiar linhas): a tabela atual vira a partição
+    # "legada" [MINVALUE, cutoff) da nova tabela pai. O cutoff fica ~1 dia à
+    # frente para que a ingestão nunca viole o CHECK antes da troca.
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = today + timedelta(days=2)
+
+    # 1. Preparação sem bloquear escritas (fora de transação)
+    with op.get_context().autocommit_block():
+        # A PK de uma tabela particionada precisa incluir a chave de partição
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS measurements_legacy_id_created_at_key "
+            "ON measurements (id, created_at)"
+        )
+        # CHECK validado = ATTACH PARTITION sem varrer a tabela
+        op.execute(
+            f"ALTER TABLE measurements ADD CONSTRAINT measurements_legacy_bound "
+            f"CHECK (created_at < '{cutoff.isoformat(sep=' ')}') NOT VALID"
+        )
+        op.execute("ALTER TABLE measurements VALIDATE CONSTRAINT measurements_legacy_bound")
+
+    # 2. Troca: só metadados, lock curto (falha rápido em vez de enfileirar a ingestão)
+    op.execute("SET LOCAL lock_timeout = '10s'")
+    op.execute("ALTER TABLE measurements RENAME TO measurements_legacy")
+    op.execute(
+        "ALTER TABLE measurements_legacy DROP CONSTRAINT measurements_pkey, "
+        "ADD CONSTRAINT measurements_legacy_pkey PRIMARY KEY USING INDEX measurements_legacy_id_created_at_key"
+    )
+    op.execute("ALTER INDEX IF EXISTS ix_measurements_device_sensor_created_at RENAME TO ix_measurements_legacy_device_sensor_created_at")
+    op.execute("ALTER INDEX IF EXISTS ix_measurements_created_at_brin RENAME TO ix_measurements_legacy_created_at_brin")
+
+    op.execute("""
+        CREATE TABLE measurements (
+            id INTEGER NOT NULL DEFAULT nextval('measurements_id_seq'::regclass),
+            device_id INTEGER NOT NULL REFERENCES devices (id),
+            sensor_type_id INTEGER NOT NULL REFERENCES sensor_types (id),
+            value DOUBLE PRECISION NOT NULL,
+            raw_value DOUBLE PRECISION,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT measurements_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    # Índices na tabela pai: propagados para toda partição criada depois
+    op.execute(
+        "CREATE INDEX ix_measurements_device_sensor_created_at "
+        "ON measurements (device_id, sensor_type_id, created_at DESC)"
+    )
+    op.execute("CREATE INDEX ix_measurements_created_at_brin ON measurements USING brin (created_at)")
+
+    # Índices/FKs equivalentes já existentes na legada são reaproveitados no ATTACH
+    op.execute(
+        f"ALTER TABLE measurements ATTACH PARTITION measurements_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{cutoff.isoformat(sep=' ')}')"
+    )
+    op.execute("ALTER TABLE measurements_legacy DROP CONSTRAINT measurements_legacy_bound")
+    op.execute("ALTER SEQUENCE measurements_id_seq OWNED BY measurements.id")
+
+    for n in range(INITIAL_PARTITIONS):
+        start = cutoff + timedelta(days=n)
+        end = start + timedelta(days=1)
+        op.execute(
+            f"CREATE TABLE measurements_p{start:%Y%m%d} PARTITION OF measurements "
+            f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Volta para uma heap única copiando as linhas (offline: tabela inteira)
+    op.execute("ALTER TABLE measurements RENAME TO measurements_partitioned")
+    op.execute("ALTER TABLE measurements_partitioned RENAME CONSTRAINT measurements_pkey TO measurements_partitioned_pkey")
+    op.execute("ALTER INDEX ix_measurements_device_sensor_created_at RENAME TO ix_measurements_partitioned_device_sensor_created_at")
+    op.execute("ALTER INDEX ix_measurements_created_at_brin RENAME TO ix_measurements_partitioned_created_at_brin")
+
+    op.execute("""
+        CREATE TABLE measurements (
+            id INTEGER NOT NULL DEFAULT nextval('measurements_id_seq'::regclass),
+            device_id INTEGER NOT NULL REFERENCES devices (id),
+            sensor_type_id INTEGER NOT NULL REFERENCES sensor_types (id),
+            value DOUBLE PRECISION NOT NULL,
+            raw_value DOUBLE PRECISION,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT measurements_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute(
+        "INSERT INTO measurements (id, device_id, sensor_type_id, value, raw_value, created_at) "
+        "SELECT id, device_id, sensor_type_id, value, raw_value, created_at FROM measurements_partitioned"
+    )
+    op.execute("ALTER SEQUENCE measurements_id_seq OWNED BY measurements.id")
+    op.execute("DROP TABLE measurements_partitioned")
+    op.execute(
+        "CREATE INDEX ix_measurements_device_sensor_created_at "
+        "ON measurements (device_id, sensor_type_id, created_at DESC)"
+    )
+    op.execute("CREATE INDEX ix_measurements_created_at_brin ON measurements USING brin (created_at)")
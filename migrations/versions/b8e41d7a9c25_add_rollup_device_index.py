@@ -0,0 +1,44 @@
+"""add_rollup_device_index
+
+Revision ID: b8e41d7a9c25
+Revises: 7c2b9e14f0a3
+Create Date: 2026-10-17 16:42:09.518304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e41d7a9c25'
+down_revision: Union[str, Sequence[str], None] = '7c2b9e14f0a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Analytics com device_id: intervalo de buckets de um único dispositivo,
+    # sem varrer os rollups da organização inteira
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_measurement_rollups_org_resolution_device_bucket',
+            'measurement_rollups',
+            ['organization_id', 'resolution', 'device_id', 'bucket'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_measurement_rollups_org_resolution_device_bucket',
+            table_name='measurement_rollups',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
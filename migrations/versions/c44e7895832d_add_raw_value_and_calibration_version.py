@@ -0,0 +1,36 @@
+"""add_raw_value_and_calibration_version
+
+Revision ID: c44e7895832d
+Revises: 1ee05c90697d
+Create Date: 2026-10-17 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c44e7895832d'
+down_revision: Union[str, Sequence[str], None] = '1ee05c90697d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Coluna nullable sem default: ALTER instantâneo, sem reescrever a tabela.
+    # Linhas legadas ficam com raw_value NULL (o valor bruto original foi perdido).
+    op.add_column('measurements', sa.Column('raw_value', sa.Float(), nullable=True))
+    op.add_column(
+        'device_sensor_links',
+        sa.Column('calibration_version', sa.Integer(), nullable=False, server_default='1')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('device_sensor_links', 'calibration_version')
+    op.drop_column('measurements', 'raw_value')
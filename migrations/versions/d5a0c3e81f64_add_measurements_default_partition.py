@@ -0,0 +1,41 @@
+"""add_measurements_default_partition
+
+Revision ID: d5a0c3e81f64
+Revises: b8e41d7a9c25
+Create Date: 2026-10-17 18:05:31.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a0c3e81f64'
+down_revision: Union[str, Sequence[str], None] = 'b8e41d7a9c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Timestamps vêm do dispositivo: uma leitura fora das partições existentes
+    # (além do horizonte pré-criado ou numa faixa removida) cai aqui em vez de
+    # falhar com "no partition of relation found". O PartitionManager move
+    # essas linhas para a partição certa quando ela é criada.
+    op.execute("SET LOCAL lock_timeout = '10s'")
+    op.execute("CREATE TABLE IF NOT EXISTS measurements_default PARTITION OF measurements DEFAULT")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Linhas da DEFAULT sem partição de destino são perdidas no downgrade
+    op.execute("DROP TABLE IF EXISTS measurements_default")
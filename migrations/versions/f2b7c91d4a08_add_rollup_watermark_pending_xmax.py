@@ -0,0 +1,30 @@
+"""add_rollup_watermark_pending_xmax
+
+Revision ID: f2b7c91d4a08
+Revises: d5a0c3e81f64
+Create Date: 2026-10-17 18:41:12.663590
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b7c91d4a08'
+down_revision: Union[str, Sequence[str], None] = 'd5a0c3e81f64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # xmax do snapshot do candidato: o watermark espera as transações em voo
+    op.add_column('rollup_watermarks', sa.Column('pending_xmax', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('rollup_watermarks', 'pending_xmax')
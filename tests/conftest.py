@@ -9,6 +9,15 @@ from sqlmodel.pool import StaticPool
 
 from app.main import app
 from app.core.database import get_session
+from app.api.v1 import deps
+from app.core.device_cache import device_auth_cache
+from app.core.analytics_cache import analytics_cache
+from app.models.organization import Organization
+from app.models.user import User
+from app.models.device import Device
+from app.models.sensor_type import SensorType
+from app.models.device_sensor import DeviceSensorLink
+from app.models.device_token import DeviceToken
 
 # Configura Banco em Memória Assíncrono (SQLite + aiosqlite)
 # StaticPool garante que a conexão persista na memória entre requisições
@@ -38,6 +47,7 @@ async def session():
     # Limpa as tabelas (Drop)
     async with engine_test.begin() as conn:
         await conn.run_sync(SQLModel.metadata.drop_all)
+    analytics_cache.clear() # Ids se repetem no próximo banco
 
 # Fixture do Cliente HTTP Assíncrono
 @pytest_asyncio.fixture
@@ -53,4 +63,74 @@ async def async_client(session: AsyncSession):
     async with AsyncClient(transport=transport, base_url="http://test") as client:
         yield client
     
-    app.dependency_overrides.clear()
\ No newline at end of file
+    app.dependency_overrides.clear()
+
+# -----------------------------------------------------------------------------
+# FIXTURES DE TENANT (Org + Usuário + Dispositivo com Token)
+# -----------------------------------------------------------------------------
+@pytest_asyncio.fixture
+async def organization(session: AsyncSession):
+    org = Organization(name="Org Teste", slug="org-teste")
+    session.add(org)
+    await session.commit()
+    await session.refresh(org)
+    return org
+
+@pytest_asyncio.fixture
+async def current_user(session: AsyncSession, organization: Organization):
+    """Usuário autenticado da org de teste (sobrescreve a dependência de JWT)."""
+    user = User(
+        username="tester",
+        email="tester@iotlab.com",
+        hashed_password="x",
+        organization_id=organization.id
+    )
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+
+    app.dependency_overrides[deps.get_current_active_user] = lambda: user
+    yield user
+    app.dependency_overrides.pop(deps.get_current_active_user, None)
+
+@pytest_asyncio.fixture
+async def sensor_types(session: AsyncSession):
+    temp = SensorType(name="Temperatura", unit="C", code="temp_c")
+    hum = SensorType(name="Umidade", unit="%", code="hum_rel")
+    session.add_all([temp, hum])
+    await session.commit()
+    await session.refresh(temp)
+    await session.refresh(hum)
+    return [temp, hum]
+
+@pytest_asyncio.fixture
+async def device(session: AsyncSession, organization: Organization, sensor_types):
+    """Dispositivo da org de teste com o primeiro sensor vinculado (fórmula 'x * 2')."""
+    db_device = Device(name="Dev Teste", slug="dev-teste", organization_id=organization.id)
+    session.add(db_device)
+    await session.commit()
+    await session.refresh(db_device)
+
+    session.add(DeviceSensorLink(
+        device_id=db_device.id,
+        sensor_type_id=sensor_types[0].id,
+        calibration_formula="x * 2"
+    ))
+    await session.commit()
+    return db_device
+
+@pytest_asyncio.fixture
+async def device_headers(session: AsyncSession, device: Device, monkeypatch):
+    """Headers de ingestão (X-Device-Token) de um token ativo do dispositivo de teste."""
+    db_token = DeviceToken(device_id=device.id, token=DeviceToken.generate_token())
+    session.add(db_token)
+    await session.commit()
+
+    # O middleware abre sua própria sessão: aponta para o banco de teste
+    monkeypatch.setattr(
+        "app.core.middleware.async_session_maker",
+        sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    )
+    device_auth_cache.clear()
+    yield {"X-Device-Token": db_token.token}
+    device_auth_cache.clear()
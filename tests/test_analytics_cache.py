@@ -0,0 +1,83 @@
+import pytest
+from collections import namedtuple
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.analytics_cache import AnalyticsCache, Scope, analytics_cache, cache_enabled
+from app.core.ingestion import insert_measurements
+
+Row = namedtuple("Row", "organization_id device_id sensor_type_id created_at")
+
+def bucket(moment, sensor=1, device=None, count=1):
+    return {"bucket": moment, "device_id": device, "sensor_type_id": sensor,
+            "sum_value": float(count), "count": count, "min_value": 1.0, "max_value": 1.0}
+
+@pytest.mark.asyncio
+async def test_closed_buckets_cached_and_invalidated_by_late_reading(
+    async_client: AsyncClient, session: AsyncSession, current_user, device, sensor_types, device_headers, monkeypatch
+):
+    monkeypatch.setattr(analytics_cache, "enabled", True) # Desligado por padrão (só um worker)
+    base = datetime(2026, 3, 1)
+    sensor_id = sensor_types[0].id
+    await insert_measurements(session, [
+        {"device_id": device.id, "sensor_type_id": sensor_id, "organization_id": device.organization_id,
+         "value": float(hour), "created_at": base + timedelta(hours=hour, minutes=30)}
+        for hour in range(6)
+    ])
+    await session.commit()
+
+    url = "/api/v1/measurements/analytics/"
+    params = {"start": base.isoformat(), "end": (base + timedelta(hours=6)).isoformat(), "bucket_size": "hour"}
+    first = (await async_client.get(url, params=params)).json()
+    hits, misses = analytics_cache.hits, analytics_cache.misses
+    assert (await async_client.get(url, params=params)).json() == first
+    assert (analytics_cache.hits - hits, analytics_cache.misses - misses) == (6, 0)
+
+    # Leitura atrasada no bucket das 02h: só ele sai do cache
+    invalidations = analytics_cache.invalidations
+    late = {"sensor_type_id": sensor_id, "value": 10.0, "timestamp": (base + timedelta(hours=2, minutes=5)).isoformat()}
+    response = await async_client.post("/api/v1/measurements/batch", json={"readings": [late]}, headers=device_headers)
+    assert response.status_code == 200
+    assert analytics_cache.invalidations == invalidations + 1
+
+    hits, misses = analytics_cache.hits, analytics_cache.misses
+    after = (await async_client.get(url, params=params)).json()
+    assert (analytics_cache.hits - hits, analytics_cache.misses - misses) == (5, 1)
+    assert [item["count"] for item in after] == [1, 1, 2, 1, 1, 1]
+
+def test_concurrent_invalidation_and_memory_lru():
+    cache = AnalyticsCache(max_bytes=64 * 1024)
+    scope, other = Scope(1, "sensor", None, None), Scope(1, "sensor", 2, None)
+    hour = timedelta(hours=1)
+    base = datetime(2026, 3, 1)
+    computed = [bucket(base + i * hour) for i in range(4)]
+
+    # Leitura atrasada chega enquanto a consulta ainda calculava: o bucket
+    # das 02h (e os seguintes) não são gravados, os anteriores sim
+    generation = cache.generation()
+    cache.invalidate_rows([Row(1, 1, 1, base + 2 * hour + timedelta(minutes=5))])
+    cache.put_range(scope, hour, base, base + 4 * hour, computed, closed_before=base + 4 * hour, generation=generation)
+    found, missing = cache.get_range(scope, hour, base, base + 4 * hour)
+    assert found == computed[:2]
+    assert missing == [(base + 2 * hour, base + 4 * hour)]
+
+    # Filtro de dispositivo: leitura de outro dispositivo não invalida a entrada
+    cache.put_range(other, hour, base, base + hour, [], closed_before=base + hour, generation=cache.generation())
+    cache.invalidate_rows([Row(1, 3, 1, base + timedelta(minutes=1))])
+    assert cache.get_range(other, hour, base, base + hour) == ([], [])
+    assert cache.get_range(scope, hour, base, base + hour)[1] == [(base, base + hour)]
+
+    # Muitos buckets: o LRU respeita o limite de memória e o índice acompanha
+    many = [bucket(base + i * hour) for i in range(2000)]
+    cache.put_range(scope, hour, base, base + 2000 * hour, many, closed_before=datetime.max, generation=cache.generation())
+    stats = cache.stats()
+    assert stats["evictions"] > 0 and stats["bytes"] <= cache.max_bytes
+    assert sum(len(keys) for keys in cache._index.values()) == stats["entries"]
+
+def test_cache_disabled_with_multiple_workers():
+    # Invalidação é local: com broadcast entre workers o cache não liga
+    assert cache_enabled(True, workers=1) is True
+    assert cache_enabled(True, workers=4) is False
+    assert cache_enabled(True, workers=1, backend="postgres") is False
+    assert cache_enabled(False, workers=1) is False
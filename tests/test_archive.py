@@ -0,0 +1,166 @@
+import json
+import pytest
+import pyarrow.parquet as pq
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.archive import Archiver, cold_archive
+from app.core.config import settings
+from app.core.ingestion import insert_measurements
+from app.core.retention import RetentionWorker
+from app.models.device import Device
+from app.models.measurement import Measurement
+from app.models.organization import Organization
+from tests.conftest import engine_test
+
+@pytest.mark.asyncio
+async def test_archive_moves_closed_days_and_reads_are_federated(
+    async_client: AsyncClient, session: AsyncSession, current_user, device, sensor_types, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(settings, "ROLLUP_LAG_SECONDS", 0)
+    monkeypatch.setattr(cold_archive, "root", tmp_path)
+
+    now = datetime.utcnow().replace(microsecond=0)
+    today = now.replace(hour=0, minute=0, second=0)
+    other = Organization(name="Outra Org", slug="outra-org")
+    session.add(other)
+    await session.commit()
+    other_device = Device(name="Dev Outra", slug="dev-outra", organization_id=other.id)
+    session.add(other_device)
+    await session.commit()
+    org_id, device_id, other_device_id = device.organization_id, device.id, other_device.id
+
+    def reading(moment, value, organization_id=org_id, device_id=device_id):
+        return {"device_id": device_id, "sensor_type_id": sensor_types[0].id, "organization_id": organization_id,
+                "value": value, "raw_value": value, "created_at": moment}
+
+    rows = [reading(today - timedelta(days=3, minutes=-i), float(i)) for i in range(3)]
+    rows += [reading(today - timedelta(days=2, minutes=-i), float(10 + i)) for i in range(2)]
+    rows += [reading(today - timedelta(days=2), 99.0, other.id, other_device_id)]
+    rows += [reading(now - timedelta(minutes=i + 1), float(20 + i)) for i in range(2)]
+    await insert_measurements(session, rows)
+    await session.commit()
+
+    before = (await async_client.get("/api/v1/measurements/analytics/", params={"period": "1w", "bucket_size": "hour"})).json()
+
+    factory = sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    archiver = Archiver(session_factory=factory, after_days=1, row_group_size=2, chunk_size=2)
+    archived = await archiver.run_once(now=now)
+    assert len(archived) == 2 # Dias fechados antes de ontem
+
+    # Só as linhas recentes continuam no Postgres
+    assert (await session.exec(select(func.count(Measurement.id)))).one() == 2
+    manifest = json.loads((tmp_path / "_manifest.json").read_text())
+    assert manifest["archived_until"] == (today - timedelta(days=1)).isoformat()
+
+    # Parquet particionado por organização/dia, com row groups e estatísticas
+    day_dir = tmp_path / f"organization_id={org_id}" / f"date={(today - timedelta(days=3)).date()}"
+    metadata = pq.ParquetFile(next(day_dir.glob("*.parquet"))).metadata
+    assert metadata.num_row_groups == 2
+    assert metadata.row_group(0).column(5).statistics.has_min_max
+
+    # Listagem: Postgres + arquivo na mesma ordem, paginando por cursor
+    values, cursor = [], None
+    while True:
+        page = await async_client.get("/api/v1/measurements/", params={"limit": 3, **({"cursor": cursor} if cursor else {})})
+        values += [m["value"] for m in page.json()]
+        cursor = page.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert values == [20.0, 21.0, 11.0, 10.0, 2.0, 1.0, 0.0]
+
+    legacy = await async_client.get("/api/v1/measurements/", params={"skip": 4, "limit": 2})
+    assert [m["value"] for m in legacy.json()] == [2.0, 1.0]
+
+    exported = await async_client.get("/api/v1/measurements/export", params={"format": "ndjson"})
+    assert [json.loads(line)["value"] for line in exported.text.splitlines()] == [0.0, 1.0, 2.0, 10.0, 11.0, 21.0, 20.0]
+
+    # Analytics igual antes e depois do arquivamento
+    after = (await async_client.get("/api/v1/measurements/analytics/", params={"period": "1w", "bucket_size": "hour"})).json()
+    assert after == before
+
+    # Idempotente: nada mais a arquivar
+    assert await archiver.run_once(now=now) == []
+
+@pytest.mark.asyncio
+async def test_late_row_in_archived_day_gets_its_own_file(
+    async_client: AsyncClient, session: AsyncSession, current_user, device, device_headers, sensor_types, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(settings, "ROLLUP_LAG_SECONDS", 0)
+    monkeypatch.setattr(cold_archive, "root", tmp_path)
+
+    now = datetime.utcnow().replace(microsecond=0)
+    old = now.replace(hour=0, minute=0, second=0) - timedelta(days=3)
+
+    def reading(moment, value):
+        return {"device_id": device.id, "sensor_type_id": sensor_types[0].id, "organization_id": device.organization_id,
+                "value": value, "raw_value": value, "created_at": moment}
+
+    await insert_measurements(session, [reading(old + timedelta(hours=1), 1.0), reading(old + timedelta(hours=2), 2.0)])
+    await session.commit()
+
+    factory = sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    archiver = Archiver(session_factory=factory, after_days=1)
+    await archiver.run_once(now=now)
+
+    # A API rejeita leituras antes da fronteira (sumiriam das consultas)
+    response = await async_client.post(
+        "/api/v1/measurements/", headers=device_headers,
+        json={"sensor_type_id": sensor_types[0].id, "value": 5.0, "timestamp": (old + timedelta(hours=3)).isoformat()},
+    )
+    assert response.status_code == 400
+
+    # Linha atrasada por outro caminho (carga em massa): arquivada num arquivo novo, sem sobrescrever
+    await insert_measurements(session, [reading(old + timedelta(hours=3), 3.0)])
+    await session.commit()
+    await archiver.run_once(now=now)
+
+    day_dir = tmp_path / f"organization_id={device.organization_id}" / f"date={old.date()}"
+    assert len(list(day_dir.glob("*.parquet"))) == 2
+    assert (await session.exec(select(func.count(Measurement.id)))).one() == 0
+
+    listed = await async_client.get("/api/v1/measurements/")
+    assert sorted(m["value"] for m in listed.json()) == [1.0, 2.0, 3.0]
+
+@pytest.mark.asyncio
+async def test_analytics_before_boundary_served_by_rollups_after_retention(
+    async_client: AsyncClient, session: AsyncSession, current_user, organization, device, sensor_types, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(settings, "ROLLUP_LAG_SECONDS", 0)
+    monkeypatch.setattr(cold_archive, "root", tmp_path)
+
+    now = datetime.utcnow().replace(microsecond=0)
+    old = now.replace(hour=0, minute=0, second=0) - timedelta(days=3)
+    await insert_measurements(session, [
+        {"device_id": device.id, "sensor_type_id": sensor_types[0].id, "organization_id": device.organization_id,
+         "value": float(i), "raw_value": float(i), "created_at": old + timedelta(hours=1, minutes=7 * i)}
+        for i in range(4)
+    ])
+    await session.commit()
+
+    def analytics(bucket_size):
+        return async_client.get("/api/v1/measurements/analytics/", params={"period": "1w", "bucket_size": bucket_size})
+
+    hourly, five_minutes = (await analytics("hour")).json(), (await analytics("5m")).json()
+    factory = sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    await Archiver(session_factory=factory, after_days=1).run_once(now=now)
+    worker = RetentionWorker(session_factory=factory)
+
+    # Rollups de minuto expirados: buckets de 5m saem do Parquet
+    organization.minute_rollup_retention_days = 2
+    session.add(organization)
+    await session.commit()
+    await worker.run_once(now=now)
+    assert (await analytics("5m")).json() == five_minutes
+
+    # Brutos (e o dia no arquivo) expirados: buckets de hora seguem pelos rollups
+    organization.raw_retention_days = 2
+    session.add(organization)
+    await session.commit()
+    await worker.run_once(now=now)
+    assert not list(tmp_path.glob("organization_id=*/date=*"))
+    assert (await analytics("hour")).json() == hourly
@@ -0,0 +1,43 @@
+import pytest
+import pyarrow as pa
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.arrow_ipc import ANALYTICS_SCHEMA, ARROW_STREAM, MEASUREMENT_SCHEMA
+from app.core.ingestion import insert_measurements
+
+ARROW_HEADERS = {"Accept": ARROW_STREAM}
+
+def read_table(response) -> pa.Table:
+    assert response.status_code == 200
+    assert response.headers["content-type"] == ARROW_STREAM
+    return pa.ipc.open_stream(response.content).read_all()
+
+@pytest.mark.asyncio
+async def test_measurements_and_analytics_as_arrow(
+    async_client: AsyncClient, session: AsyncSession, current_user, device, sensor_types
+):
+    now = datetime.utcnow().replace(microsecond=0)
+    await insert_measurements(session, [
+        {"device_id": device.id, "sensor_type_id": sensor_types[0].id, "organization_id": device.organization_id,
+         "value": float(i), "created_at": now - timedelta(seconds=i)}
+        for i in range(3)
+    ])
+    await session.commit()
+
+    page = await async_client.get("/api/v1/measurements/", params={"limit": 2}, headers=ARROW_HEADERS)
+    table = read_table(page)
+    assert table.schema == MEASUREMENT_SCHEMA
+    assert table.column("value").to_pylist() == [0.0, 1.0]
+    assert "x-next-cursor" in page.headers # Cursor também no modo Arrow
+
+    created_at = table.column("created_at").to_pandas()
+    assert str(created_at.dt.tz) == "UTC"
+    assert created_at.iloc[0].tz_localize(None) == now
+
+    analytics = read_table(await async_client.get("/api/v1/measurements/analytics/", headers=ARROW_HEADERS))
+    assert analytics.schema == ANALYTICS_SCHEMA
+    as_json = (await async_client.get("/api/v1/measurements/analytics/")).json()
+    assert analytics.column("count").to_pylist() == [item["count"] for item in as_json]
+    assert analytics.column("avg_value").to_pylist() == [item["avg_value"] for item in as_json]
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import pytest
+
+from app.core.broadcast import PostgresBroadcast, channel_name, pack_payloads
+from app.core.socket import ConnectionManager
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+async def drain():
+    """Deixa os writers de cada conexão enviarem o que está na fila."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+class FakeListenConnection:
+    """Só o que o backend usa da conexão asyncpg."""
+
+    def __init__(self):
+        self.channels = {}
+
+    def is_closed(self):
+        return False
+
+    async def add_listener(self, channel, callback):
+        self.channels[channel] = callback
+
+    async def remove_listener(self, channel, callback):
+        self.channels.pop(channel, None)
+
+def test_pack_payloads_respects_notify_limit():
+    messages = [{"id": i, "value": 1.5, "created_at": "2026-03-01T10:00:00"} for i in range(200)]
+    payloads = pack_payloads(messages + [{"blob": "x" * 2000}], max_bytes=1000)
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) <= 1000 for payload in payloads)
+    # Ordem preservada; a mensagem maior que o limite fica de fora
+    assert [m for payload in payloads for m in json.loads(payload)] == messages
+
+@pytest.mark.asyncio
+async def test_memory_backend_delivers_only_to_organization():
+    manager = ConnectionManager(backend="memory")
+    mine, other = FakeSocket(), FakeSocket()
+    await manager.connect(mine, 1)
+    await manager.connect(other, 2)
+
+    await manager.publish([{"id": 1}, {"id": 2}], organization_id=1)
+    await drain()
+    assert mine.sent == [{"id": 1}, {"id": 2}]
+    assert other.sent == []
+    manager.disconnect(mine, 1)
+    manager.disconnect(other, 2)
+
+@pytest.mark.asyncio
+async def test_postgres_backend_listens_per_organization_and_fans_out():
+    manager = ConnectionManager(backend="postgres")
+    backend: PostgresBroadcast = manager.backend
+    connection = backend._connection = FakeListenConnection()
+    backend._inbox = asyncio.Queue()
+    fan_out = asyncio.create_task(backend._fan_out())
+
+    socket = FakeSocket()
+    await manager.connect(socket, 7)
+    assert set(connection.channels) == {channel_name(7)}
+
+    # Notificação de outro worker chega pelo LISTEN e é entregue localmente
+    connection.channels[channel_name(7)](connection, 123, channel_name(7), json.dumps([{"id": 5}]))
+    await drain()
+    assert socket.sent == [{"id": 5}]
+
+    # Último socket da org saiu: UNLISTEN
+    manager.disconnect(socket, 7)
+    await asyncio.gather(*manager._background)
+    assert connection.channels == {}
+
+    fan_out.cancel()
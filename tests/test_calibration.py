@@ -0,0 +1,167 @@
+import ast
+import math
+import random
+
+import numpy as np
+import pytest
+
+from app.core.calibration import (
+    FUNCTIONS,
+    OPERATORS,
+    CalibrationError,
+    calibrate_array,
+    compile_formula,
+    safe_eval,
+    validate_formula,
+)
+
+# -----------------------------------------------------------------------------
+# INTERPRETADOR DE REFERÊNCIA (implementação original, recursiva sobre a AST)
+# -----------------------------------------------------------------------------
+def reference_safe_eval(formula: str, x_value: float) -> float:
+    if not formula or not formula.strip():
+        return x_value
+
+    try:
+        if len(formula) > 50:
+            raise ValueError("Fórmula muito longa")
+
+        node = ast.parse(formula, mode='eval')
+
+        def _eval(node):
+            if isinstance(node, ast.Expression):
+                return _eval(node.body)
+            elif isinstance(node, ast.Constant):
+                return node.value
+            elif isinstance(node, ast.Name):
+                if node.id == 'x':
+                    return x_value
+                raise ValueError(f"Variável não permitida: {node.id}")
+            elif isinstance(node, ast.BinOp):
+                op = type(node.op)
+                if op in OPERATORS:
+                    return OPERATORS[op](_eval(node.left), _eval(node.right))
+            elif isinstance(node, ast.UnaryOp):
+                op = type(node.op)
+                if op in OPERATORS:
+                    return OPERATORS[op](_eval(node.operand))
+            elif isinstance(node, ast.Call):
+                if isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
+                    args = [_eval(arg) for arg in node.args]
+                    return FUNCTIONS[node.func.id](*args)
+
+            raise ValueError(f"Expressão inválida ou insegura: {type(node)}")
+
+        return float(_eval(node))
+
+    except Exception:
+        return x_value
+
+# -----------------------------------------------------------------------------
+# GERADOR DE FÓRMULAS ALEATÓRIAS
+# -----------------------------------------------------------------------------
+def random_leaf(rng: random.Random) -> str:
+    choice = rng.random()
+    if choice < 0.5:
+        return "x"
+    if choice < 0.75:
+        return str(rng.randint(0, 10))
+    if choice < 0.95:
+        return str(round(rng.uniform(-5, 5), 2))
+    return rng.choice(["y", "'a'", "1j", "None", "x.real"]) # Fora da whitelist
+
+def random_formula(rng: random.Random, depth: int = 3) -> str:
+    if depth == 0 or rng.random() < 0.25:
+        return random_leaf(rng)
+
+    kind = rng.random()
+    if kind < 0.55:
+        op = rng.choice(["+", "-", "*", "/", "**"])
+        left = random_formula(rng, depth - 1)
+        # Expoente pequeno: evita inteiros gigantes (DoS) no próprio teste
+        right = str(rng.randint(0, 3)) if op == "**" else random_formula(rng, depth - 1)
+        return f"({left} {op} {right})"
+    if kind < 0.7:
+        return f"{rng.choice(['-', '+', 'not ', '~'])}{random_formula(rng, depth - 1)}"
+    func = rng.choice(["sqrt", "log", "abs", "round", "exp"])
+    if func == "round" and rng.random() < 0.5:
+        return f"round({random_formula(rng, depth - 1)}, {rng.randint(0, 3)})"
+    return f"{func}({random_formula(rng, depth - 1)})"
+
+def same_result(a: float, b: float) -> bool:
+    if math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+def test_compiled_matches_reference_interpreter():
+    rng = random.Random(20260217)
+    inputs = [0.0, 1.0, -1.0, 2.5, -3.75, 100.0, 1e-9, 1e6, -1e6]
+
+    for _ in range(2000):
+        formula = random_formula(rng)
+        for x in inputs + [rng.uniform(-1000, 1000) for _ in range(3)]:
+            expected = reference_safe_eval(formula, x)
+            if not math.isfinite(expected):
+                expected = x # Resultado inf/nan: o avaliador atual devolve o bruto
+            got = safe_eval(formula, x)
+            assert same_result(got, expected), f"{formula!r} com x={x}: {got} != {expected}"
+
+def test_vectorized_matches_scalar_evaluator():
+    """calibrate_array deve reproduzir safe_eval elemento a elemento (incluindo fallbacks)."""
+    rng = random.Random(20260218)
+    base_inputs = [0.0, 1.0, -1.0, 2.5, -3.75, 0.125, 2.675, 1e6, -1e6, 1e-9]
+
+    for _ in range(2000):
+        formula = random_formula(rng)
+        values = np.array(base_inputs + [rng.uniform(-1000, 1000) for _ in range(6)])
+
+        got = calibrate_array(formula, values)
+        expected = np.array([safe_eval(formula, float(v)) for v in values])
+
+        ok = np.isclose(got, expected, rtol=1e-9, atol=0, equal_nan=True)
+        assert ok.all(), f"{formula!r}: {values[~ok]} -> {got[~ok]} != {expected[~ok]}"
+
+@pytest.mark.parametrize("formula", ["x * 1e308", "x * x * x", "x * 1e10 - x * 1e10", "exp(x)", "x ** 3"])
+def test_overflow_keeps_raw_value_in_scalar_and_vectorized(formula):
+    # Multiplicação não levanta OverflowError (dá inf): as duas vias guardam o bruto
+    values = np.array([1e300, -1e300, 2.0, 1e6])
+    expected = np.array([safe_eval(formula, float(v)) for v in values])
+    assert np.isfinite(expected).all()
+    assert np.array_equal(calibrate_array(formula, values), expected)
+    assert safe_eval(formula, 1e300) == 1e300
+
+def test_known_formulas():
+    assert safe_eval("x * 0.5 + 10", 100) == 60.0
+    assert safe_eval("round(x, 1)", 1.26) == 1.3
+    assert safe_eval("sqrt(x)", -4) == -4 # Erro de domínio cai para o valor bruto
+    assert safe_eval("x / 0", 7) == 7
+    assert safe_eval("", 3.0) == 3.0
+
+def test_compiled_formula_is_memoized():
+    assert compile_formula("x * 3 - 1") is compile_formula("x * 3 - 1")
+
+@pytest.mark.parametrize("formula", [
+    "__import__('os')",
+    "x.real",
+    "y * 2",
+    "x if x else 1",
+    "'abc'",
+    "x * " + "1" * 60,
+    "x +",
+])
+def test_validate_formula_rejects_unsafe(formula):
+    with pytest.raises(CalibrationError):
+        validate_formula(formula)
+
+def test_cached_invalid_formula_raises_fresh_exception():
+    depths = []
+    for _ in range(50):
+        try:
+            compile_formula("__import__('os')")
+        except CalibrationError as e:
+            depth, tb = 0, e.__traceback__
+            while tb is not None:
+                depth, tb = depth + 1, tb.tb_next
+            depths.append(depth)
+    # Traceback não cresce entre chamadas (a exceção não é reaproveitada do cache)
+    assert max(depths) == min(depths) <= 3
@@ -38,4 +38,13 @@ async def test_read_devices(async_client: AsyncClient):
     
     assert response.status_code == 200
     data = response.json()
-    assert len(data) >= 1
\ No newline at end of file
+    assert len(data) >= 1
+
+@pytest.mark.asyncio
+async def test_invalid_calibration_formula_is_rejected(async_client: AsyncClient, current_user, device, sensor_types):
+    response = await async_client.put(
+        f"/api/v1/devices/{device.id}/sensors/{sensor_types[0].id}/calibration",
+        json={"calibration_formula": "__import__('os')"}
+    )
+    assert response.status_code == 422
+    assert "Fórmula de calibração inválida" in response.json()["detail"]
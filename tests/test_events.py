@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from app.core import ingestion
+from app.core.analytics_cache import AnalyticsCache, Scope
+from app.core.events import EventBus
+
+Row = namedtuple("Row", "organization_id device_id sensor_type_id created_at")
+
+@pytest.mark.asyncio
+async def test_publish_does_not_wait_for_slow_subscriber_and_counts_overflow():
+    bus = EventBus(max_queue=2)
+    release = asyncio.Event()
+    slow_batches, fast_batches = [], []
+
+    async def slow(items):
+        await release.wait()
+        slow_batches.append(items)
+
+    async def fast(items):
+        fast_batches.append(items)
+
+    bus.subscribe("readings", "slow", slow)
+    bus.subscribe("readings", "fast", fast)
+    await bus.start()
+
+    await bus.publish("readings", [0])
+    await asyncio.sleep(0) # O lento pega o 1o evento e trava
+    for i in range(1, 6):
+        await asyncio.wait_for(bus.publish("readings", [i]), timeout=0.1)
+
+    stats = {sub["name"]: sub for sub in bus.stats()["subscribers"]}
+    assert stats["slow"]["overflow"] == 3 and stats["fast"]["overflow"] == 0
+    assert bus.stats()["overflow"] == 3
+
+    # Ao destravar, o que acumulou na fila chega numa chamada só
+    release.set()
+    await bus.stop()
+    assert slow_batches == [[0], [1, 2]]
+    assert [item for batch in fast_batches for item in batch] == [0, 1, 2, 3, 4, 5]
+
+@pytest.mark.asyncio
+async def test_failing_subscriber_is_isolated_and_inline_without_start():
+    bus = EventBus()
+    received = []
+
+    async def broken(items):
+        raise RuntimeError("boom")
+
+    async def ok(items):
+        received.extend(items)
+
+    bus.subscribe("readings", "broken", broken)
+    bus.subscribe("readings", "ok", ok)
+    # Sem start (scripts/testes): entrega na hora, e a exceção não sobe
+    await bus.publish("readings", [1, 2])
+    assert received == [1, 2]
+    assert {sub["name"]: sub["errors"] for sub in bus.stats()["subscribers"]} == {"broken": 1, "ok": 0}
+
+@pytest.mark.asyncio
+async def test_lossless_subscriber_keeps_overflow_and_cache_is_not_stale(monkeypatch):
+    cache = AnalyticsCache()
+    monkeypatch.setattr(ingestion, "analytics_cache", cache)
+    bus = EventBus(max_queue=1)
+    release = asyncio.Event()
+
+    async def slow_analytics(rows_with_org):
+        await release.wait()
+        await ingestion.update_analytics(rows_with_org)
+
+    bus.subscribe("readings", "analytics", slow_analytics, lossless=True)
+    await bus.start()
+
+    # Buckets fechados em cache; leituras atrasadas de cada hora chegam com a fila cheia
+    scope, hour, base = Scope(1, "sensor", None, None), timedelta(hours=1), datetime(2026, 3, 1)
+    cached = [{"bucket": base + i * hour, "device_id": None, "sensor_type_id": 1,
+               "sum_value": 1.0, "count": 1, "min_value": 1.0, "max_value": 1.0} for i in range(3)]
+    cache.put_range(scope, hour, base, base + 3 * hour, cached, closed_before=base + 3 * hour, generation=cache.generation())
+    for i in range(3):
+        await bus.publish("readings", [(Row(1, 1, 1, base + i * hour + timedelta(minutes=5)), 1)])
+        await asyncio.sleep(0) # O assinante pega o 1o evento e trava
+
+    subscriber = bus.stats()["subscribers"][0]
+    assert (subscriber["overflow"], subscriber["coalesced"]) == (0, 1)
+
+    release.set()
+    await bus.stop()
+    # Nenhuma invalidação perdida: as três horas são recalculadas
+    assert cache.get_range(scope, hour, base, base + 3 * hour) == ([], [(base, base + 3 * hour)])
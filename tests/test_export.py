@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+import pytest
+import pytest_asyncio
+import pyarrow.parquet as pq
+from datetime import datetime
+from httpx import AsyncClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core import export
+from app.core.ingestion import insert_measurements
+from app.models.organization import Organization
+
+@pytest_asyncio.fixture
+async def stored(session: AsyncSession, device, sensor_types):
+    other = Organization(name="Outra Org", slug="outra-org")
+    session.add(other)
+    await session.commit()
+
+    rows = [
+        {"device_id": device.id, "sensor_type_id": sensor_types[0].id, "organization_id": device.organization_id,
+         "value": float(i), "raw_value": float(i) / 2, "created_at": datetime(2026, 1, 1, 0, i)}
+        for i in range(5)
+    ]
+    # Linha de outra organização: nunca pode aparecer no export
+    rows.append({**rows[0], "organization_id": other.id, "value": -1.0})
+    await insert_measurements(session, rows)
+    await session.commit()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity"])
+async def test_export_ndjson(async_client: AsyncClient, current_user, stored, monkeypatch, accept_encoding):
+    monkeypatch.setattr(export.settings, "MEASUREMENT_EXPORT_BATCH_SIZE", 2)
+    response = await async_client.get(
+        "/api/v1/measurements/export",
+        params={"start_date": "2026-01-01T00:01:00"},
+        headers={"Accept-Encoding": accept_encoding},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert (response.headers.get("content-encoding") == "gzip") == (accept_encoding == "gzip")
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["value"] for r in records] == [1.0, 2.0, 3.0, 4.0]
+    assert records[0]["created_at"] == "2026-01-01T00:01:00"
+
+@pytest.mark.asyncio
+async def test_export_csv_and_parquet(async_client: AsyncClient, current_user, stored, monkeypatch):
+    monkeypatch.setattr(export.settings, "MEASUREMENT_EXPORT_BATCH_SIZE", 2)
+
+    response = await async_client.get("/api/v1/measurements/export", params={"format": "csv"})
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [float(r["value"]) for r in rows] == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+    response = await async_client.get("/api/v1/measurements/export", params={"format": "parquet"})
+    assert "content-encoding" not in response.headers
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column("value").to_pylist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert table.column("raw_value").to_pylist() == [0.0, 0.5, 1.0, 1.5, 2.0]
+    assert pq.ParquetFile(io.BytesIO(response.content)).num_row_groups == 3
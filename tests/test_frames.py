@@ -0,0 +1,67 @@
+import asyncio
+import json
+import struct
+import pytest
+
+from app.core import frames
+from app.core.frames import Frame, encode_json
+from app.core.socket import ConnectionManager
+
+class FakeSocket:
+    def __init__(self):
+        self.text = []
+        self.binary = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.text.append(data)
+
+    async def send_bytes(self, data):
+        self.binary.append(data)
+
+async def drain():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+def test_builtin_msgpack_encoder_follows_spec(monkeypatch):
+    monkeypatch.setattr(frames, "msgpack", None)
+    message = {"id": 1, "value": 1.5, "ok": True, "unit": None, "n": -1, "big": 300}
+    expected = (
+        b"\x86"
+        + b"\xa2id" + b"\x01"
+        + b"\xa5value" + b"\xcb" + struct.pack(">d", 1.5)
+        + b"\xa2ok" + b"\xc3"
+        + b"\xa4unit" + b"\xc0"
+        + b"\xa1n" + b"\xff"
+        + b"\xa3big" + b"\xd3" + struct.pack(">q", 300)
+    )
+    assert frames.encode_msgpack(message) == expected
+
+def test_frame_encodes_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(frames, "encode_json", lambda message: calls.append(message) or "{}")
+    frame = Frame({"id": 1})
+    assert frame.text() == frame.text() == "{}"
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_broadcast_shares_frame_between_sockets_and_encodings():
+    manager = ConnectionManager(backend="memory")
+    text_a, text_b, binary = FakeSocket(), FakeSocket(), FakeSocket()
+    await manager.connect(text_a, 1)
+    await manager.connect(text_b, 1)
+    await manager.connect(binary, 1, encoding="msgpack")
+
+    message = {"id": 7, "device_id": 1, "sensor_type_id": 2, "value": 21.5}
+    await manager.broadcast(message, 1)
+    await drain()
+
+    assert json.loads(text_a.text[0]) == message
+    assert text_a.text[0] is text_b.text[0] # Mesma string: serializada uma vez
+    assert binary.text == [] and binary.binary == [frames.encode_msgpack(message)]
+    assert encode_json(message) == text_a.text[0]
+
+    for socket in (text_a, text_b, binary):
+        manager.disconnect(socket, 1)
@@ -0,0 +1,88 @@
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from pydantic import ValidationError
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import Settings, settings
+from app.core.hot_window import HotWindow, hot_window
+from app.core.ingestion import insert_measurements
+from app.core.rollups import query_buckets
+from tests.conftest import engine_test
+
+@pytest_asyncio.fixture
+async def warm_window(session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(hot_window, "session_factory", sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False))
+    yield hot_window
+    await hot_window.stop()
+
+@pytest.mark.asyncio
+async def test_recent_analytics_served_from_memory(
+    async_client: AsyncClient, session: AsyncSession, current_user, device, sensor_types, device_headers, warm_window, monkeypatch
+):
+    monkeypatch.setattr(settings, "ROLLUP_LAG_SECONDS", 0)
+    now = datetime.utcnow()
+    # Já no banco antes do startup: vem do aquecimento
+    await insert_measurements(session, [
+        {"device_id": device.id, "sensor_type_id": sensor_types[0].id, "organization_id": device.organization_id,
+         "value": float(i), "created_at": now - timedelta(minutes=10 * i)}
+        for i in range(6)
+    ])
+    await session.commit()
+    await warm_window.warm()
+
+    # Chega pela ingestão depois do startup (inclusive com timestamp retroativo)
+    readings = [
+        {"sensor_type_id": sensor_types[0].id, "value": 7.0},
+        {"sensor_type_id": sensor_types[0].id, "value": 8.0, "timestamp": (now - timedelta(minutes=25)).isoformat()},
+    ]
+    response = await async_client.post("/api/v1/measurements/batch", json={"readings": readings}, headers=device_headers)
+    assert response.status_code == 200
+
+    hits, misses = warm_window.hits, warm_window.misses
+    params = {"period": "1d", "bucket_size": "minute"}
+    served = (await async_client.get("/api/v1/measurements/analytics/", params=params)).json()
+    assert warm_window.hits == hits + 1
+
+    start = now - timedelta(days=1)
+    from_db = await query_buckets(session, device.organization_id, "minute", start)
+    assert [(b["count"], round(b["sum_value"] / b["count"], 2)) for b in from_db] == [
+        (item["count"], item["avg_value"]) for item in served
+    ]
+    assert sum(item["count"] for item in served) == 8
+
+    # Fora da janela: cai no banco
+    window_start = now - warm_window.window - timedelta(hours=1)
+    assert warm_window.query_buckets(device.organization_id, "hour", window_start) is None
+    assert warm_window.misses == misses + 1
+
+@pytest.mark.asyncio
+async def test_memory_cap_evicts_oldest_and_shrinks_coverage(session: AsyncSession):
+    window = HotWindow(
+        session_factory=sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False),
+        window_hours=24, max_bytes=16 * 1024,
+    )
+    await window.warm()
+
+    now = datetime.utcnow()
+    rows = [(1, 1, 1, now - timedelta(seconds=10 * i), float(i)) for i in range(5000)]
+    window._apply(rows)
+
+    stats = window.stats()
+    assert stats["evictions"] >= 1
+    assert stats["bytes"] <= window.max_bytes
+    assert not window.covers(now - timedelta(hours=12))
+    assert window.covers(now - timedelta(minutes=1))
+    # Dentro do que sobrou, agregado corretamente
+    start = (now - timedelta(minutes=5)).replace(second=0, microsecond=0)
+    recent = window.query_buckets(1, "minute", start)
+    assert sum(b["count"] for b in recent) == sum(1 for row in rows if row[3] >= start)
+
+def test_refuses_to_enable_with_multiple_workers():
+    # Janela por worker veria só parte das leituras: a configuração recusa
+    for workers, backend in ((4, "memory"), (1, "postgres")):
+        with pytest.raises(ValidationError, match="HOT_WINDOW_ENABLED"):
+            Settings(HOT_WINDOW_ENABLED=True, WEB_CONCURRENCY=workers, BROADCAST_BACKEND=backend)
+    assert Settings(HOT_WINDOW_ENABLED=True, WEB_CONCURRENCY=1, BROADCAST_BACKEND="memory").HOT_WINDOW_ENABLED
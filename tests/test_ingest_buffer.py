@@ -0,0 +1,66 @@
+import pytest
+from datetime import datetime
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.ingest_buffer import IngestBuffer, IngestBufferFull
+from app.models.measurement import Measurement
+from tests.conftest import engine_test
+
+def make_row(device, sensor_id, value):
+    return {
+        "device_id": device.id,
+        "sensor_type_id": sensor_id,
+        "value": value,
+        "created_at": datetime.utcnow(),
+    }
+
+@pytest.mark.asyncio
+async def test_ack_on_flush_returns_persisted_row(session: AsyncSession, device, sensor_types):
+    factory = sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    flushed = []
+
+    async def on_flush(rows):
+        flushed.extend(rows)
+
+    buffer = IngestBuffer(session_factory=factory, flush_interval_ms=10, ack_mode="flush", on_flush=on_flush)
+    await buffer.start()
+    row = await buffer.put(make_row(device, sensor_types[0].id, 1.0), device.organization_id)
+    await buffer.stop()
+
+    assert row.id is not None
+    assert flushed[0][1] == device.organization_id
+    assert buffer.stats()["flushed_rows"] == 1
+
+@pytest.mark.asyncio
+async def test_ack_on_enqueue_drains_on_stop(session: AsyncSession, device, sensor_types):
+    factory = sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    buffer = IngestBuffer(
+        session_factory=factory, flush_interval_ms=1000, flush_max_rows=3, ack_mode="enqueue"
+    )
+    await buffer.start()
+    for i in range(7):
+        assert await buffer.put(make_row(device, sensor_types[0].id, float(i)), device.organization_id) is None
+    await buffer.stop()
+
+    stats = buffer.stats()
+    assert stats["flushed_rows"] == 7
+    assert stats["flushes"] == 3 # Lotes de 3 + 3 + 1
+    assert stats["queue_depth"] == 0
+
+    result = await session.exec(select(Measurement))
+    assert len(result.all()) == 7
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects(session: AsyncSession, device, sensor_types):
+    factory = sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    buffer = IngestBuffer(session_factory=factory, max_size=1, flush_interval_ms=1000, ack_mode="enqueue")
+    await buffer.start()
+    await buffer.put(make_row(device, sensor_types[0].id, 1.0), device.organization_id)
+    # O flusher já pode ter retirado o primeiro item: enche até rejeitar
+    with pytest.raises(IngestBufferFull):
+        for _ in range(3):
+            await buffer.put(make_row(device, sensor_types[0].id, 2.0), device.organization_id)
+    await buffer.stop()
+    assert buffer.stats()["rejected_full"] == 1
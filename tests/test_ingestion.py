@@ -0,0 +1,57 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.analytics_cache import Scope, analytics_cache
+from app.core.ingestion import copy_measurements, insert_measurements, publish_copied
+from app.models.measurement import Measurement
+
+def rows_for(device, sensor_id, count):
+    for i in range(count):
+        yield {
+            "device_id": device.id,
+            "sensor_type_id": sensor_id,
+            "value": float(i),
+            "created_at": datetime(2026, 1, 1, 0, 0, i % 60),
+        }
+
+@pytest.mark.asyncio
+async def test_insert_measurements_preserves_order(session: AsyncSession, device, sensor_types):
+    rows = list(rows_for(device, sensor_types[0].id, 5))
+    inserted = await insert_measurements(session, rows)
+    await session.commit()
+
+    assert [row.value for row in inserted] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert len({row.id for row in inserted}) == 5
+
+@pytest.mark.asyncio
+async def test_copy_measurements_fallback_streams_in_chunks(session: AsyncSession, device, sensor_types):
+    """No SQLite o COPY cai para executemany, consumindo o gerador em blocos."""
+    written = await copy_measurements(session, rows_for(device, sensor_types[0].id, 25), chunk_size=10)
+    await session.commit()
+
+    assert written == 25
+    count = (await session.exec(select(func.count(Measurement.id)))).one()
+    assert count == 25
+
+@pytest.mark.asyncio
+async def test_copy_measurements_invalidates_cached_buckets(session: AsyncSession, device, sensor_types, monkeypatch):
+    monkeypatch.setattr(analytics_cache, "enabled", True)
+    sensor_id = sensor_types[0].id
+    base = datetime(2026, 3, 1)
+    hour = timedelta(hours=1)
+    scope = Scope(device.organization_id, "sensor", None, None)
+    analytics_cache.put_range(scope, hour, base, base + 3 * hour, [], closed_before=base + 3 * hour,
+                              generation=analytics_cache.generation())
+
+    # Backfill no bucket das 01h: só ele sai do cache, e só depois do publish
+    rows = [{"device_id": device.id, "sensor_type_id": sensor_id, "organization_id": device.organization_id,
+             "value": 1.0, "raw_value": 1.0, "created_at": base + hour + timedelta(minutes=m)} for m in (5, 50)]
+    await copy_measurements(session, rows)
+    await session.commit()
+    assert analytics_cache.get_range(scope, hour, base, base + 3 * hour)[1] == []
+
+    await publish_copied(session)
+    assert analytics_cache.get_range(scope, hour, base, base + 3 * hour)[1] == [(base + hour, base + 2 * hour)]
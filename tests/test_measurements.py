@@ -1,6 +1,15 @@
 import pytest
+from datetime import datetime
 from httpx import AsyncClient
 
+from sqlalchemy import event
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.device_cache import device_auth_cache
+from app.core.ingestion import insert_measurements
+from app.models.measurement import Measurement
+from tests.conftest import engine_test
+
 @pytest.mark.asyncio
 async def test_create_measurement_end_to_end(async_client: AsyncClient):
     # Cria Sensor Type
@@ -42,4 +51,112 @@ async def test_security_reject_unlinked_sensor(async_client: AsyncClient):
     
     # Deve ser barrado
     assert response.status_code == 400
-    assert "não possui o sensor" in response.json()["detail"]
\ No newline at end of file
+    assert "não possui o sensor" in response.json()["detail"]
+
+@pytest.mark.asyncio
+async def test_batch_ingestion_mixed_sensors(async_client: AsyncClient, session, device_headers, sensor_types):
+    """Lote com leitura válida (calibrada) e leitura de sensor não vinculado."""
+    linked, unlinked = sensor_types
+    payload = {
+        "readings": [
+            {"sensor_type_id": linked.id, "value": 10.0, "timestamp": "2026-01-01T10:00:00"},
+            {"sensor_type_id": unlinked.id, "value": 50.0},
+            {"sensor_type_id": linked.id, "value": 1.5},
+        ]
+    }
+    response = await async_client.post("/api/v1/measurements/batch", json=payload, headers=device_headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["accepted"] == 2
+    assert data["rejected"] == 1
+    assert [item["accepted"] for item in data["items"]] == [True, False, True]
+    assert data["items"][0]["id"] is not None
+    assert data["items"][1]["id"] is None
+    assert data["items"][0]["id"] != data["items"][2]["id"]
+
+    # Calibração aplicada ('x * 2' no sensor vinculado)
+    stored = await session.get(Measurement, data["items"][0]["id"])
+    assert stored.value == 20.0
+
+@pytest.mark.asyncio
+async def test_warm_device_cache_ingest_runs_no_selects(async_client: AsyncClient, device_headers, sensor_types):
+    payload = {"sensor_type_id": sensor_types[0].id, "value": 1.0}
+    await async_client.post("/api/v1/measurements/", json=payload, headers=device_headers)
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine_test.sync_engine, "before_cursor_execute", record)
+    try:
+        response = await async_client.post("/api/v1/measurements/", json=payload, headers=device_headers)
+    finally:
+        event.remove(engine_test.sync_engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert not [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+@pytest.mark.asyncio
+async def test_calibration_update_invalidates_device_cache(
+    async_client: AsyncClient, current_user, device, device_headers, sensor_types
+):
+    payload = {"sensor_type_id": sensor_types[0].id, "value": 3.0}
+    first = await async_client.post("/api/v1/measurements/", json=payload, headers=device_headers)
+    assert first.json()["value"] == 6.0 # 'x * 2'
+
+    resp = await async_client.put(
+        f"/api/v1/devices/{device.id}/sensors/{sensor_types[0].id}/calibration",
+        json={"calibration_formula": "x + 1"}
+    )
+    assert resp.status_code == 200
+
+    second = await async_client.post("/api/v1/measurements/", json=payload, headers=device_headers)
+    assert second.json()["value"] == 4.0
+
+@pytest.mark.asyncio
+async def test_ingest_resolves_device_token_once(async_client: AsyncClient, device_headers, sensor_types):
+    """Middleware resolve o token e a dependência reaproveita o resultado do scope."""
+    payload = {"sensor_type_id": sensor_types[0].id, "value": 1.0}
+    response = await async_client.post("/api/v1/measurements/", json=payload, headers=device_headers)
+
+    assert response.status_code == 200
+    assert device_auth_cache.misses == 1
+    assert device_auth_cache.hits == 0
+
+@pytest.mark.asyncio
+async def test_ingest_without_device_token_is_rejected(async_client: AsyncClient):
+    response = await async_client.post("/api/v1/measurements/batch", json={"readings": []})
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_read_measurements_cursor_pagination(
+    async_client: AsyncClient, session: AsyncSession, current_user, device, sensor_types
+):
+    # Timestamps repetidos: o id desempata, nenhuma linha some ou repete entre páginas
+    await insert_measurements(session, [
+        {"device_id": device.id, "sensor_type_id": sensor_types[0].id, "organization_id": device.organization_id,
+         "value": float(i), "created_at": datetime(2026, 1, 1, 0, i // 2)}
+        for i in range(7)
+    ])
+    await session.commit()
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = await async_client.get("/api/v1/measurements/", params=params)
+        assert response.status_code == 200
+        seen += [(m["created_at"], m["id"]) for m in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert len(seen) == 7
+    assert seen == sorted(seen, reverse=True)
+
+    # skip continua aceito
+    legacy = await async_client.get("/api/v1/measurements/", params={"skip": 3, "limit": 3})
+    assert [(m["created_at"], m["id"]) for m in legacy.json()] == seen[3:6]
+
+    invalid = await async_client.get("/api/v1/measurements/", params={"cursor": "nao-e-cursor"})
+    assert invalid.status_code == 400
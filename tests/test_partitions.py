@@ -0,0 +1,19 @@
+import pytest
+from datetime import datetime
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.partitions import ensure_partitions, next_boundary, partition_name, period_start
+
+def test_period_boundaries():
+    moment = datetime(2026, 10, 17, 15, 30) # sábado
+    assert period_start(moment, "day") == datetime(2026, 10, 17)
+    assert next_boundary(moment, "day") == datetime(2026, 10, 18)
+    assert period_start(moment, "week") == datetime(2026, 10, 12)
+    assert next_boundary(moment, "week") == datetime(2026, 10, 19)
+    # Cursor desalinhado (fim da partição legada) avança até a próxima segunda
+    assert next_boundary(datetime(2026, 10, 15), "week") == datetime(2026, 10, 19)
+    assert partition_name(datetime(2026, 10, 19)) == "measurements_p20261019"
+
+@pytest.mark.asyncio
+async def test_ensure_partitions_is_noop_without_postgres(session: AsyncSession):
+    assert await ensure_partitions(session) == []
@@ -0,0 +1,105 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.ingestion import insert_measurements
+from app.core.config import settings
+from app.core.recalibration import RecalibrationRunner
+from app.core.retention import RetentionWorker
+from app.core.rollups import query_buckets
+from app.models.device_sensor import DeviceSensorLink
+from app.models.measurement import Measurement
+from tests.conftest import engine_test
+
+@pytest.mark.asyncio
+async def test_recalibration_rewrites_history_in_chunks(session: AsyncSession, device, sensor_types):
+    sensor_id = sensor_types[0].id
+    rows = [
+        {
+            "device_id": device.id,
+            "sensor_type_id": sensor_id,
+            "value": i * 2.0,
+            "raw_value": float(i),
+            "created_at": datetime(2026, 1, 1, 0, 0, i),
+        }
+        for i in range(7)
+    ]
+    # Linha legada (sem raw_value): não pode ser tocada
+    rows.append({
+        "device_id": device.id, "sensor_type_id": sensor_id, "value": 99.0,
+        "raw_value": None, "created_at": datetime(2026, 1, 1, 0, 1, 0),
+    })
+    await insert_measurements(session, rows)
+
+    link = await session.get(DeviceSensorLink, (device.id, sensor_id))
+    link.calibration_formula = "x + 100"
+    link.calibration_version += 1
+    session.add(link)
+    await session.commit()
+
+    factory = sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    runner = RecalibrationRunner(session_factory=factory, chunk_size=3)
+    job = runner.submit(device.id, sensor_id, link.calibration_formula, link.calibration_version)
+    await runner.wait(job.id)
+
+    assert job.status == "done"
+    assert (job.total_rows, job.processed_rows, job.chunks) == (7, 7, 3)
+    assert job.progress == 1.0
+
+    session.expire_all()
+    result = await session.exec(select(Measurement).order_by(Measurement.created_at))
+    values = [m.value for m in result.all()]
+    assert values == [100.0, 101.0, 102.0, 103.0, 104.0, 105.0, 106.0, 99.0]
+
+@pytest.mark.asyncio
+async def test_recalibration_stops_when_formula_changes(session: AsyncSession, device, sensor_types):
+    link = await session.get(DeviceSensorLink, (device.id, sensor_types[0].id))
+
+    factory = sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    runner = RecalibrationRunner(session_factory=factory)
+    job = runner.submit(device.id, sensor_types[0].id, "x * 3", link.calibration_version - 1)
+    await runner.wait(job.id)
+
+    assert job.status == "superseded"
+    assert job.processed_rows == 0
+
+@pytest.mark.asyncio
+async def test_recalibration_keeps_rollups_of_expired_raw_data(
+    session: AsyncSession, organization, device, sensor_types, monkeypatch
+):
+    monkeypatch.setattr(settings, "ROLLUP_LAG_SECONDS", 0)
+    sensor_id, org_id = sensor_types[0].id, organization.id
+    now = datetime.utcnow()
+    old, recent = now - timedelta(days=100), now - timedelta(days=1)
+    await insert_measurements(session, [
+        {"device_id": device.id, "sensor_type_id": sensor_id, "organization_id": organization.id,
+         "value": 1.0, "raw_value": 1.0, "created_at": moment}
+        for moment in (old, old + timedelta(minutes=1), recent)
+    ])
+    organization.raw_retention_days = 30
+    session.add(organization)
+    await session.commit()
+
+    factory = sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    await RetentionWorker(session_factory=factory).run_once(now=now)
+
+    link = await session.get(DeviceSensorLink, (device.id, sensor_id))
+    link.calibration_formula = "x + 100"
+    link.calibration_version += 1
+    session.add(link)
+    await session.commit()
+    runner = RecalibrationRunner(session_factory=factory)
+    job = runner.submit(device.id, sensor_id, link.calibration_formula, link.calibration_version)
+    await runner.wait(job.id)
+    assert (job.status, job.processed_rows) == ("done", 1)
+
+    # Brutos antigos já saíram: os rollups deles são a única cópia e ficam;
+    # o dia com brutos é recalculado com o valor novo
+    session.expire_all()
+    buckets = await query_buckets(session, org_id, "day", old - timedelta(days=1))
+    assert [(b["bucket"], b["count"], b["sum_value"]) for b in buckets] == [
+        (datetime(old.year, old.month, old.day), 2, 2.0),
+        (datetime(recent.year, recent.month, recent.day), 1, 101.0),
+    ]
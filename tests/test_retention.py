@@ -0,0 +1,69 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.ingestion import insert_measurements
+from app.core.retention import RetentionWorker
+from app.core.rollups import query_buckets
+from app.models.measurement import Measurement
+from app.models.measurement_rollup import MeasurementRollup
+from tests.conftest import engine_test
+
+@pytest.mark.asyncio
+async def test_retention_downsamples_then_deletes_in_chunks(
+    session: AsyncSession, organization, device, sensor_types, monkeypatch
+):
+    monkeypatch.setattr(settings, "ROLLUP_LAG_SECONDS", 0)
+    now = datetime(2026, 6, 1, 12, 0)
+    old = now - timedelta(days=40)
+    ancient = now - timedelta(days=400)
+
+    rows = [
+        {"device_id": device.id, "sensor_type_id": sensor_types[0].id,
+         "organization_id": organization.id, "value": float(i),
+         "raw_value": float(i), "created_at": old + timedelta(minutes=i)}
+        for i in range(5)
+    ]
+    rows.append({"device_id": device.id, "sensor_type_id": sensor_types[0].id,
+         "organization_id": organization.id, "value": 9.0,
+                 "raw_value": 9.0, "created_at": ancient})
+    rows.append({"device_id": device.id, "sensor_type_id": sensor_types[0].id,
+         "organization_id": organization.id, "value": 1.0,
+                 "raw_value": 1.0, "created_at": now - timedelta(days=1)})
+    await insert_measurements(session, rows)
+
+    organization.raw_retention_days = 30
+    organization.minute_rollup_retention_days = 90
+    organization.hour_rollup_retention_days = 365
+    session.add(organization)
+    await session.commit()
+
+    factory = sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False)
+    worker = RetentionWorker(session_factory=factory, chunk_size=2)
+    reports = await worker.run_once(now=now)
+
+    [report] = reports
+    assert report.raw_rows_deleted == 6
+    assert report.chunks > 3 # Blocos limitados
+    assert report.rollup_rows_deleted == {"minute": 1, "hour": 1}
+
+    org_id = organization.id
+    session.expire_all()
+    remaining = (await session.exec(select(func.count(Measurement.id)))).one()
+    assert remaining == 1
+
+    # Histórico apagado dos brutos continua respondendo pelos rollups
+    buckets = await query_buckets(session, org_id, "day", ancient)
+    assert [(b["bucket"], b["count"]) for b in buckets] == [
+        (datetime(ancient.year, ancient.month, ancient.day), 1),
+        (datetime(old.year, old.month, old.day), 5),
+        (datetime(2026, 5, 31), 1),
+    ]
+    minute_rows = (await session.exec(
+        select(func.count()).select_from(MeasurementRollup).where(MeasurementRollup.resolution == "minute")
+    )).one()
+    assert minute_rows == 5 + 1
@@ -0,0 +1,157 @@
+import pytest
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.hot_window import HotWindow
+from app.core.ingestion import insert_measurements
+from app.core.rollups import floor_bucket, parse_bucket, query_buckets, rollup_new_rows, safe_rollup_id
+from app.models.device import Device
+from app.models.measurement_rollup import MeasurementRollup, RollupWatermark
+from tests.conftest import engine_test
+
+def reading(device, sensor_id, value, created_at):
+    return {
+        "device_id": device.id,
+        "sensor_type_id": sensor_id,
+        "organization_id": device.organization_id,
+        "value": value,
+        "raw_value": value,
+        "created_at": created_at,
+    }
+
+@pytest.mark.asyncio
+async def test_rollup_is_incremental_and_merges_fresh_rows(session: AsyncSession, device, sensor_types):
+    sensor_id = sensor_types[0].id
+    base = datetime(2026, 3, 1, 10, 0)
+    await insert_measurements(session, [
+        reading(device, sensor_id, 1.0, base),
+        reading(device, sensor_id, 3.0, base + timedelta(seconds=30)),
+        reading(device, sensor_id, 8.0, base + timedelta(minutes=5)),
+        reading(device, sensor_id, -2.0, base + timedelta(hours=1)),
+    ])
+    await session.commit()
+
+    assert await rollup_new_rows(session, lag_seconds=0) == 4
+    assert await rollup_new_rows(session, lag_seconds=0) == 0 # Nada novo
+
+    rollups = (await session.exec(select(MeasurementRollup))).all()
+    by_key = {(r.resolution, r.bucket): r for r in rollups}
+    assert len(by_key) == 3 + 2 + 1
+    assert (by_key[("minute", base)].sum_value, by_key[("minute", base)].count) == (4.0, 2)
+    assert (by_key[("hour", base)].min_value, by_key[("hour", base)].max_value) == (1.0, 8.0)
+    day = by_key[("day", datetime(2026, 3, 1))]
+    assert (day.sum_value, day.count, day.min_value, day.max_value) == (10.0, 4, -2.0, 8.0)
+
+    # Leitura atrasada (timestamp antigo) ainda não agregada: vem dos dados brutos
+    await insert_measurements(session, [reading(device, sensor_id, 20.0, base + timedelta(minutes=59))])
+    await session.commit()
+
+    buckets = await query_buckets(session, device.organization_id, "hour", base)
+    assert [(b["bucket"], b["count"], b["sum_value"], b["max_value"]) for b in buckets] == [
+        (base, 4, 32.0, 20.0),
+        (base + timedelta(hours=1), 1, -2.0, -2.0),
+    ]
+
+    # Depois do job, mesma resposta vinda só do rollup (sem contagem dupla)
+    assert await rollup_new_rows(session, lag_seconds=0) == 1
+    assert await query_buckets(session, device.organization_id, "hour", base) == buckets
+
+@pytest.mark.asyncio
+async def test_rollup_waits_for_lag_before_aggregating(session: AsyncSession, device, sensor_types):
+    now = datetime(2026, 3, 1, 12, 0)
+    await insert_measurements(session, [reading(device, sensor_types[0].id, 1.0, now)])
+    await session.commit()
+
+    assert await rollup_new_rows(session, lag_seconds=60, now=now) == 0
+    assert await rollup_new_rows(session, lag_seconds=60, now=now + timedelta(seconds=30)) == 0
+    assert await rollup_new_rows(session, lag_seconds=60, now=now + timedelta(seconds=61)) == 1
+
+def test_watermark_waits_for_transactions_in_flight_at_candidate():
+    # Candidato 100 lido num snapshot com xmax 500; um COPY longo (xid 480) alocou
+    # os ids 90..99 e ainda não fez COMMIT: passado o lag, o watermark NÃO avança
+    now = datetime(2026, 3, 1, 12, 0)
+    watermark = RollupWatermark(name="t", last_id=80, pending_id=100, pending_at=now, pending_xmax=500)
+    later = now + timedelta(seconds=61)
+    assert safe_rollup_id(watermark, 120, later, 60, oldest_running_xid=480) == 80
+    # COPY terminou (nenhuma transação < 500 aberta): as linhas 90..99 entram na agregação
+    assert safe_rollup_id(watermark, 120, later, 60, oldest_running_xid=501) == 100
+    # Sem xid (SQLite / candidato antigo): só o lag vale
+    assert safe_rollup_id(watermark, 120, later, 60) == 100
+    assert safe_rollup_id(watermark, 120, now, 60, oldest_running_xid=501) == 80
+
+@pytest.mark.asyncio
+async def test_analytics_endpoint_uses_rollups(async_client: AsyncClient, session, current_user, device, sensor_types):
+    now = datetime.utcnow()
+    await insert_measurements(session, [
+        reading(device, sensor_types[0].id, 10.0, now - timedelta(minutes=1)),
+        reading(device, sensor_types[0].id, 20.0, now - timedelta(minutes=1)),
+    ])
+    await session.commit()
+    await rollup_new_rows(session, lag_seconds=0)
+
+    response = await async_client.get("/api/v1/measurements/analytics/", params={"period": "1h", "bucket_size": "minute"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert sum(item["count"] for item in data) == 2
+    assert data[-1]["avg_value"] == 15.0
+
+@pytest.mark.asyncio
+async def test_arbitrary_buckets_ranges_and_device_grouping(session: AsyncSession, device, sensor_types):
+    other = Device(name="Dev 2", slug="dev-2", organization_id=device.organization_id)
+    session.add(other)
+    await session.commit()
+    await session.refresh(other)
+
+    temp, hum = (sensor.id for sensor in sensor_types)
+    base = floor_bucket(datetime.utcnow() - timedelta(hours=3), parse_bucket("6h"))
+    rows = [
+        reading(device, temp, 1.0, base + timedelta(minutes=1)),
+        reading(device, temp, 2.0, base + timedelta(minutes=4)),
+        reading(other, temp, 10.0, base + timedelta(minutes=6)),
+        reading(device, hum, 50.0, base + timedelta(minutes=14)),
+        reading(other, temp, 20.0, base + timedelta(hours=1, minutes=2)),
+    ]
+    # Metade agregada, metade ainda bruta: o resultado soma as duas fontes
+    await insert_measurements(session, rows[:3])
+    await session.commit()
+    assert await rollup_new_rows(session, lag_seconds=0) == 3
+    await insert_measurements(session, rows[3:])
+    await session.commit()
+    org = device.organization_id
+
+    five = await query_buckets(session, org, "5m", base)
+    assert [(b["bucket"] - base, b["sensor_type_id"], b["count"], b["sum_value"]) for b in five] == [
+        (timedelta(0), temp, 2, 3.0),
+        (timedelta(minutes=5), temp, 1, 10.0),
+        (timedelta(minutes=10), hum, 1, 50.0),
+        (timedelta(hours=1), temp, 1, 20.0),
+    ]
+    six = await query_buckets(session, org, "6h", base, group_by="device", sensor_type_id=temp)
+    assert [(b["device_id"], b["count"], b["min_value"], b["max_value"]) for b in six] == [
+        (device.id, 2, 1.0, 2.0),
+        (other.id, 2, 10.0, 20.0),
+    ]
+    ranged = await query_buckets(session, org, "15m", base, base + timedelta(minutes=15), device_id=other.id)
+    assert [(b["bucket"], b["count"]) for b in ranged] == [(base, 1)]
+
+    # Janela quente: mesmas respostas, com bucketing em memória
+    window = HotWindow(session_factory=sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False))
+    await window.warm()
+    for args, kwargs in [(("5m", base), {}), (("6h", base), {"group_by": "device", "sensor_type_id": temp})]:
+        assert window.query_buckets(org, *args, **kwargs) == await query_buckets(session, org, *args, **kwargs)
+
+@pytest.mark.asyncio
+async def test_analytics_validates_bucket_and_range(async_client: AsyncClient, current_user):
+    url = "/api/v1/measurements/analytics/"
+    assert (await async_client.get(url, params={"bucket_size": "7x"})).status_code == 400
+    assert (await async_client.get(url, params={"bucket_size": "0m"})).status_code == 400
+    reversed_range = {"start": "2026-03-02T00:00:00", "end": "2026-03-01T00:00:00"}
+    assert (await async_client.get(url, params=reversed_range)).status_code == 400
+    too_many = {"start": "2025-01-01T00:00:00", "end": "2026-01-01T00:00:00", "bucket_size": "minute"}
+    assert (await async_client.get(url, params=too_many)).status_code == 400
+    ok = {"start": "2026-03-01T00:00:00Z", "end": "2026-03-02T00:00:00Z", "bucket_size": "15m", "group_by": "device"}
+    assert (await async_client.get(url, params=ok)).status_code == 200
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import pytest
+
+from app.core.socket import SLOW_CONSUMER_CLOSE_CODE, ConnectionManager
+
+class FakeSocket:
+    def __init__(self, stalled: bool = False):
+        self.sent = []
+        self.closed_with = None
+        self.unblock = asyncio.Event()
+        if not stalled:
+            self.unblock.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        await self.unblock.wait() # Socket "travado" até o teste liberar
+        self.sent.append(json.loads(data))
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+async def drain():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+def reading(i, sensor=1):
+    return {"id": i, "device_id": 1, "sensor_type_id": sensor, "value": float(i)}
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_delay_others_and_drops_oldest():
+    manager = ConnectionManager(backend="memory", max_queue=3, policy="drop_oldest")
+    fast, slow = FakeSocket(), FakeSocket(stalled=True)
+    await manager.connect(fast, 1)
+    await manager.connect(slow, 1)
+
+    for i in range(10):
+        await manager.broadcast(reading(i), 1)
+        await drain()
+    assert [m["id"] for m in fast.sent] == list(range(10))
+
+    # O lento ficou com a 1a leitura em envio + as 3 mais novas na fila
+    slow.unblock.set()
+    await drain()
+    assert [m["id"] for m in slow.sent] == [0, 7, 8, 9]
+    stats = {client["sent"]: client for client in manager.stats()["clients"]}
+    assert stats[4]["dropped"] == 6 and stats[10]["dropped"] == 0
+    assert stats[4]["max_lag_ms"] >= stats[10]["max_lag_ms"]
+
+    manager.disconnect(fast, 1)
+    manager.disconnect(slow, 1)
+
+@pytest.mark.asyncio
+async def test_coalesce_keeps_latest_per_sensor():
+    manager = ConnectionManager(backend="memory", max_queue=2, policy="coalesce")
+    slow = FakeSocket(stalled=True)
+    await manager.connect(slow, 1)
+
+    await manager.broadcast(reading(0, sensor=1), 1) # Em envio
+    await drain()
+    for i, sensor in [(1, 1), (2, 2), (3, 1), (4, 2), (5, 1)]:
+        await manager.broadcast(reading(i, sensor), 1)
+
+    slow.unblock.set()
+    await drain()
+    assert [(m["id"], m["sensor_type_id"]) for m in slow.sent] == [(0, 1), (5, 1), (4, 2)]
+    assert manager.stats()["clients"][0]["coalesced"] == 3
+    manager.disconnect(slow, 1)
+
+@pytest.mark.asyncio
+async def test_disconnect_policy_and_send_timeout_evict():
+    manager = ConnectionManager(backend="memory", max_queue=1, policy="disconnect", send_timeout=0.05)
+    full, stuck = FakeSocket(stalled=True), FakeSocket(stalled=True)
+    await manager.connect(full, 1)
+    await manager.broadcast(reading(0), 1)
+    await drain()
+    await manager.broadcast(reading(1), 1) # Fila: 1
+    await manager.broadcast(reading(2), 1) # Fila cheia: fecha
+    await drain()
+    assert full.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    assert 1 not in manager.active_connections
+
+    await manager.connect(stuck, 2)
+    await manager.broadcast(reading(0), 2)
+    await asyncio.sleep(0.1) # Envio travado além do timeout
+    assert stuck.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    assert manager.evictions == 2
+
+@pytest.mark.asyncio
+async def test_subscriptions_route_only_matching_readings():
+    manager = ConnectionManager(backend="memory", max_subscriptions=4)
+    everything, device, device_sensor, sensor = FakeSocket(), FakeSocket(), FakeSocket(), FakeSocket()
+    for socket in (everything, device, device_sensor, sensor):
+        await manager.connect(socket, 1)
+    manager.subscribe(device, 1, device_ids=[1])
+    manager.subscribe(device_sensor, 1, device_ids=[2], sensor_type_ids=[1])
+    manager.subscribe(sensor, 1, sensor_type_ids=[2])
+
+    for i, (device_id, sensor_id) in enumerate([(1, 1), (1, 2), (2, 1), (2, 2), (3, 1)]):
+        await manager.broadcast({"id": i, "device_id": device_id, "sensor_type_id": sensor_id}, 1)
+    await drain()
+    assert [m["id"] for m in everything.sent] == [0, 1, 2, 3, 4]
+    assert [m["id"] for m in device.sent] == [0, 1]
+    assert [m["id"] for m in device_sensor.sent] == [2]
+    assert [m["id"] for m in sensor.sent] == [1, 3]
+
+    # Remover o único device zera a dimensão; unsubscribe vazio volta a "todos"
+    manager.unsubscribe(device, 1, device_ids=[1])
+    await manager.broadcast({"id": 5, "device_id": 1, "sensor_type_id": 1}, 1)
+    manager.unsubscribe(device, 1)
+    await manager.broadcast({"id": 6, "device_id": 9, "sensor_type_id": 9}, 1)
+    await drain()
+    assert [m["id"] for m in device.sent] == [0, 1, 6]
+
+    with pytest.raises(ValueError):
+        manager.subscribe(device, 1, device_ids=[1, 2, 3], sensor_type_ids=[1, 2])
+    assert manager.stats()["clients"][1]["device_ids"] is None # Assinatura rejeitada não muda nada
+
+    for socket in (everything, device, device_sensor, sensor):
+        manager.disconnect(socket, 1)
+    assert manager._routes == {}
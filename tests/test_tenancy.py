@@ -0,0 +1,63 @@
+import pytest
+from datetime import datetime
+from httpx import AsyncClient
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.ingestion import insert_measurements
+from app.core.rollups import rollup_new_rows
+from app.core.tenancy import organization_sync
+from app.models.measurement import Measurement
+from app.models.measurement_rollup import MeasurementRollup
+from app.models.organization import Organization
+from tests.conftest import engine_test
+
+@pytest.mark.asyncio
+async def test_ingestion_stamps_organization_and_reads_filter_on_it(
+    async_client: AsyncClient, session: AsyncSession, device_headers, device, sensor_types, current_user
+):
+    response = await async_client.post(
+        "/api/v1/measurements/batch",
+        json={"readings": [{"sensor_type_id": sensor_types[0].id, "value": 1.0}]},
+        headers=device_headers,
+    )
+    assert response.status_code == 200
+
+    stored = (await session.exec(select(Measurement))).one()
+    assert stored.organization_id == device.organization_id
+
+    listed = await async_client.get("/api/v1/measurements/")
+    assert [m["id"] for m in listed.json()] == [stored.id]
+
+@pytest.mark.asyncio
+async def test_device_organization_change_resyncs_measurements(
+    session: AsyncSession, device, sensor_types, monkeypatch
+):
+    monkeypatch.setattr(organization_sync, "session_factory", sessionmaker(engine_test, class_=AsyncSession, expire_on_commit=False))
+    monkeypatch.setattr(organization_sync, "batch_size", 2)
+    monkeypatch.setattr(organization_sync, "recheck_after", 0)
+
+    await insert_measurements(session, [
+        {"device_id": device.id, "sensor_type_id": sensor_types[0].id, "organization_id": device.organization_id,
+         "value": float(i), "created_at": datetime(2026, 1, 1, 0, i)}
+        for i in range(5)
+    ])
+    await session.commit()
+    await rollup_new_rows(session, lag_seconds=0)
+
+    other = Organization(name="Outra Org", slug="outra-org")
+    session.add(other)
+    await session.commit()
+
+    # Qualquer caminho que mude a org do device dispara a sincronização após o COMMIT
+    device.organization_id = other.id
+    session.add(device)
+    await session.commit()
+    await organization_sync.wait()
+
+    device_id, other_id = device.id, other.id
+    session.expire_all()
+    assert await organization_sync.count_mismatched(session, device_id) == 0
+    orgs = (await session.exec(select(MeasurementRollup.organization_id).distinct())).all()
+    assert orgs == [other_id]